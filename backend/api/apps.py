@@ -8,3 +8,17 @@ class ApiConfig(AppConfig):
 
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        """Регистрирует шаги прогрева воркера."""
+        from foodgram.warmup import register
+
+        from .warmup import (
+            build_filter_forms,
+            build_serializer_fields,
+            build_url_resolver,
+        )
+
+        register('url_resolver', build_url_resolver)
+        register('serializers', build_serializer_fields)
+        register('filters', build_filter_forms)
@@ -19,3 +19,45 @@ URL_ORIG = 32
 STRING_TAG = 20
 MIN_VALUE = 1
 RECIPE_COUNT = 0
+
+# Массовые операции с избранным и корзиной
+BULK_RECIPES_LIMIT = 100
+
+# Отчеты профилировщика
+PROFILE_METHOD = 10
+PROFILE_PATH = 2048
+
+# Ограничение частоты запросов
+THROTTLE_DB_TIMEOUT = 1
+THROTTLE_PRUNE_INTERVAL = 60
+
+# Очередь фоновых задач
+JOB_NAME = 128
+JOB_STATUS = 16
+JOB_WORKER = 128
+JOB_PURGE_BATCH_SIZE = 1000
+
+# Пакетное удаление пользователей и рецептов
+PURGE_BATCH_SIZE = 500
+
+# Предвычисленные документы рецептов
+RECIPE_DOCUMENT_BATCH_SIZE = 500
+
+# Синхронизация изменений рецептов
+CHANGE_KIND = 16
+CHANGES_BATCH_SIZE = 100
+CHANGES_MAX_BATCH_SIZE = 500
+
+# Поток событий об изменениях списков пользователя
+EVENTS_BATCH_SIZE = 100
+EVENTS_RETRY_MS = 3000
+
+# Выгрузка и загрузка каталога рецептов
+CATALOG_BATCH_SIZE = 500
+CATALOG_SOURCE = 1024
+
+# Сводная статистика для администраторов
+STATS_NAME = 32
+STATS_BATCH_SIZE = 1000
+STATS_TOP = 20
+STATS_DAYS = 30
@@ -0,0 +1,123 @@
+"""Поток событий (Server-Sent Events) об изменениях списков пользователя.
+
+GET /api/events/ держит соединение открытым и отправляет событие на
+каждое добавление или удаление рецепта в избранном и корзине и на
+каждую подписку или отписку текущего пользователя:
+
+    id: 1042
+    event: shopping_cart
+    data: {"recipe_id": 7, "action": "added"}
+
+Поток работает только под ASGI (foodgram.asgi): под WSGI он занял бы
+воркер целиком. Поток закрывается через EVENTS_STREAM_SECONDS, и
+клиент переподключается с заголовком Last-Event-ID, не теряя событий.
+"""
+
+import asyncio
+import json
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils.cache import patch_cache_control
+from rest_framework import status
+from rest_framework.exceptions import APIException, NotAuthenticated
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from recipes.events import (
+    broker,
+    latest_event_id,
+    read_user_events,
+    run_sync,
+)
+from recipes.models import RecipeChange
+from .constants import EVENTS_BATCH_SIZE, EVENTS_RETRY_MS
+
+OBJECT_KEYS = {
+    RecipeChange.FAVORITE: 'recipe_id',
+    RecipeChange.SHOPPING_CART: 'recipe_id',
+    RecipeChange.SUBSCRIPTION: 'author_id',
+}
+
+
+def authenticate(request):
+    """Пользователь запроса по схемам аутентификации DRF.
+
+    Возвращает пользователя или ответ с ошибкой.
+    """
+    drf_request = Request(request, authenticators=[
+        authenticator()
+        for authenticator in api_settings.DEFAULT_AUTHENTICATION_CLASSES
+    ])
+    try:
+        user = drf_request.user
+    except APIException as error:
+        return JsonResponse(
+            {'detail': str(error.detail)}, status=error.status_code)
+    if not user.is_authenticated:
+        return JsonResponse(
+            {'detail': str(NotAuthenticated.default_detail)},
+            status=status.HTTP_401_UNAUTHORIZED)
+    return user
+
+
+def format_event(pk, kind, object_id, deleted):
+    """Запись журнала в формате text/event-stream."""
+    data = json.dumps({
+        OBJECT_KEYS[kind]: object_id,
+        'action': 'removed' if deleted else 'added',
+    })
+    return f'id: {pk}\nevent: {kind}\ndata: {data}\n\n'
+
+
+async def stream_events(user_id, since):
+    """Отдает события пользователя после since, пока поток не истечет."""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + settings.EVENTS_STREAM_SECONDS
+    waiter = broker.subscribe(user_id)
+    try:
+        yield f'retry: {EVENTS_RETRY_MS}\n\n'
+        while True:
+            waiter.clear()
+            rows = await run_sync(read_user_events)(
+                user_id, since, EVENTS_BATCH_SIZE)
+            for row in rows:
+                yield format_event(*row)
+            if rows:
+                since = rows[-1][0]
+            if len(rows) == EVENTS_BATCH_SIZE:
+                continue
+            timeout = min(
+                settings.EVENTS_HEARTBEAT_SECONDS, deadline - loop.time())
+            if timeout <= 0:
+                return
+            try:
+                await asyncio.wait_for(waiter.wait(), timeout)
+            except asyncio.TimeoutError:
+                # Комментарий не дает прокси закрыть молчащее соединение.
+                yield ': ping\n\n'
+    finally:
+        broker.unsubscribe(user_id, waiter)
+
+
+async def events(request):
+    """Поток событий об изменениях избранного, корзины и подписок."""
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse(
+            {'detail': 'Поток событий доступен только через ASGI.'},
+            status=status.HTTP_501_NOT_IMPLEMENTED)
+    user = await run_sync(authenticate)(request)
+    if isinstance(user, JsonResponse):
+        return user
+    last_event_id = request.headers.get('Last-Event-ID', '')
+    if last_event_id.isdigit():
+        since = int(last_event_id)
+    else:
+        since = await run_sync(latest_event_id)()
+    response = StreamingHttpResponse(
+        stream_events(user.pk, since), content_type='text/event-stream')
+    patch_cache_control(response, no_cache=True)
+    # Запрещает nginx буферизовать поток.
+    response['X-Accel-Buffering'] = 'no'
+    return response
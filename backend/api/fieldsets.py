@@ -0,0 +1,93 @@
+"""Выборочные поля ответа: параметры ?fields=, ?omit= и ?expand=."""
+
+from rest_framework.serializers import ListSerializer
+
+FIELDS_PARAM = 'fields'
+OMIT_PARAM = 'omit'
+EXPAND_PARAM = 'expand'
+
+
+def _split_param(query_params, name):
+    """Разбирает параметр вида a,b,c; None, если параметра нет."""
+    value = query_params.get(name)
+    if value is None:
+        return None
+    return frozenset(part.strip() for part in value.split(',') if part)
+
+
+class Fieldset:
+    """Набор полей ответа, запрошенный клиентом.
+
+    Без параметров выводятся все поля, а вложенные объекты
+    раскрываются полностью. Если передан ?expand=, раскрываются только
+    перечисленные вложенные объекты, остальные заменяются на id.
+    """
+
+    def __init__(self, fields=None, omit=None, expand=None):
+        """Сохраняет разобранные параметры запроса."""
+        self.fields = fields
+        self.omit = omit or frozenset()
+        self.expand = expand
+
+    @classmethod
+    def from_request(cls, request):
+        """Создает набор полей по параметрам запроса."""
+        if request is None:
+            return cls()
+        query_params = request.query_params
+        return cls(
+            fields=_split_param(query_params, FIELDS_PARAM),
+            omit=_split_param(query_params, OMIT_PARAM),
+            expand=_split_param(query_params, EXPAND_PARAM),
+        )
+
+    @property
+    def is_default(self):
+        """Запрошен ли полный ответ без ограничений."""
+        return self.fields is None and not self.omit and self.expand is None
+
+    def includes(self, name):
+        """Нужно ли выводить поле."""
+        return (
+            (self.fields is None or name in self.fields)
+            and name not in self.omit
+        )
+
+    def expands(self, name):
+        """Нужно ли раскрывать вложенный объект целиком."""
+        return self.includes(name) and (
+            self.expand is None or name in self.expand)
+
+
+class SparseFieldsetMixin:
+    """Миксин сериализатора, учитывающий ?fields=, ?omit= и ?expand=.
+
+    Параметры применяются только к корневому сериализатору ответа и
+    только при выводе данных: вложенные и принимающие данные
+    сериализаторы работают со всеми полями. Атрибут collapsed_fields
+    задает для вложенных объектов фабрики свернутого представления.
+    """
+
+    collapsed_fields = {}
+
+    def get_fields(self):
+        """Оставляет только запрошенные клиентом поля."""
+        fields = super().get_fields()
+        if hasattr(self, 'initial_data') or not self._is_response_root():
+            return fields
+        fieldset = Fieldset.from_request(self.context.get('request'))
+        if fieldset.is_default:
+            return fields
+        for name in list(fields):
+            if not fieldset.includes(name) and name != 'id':
+                del fields[name]
+            elif name in self.collapsed_fields and not fieldset.expands(name):
+                fields[name] = self.collapsed_fields[name]()
+        return fields
+
+    def _is_response_root(self):
+        """Является ли сериализатор корневым (возможно, с many=True)."""
+        parent = getattr(self, 'parent', None)
+        if isinstance(parent, ListSerializer):
+            parent = getattr(parent, 'parent', None)
+        return parent is None
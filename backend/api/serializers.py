@@ -1,6 +1,7 @@
 """Сериализаторы для проекта."""
 
 from drf_extra_fields.fields import Base64ImageField
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.db import transaction
 from djoser.serializers import UserSerializer as BaseUserSerializer
@@ -15,13 +16,25 @@ from recipes.models import (
     ShoppingCart,
     Favorite,
 )
-from .constants import MIN_VALUE, RECIPE_COUNT
+from recipes.changes import record_recipe_changes
+from recipes.documents import bump_document_version, get_documents
+from recipes.services import file_hash
+from recipes.shopping_list import bump_cart_version_for_recipes
+from recipes.tasks import delete_orphaned_media
+from .fieldsets import SparseFieldsetMixin
+from .constants import (
+    BULK_RECIPES_LIMIT,
+    CHANGES_BATCH_SIZE,
+    CHANGES_MAX_BATCH_SIZE,
+    MIN_VALUE,
+    RECIPE_COUNT,
+)
 
 
 User = get_user_model()
 
 
-class UserSerializer(BaseUserSerializer):
+class UserSerializer(SparseFieldsetMixin, BaseUserSerializer):
     """Сериализатор пользователя."""
 
     is_subscribed = serializers.SerializerMethodField()
@@ -36,6 +49,9 @@ class UserSerializer(BaseUserSerializer):
 
     def get_is_subscribed(self, obj):
         """Метод для подписок."""
+        subscribed = getattr(obj, 'subscribed', None)
+        if subscribed is not None:
+            return subscribed
         return (
             self.context.get('request')
             and self.context['request'].user.is_authenticated
@@ -80,6 +96,18 @@ class RecipeIngredientReadSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'measurement_unit', 'amount')
 
 
+class RecipeIngredientAmountSerializer(serializers.ModelSerializer):
+    """Сериализатор свернутого ингредиента рецепта (id и количество)."""
+
+    id = serializers.ReadOnlyField(source='ingredient_id')
+
+    class Meta:
+        """Мета класс для рецептов."""
+
+        model = RecipeIngredient
+        fields = ('id', 'amount')
+
+
 class RecipeIngredientWriteSerializer(serializers.ModelSerializer):
     """Сериализатор для записи ингридиентов."""
 
@@ -93,9 +121,17 @@ class RecipeIngredientWriteSerializer(serializers.ModelSerializer):
         fields = ('id', 'amount')
 
 
-class RecipeSerializer(serializers.ModelSerializer):
+class RecipeSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Сериализатор детальной страницы рецепта."""
 
+    collapsed_fields = {
+        'author': lambda: serializers.PrimaryKeyRelatedField(read_only=True),
+        'tags': lambda: serializers.PrimaryKeyRelatedField(
+            many=True, read_only=True),
+        'ingredients': lambda: RecipeIngredientAmountSerializer(
+            many=True, source='recipe_ingredients'),
+    }
+
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
     tags = TagSerializer(many=True)
@@ -116,8 +152,18 @@ class RecipeSerializer(serializers.ModelSerializer):
             'is_in_shopping_cart'
         )
 
+    def to_representation(self, instance):
+        """Передает автору подписку, посчитанную в запросе рецептов."""
+        subscribed = getattr(instance, 'author_subscribed', None)
+        if subscribed is not None:
+            instance.author.subscribed = subscribed
+        return super().to_representation(instance)
+
     def get_is_favorited(self, obj):
         """Метод для избранного."""
+        favorited = getattr(obj, 'favorited', None)
+        if favorited is not None:
+            return favorited
         return (
             self.context.get('request')
             and self.context['request'].user.is_authenticated
@@ -127,6 +173,9 @@ class RecipeSerializer(serializers.ModelSerializer):
 
     def get_is_in_shopping_cart(self, obj):
         """Метод для корзины покупок."""
+        in_shopping_cart = getattr(obj, 'in_shopping_cart', None)
+        if in_shopping_cart is not None:
+            return in_shopping_cart
         return (
             self.context.get('request')
             and self.context['request'].user.is_authenticated
@@ -178,6 +227,31 @@ class ShoppingCartSerializer(BaseUserRecipeSerializer):
         verbose_name = 'корзине'
 
 
+class RecipeIdsSerializer(serializers.Serializer):
+    """Сериализатор списка id рецептов для массовых операций."""
+
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=MIN_VALUE),
+        allow_empty=False,
+        max_length=BULK_RECIPES_LIMIT,
+    )
+
+    def validate_ids(self, value):
+        """Убирает повторяющиеся id, сохраняя порядок."""
+        return list(dict.fromkeys(value))
+
+
+class RecipeChangesQuerySerializer(serializers.Serializer):
+    """Параметры запроса изменений рецептов: курсор и размер пачки."""
+
+    since = serializers.IntegerField(min_value=0, required=False)
+    limit = serializers.IntegerField(
+        min_value=MIN_VALUE,
+        max_value=CHANGES_MAX_BATCH_SIZE,
+        default=CHANGES_BATCH_SIZE,
+    )
+
+
 class RecipeCreateSerializer(serializers.ModelSerializer):
     """Сериализатор для создания рецепта."""
 
@@ -213,26 +287,110 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
         )
         recipe.tags.set(tags)
         self._create_ingredients(recipe, ingredients_data)
+        record_recipe_changes((recipe.pk,))
         return recipe
 
     @transaction.atomic
     def update(self, instance, validated_data):
-        """Метод редактирования рецепта."""
+        """Метод редактирования рецепта.
+
+        Изменения применяются по разнице с текущим состоянием: теги и
+        ингредиенты трогаются только при отличиях, изображение не
+        перезаписывается, если его содержимое не изменилось, а в
+        UPDATE попадают только изменившиеся поля. Версия документа
+        рецепта растет, только если что-то изменилось.
+        """
         tags = validated_data.pop('tags', None)
         ingredients_data = validated_data.pop('ingredients', None)
+        image = validated_data.get('image')
+        changed = False
 
-        if tags is not None:
+        if tags is not None and {tag.pk for tag in tags} != set(
+                instance.tags.values_list('pk', flat=True)):
+            # set() сам вычисляет разницу и не трогает совпадающие связи.
             instance.tags.set(tags)
+            changed = True
+
+        if ingredients_data is not None and self._update_ingredients(
+                instance, ingredients_data):
+            bump_cart_version_for_recipes((instance.pk,))
+            changed = True
+
+        if image is not None and self._same_image(instance.image, image):
+            validated_data.pop('image')
+        elif image is not None and instance.image:
+            delete_orphaned_media.delay(
+                delay_seconds=settings.MEDIA_CLEANUP_DELAY,
+                names=[instance.image.name],
+            )
 
-        if ingredients_data is not None:
-            instance.recipe_ingredients.all().delete()
-            self._create_ingredients(instance, ingredients_data)
+        changed_fields = []
+        for attr, value in validated_data.items():
+            if getattr(instance, attr) != value:
+                setattr(instance, attr, value)
+                changed_fields.append(attr)
+        if changed_fields:
+            instance.save(update_fields=changed_fields)
+        if changed or changed_fields:
+            # Запрос без изменений не сбрасывает документ рецепта и не
+            # пишет запись в журнал изменений.
+            bump_document_version(pk=instance.pk)
+        return instance
+
+    @classmethod
+    def _update_ingredients(cls, recipe, ingredients_data):
+        """Обновляет ингредиенты рецепта по разнице с текущими.
+
+        Возвращает True, если состав рецепта изменился.
+        """
+        current = {
+            recipe_ingredient.ingredient_id: recipe_ingredient
+            for recipe_ingredient in recipe.recipe_ingredients.all()
+        }
+        amounts = {
+            ingredient_data['id'].id: ingredient_data['amount']
+            for ingredient_data in ingredients_data
+        }
+
+        removed = current.keys() - amounts.keys()
+        if removed:
+            recipe.recipe_ingredients.filter(
+                ingredient_id__in=removed).delete()
+
+        changed = []
+        for ingredient_id, recipe_ingredient in current.items():
+            amount = amounts.get(ingredient_id)
+            if amount is not None and recipe_ingredient.amount != amount:
+                recipe_ingredient.amount = amount
+                changed.append(recipe_ingredient)
+        if changed:
+            RecipeIngredient.objects.bulk_update(changed, ('amount',))
+
+        added = [
+            ingredient_data for ingredient_data in ingredients_data
+            if ingredient_data['id'].id not in current
+        ]
+        cls._create_ingredients(recipe, added)
+        return bool(removed or changed or added)
 
-        return super().update(instance, validated_data)
+    @staticmethod
+    def _same_image(current, uploaded):
+        """Проверяет, совпадает ли новое изображение с сохраненным."""
+        if not current:
+            return False
+        try:
+            if current.size != uploaded.size:
+                return False
+            with current.open('rb') as stored:
+                return file_hash(stored) == file_hash(uploaded)
+        except OSError:
+            return False
 
     @staticmethod
     def _create_ingredients(recipe, ingredients_data):
         """Метод для ингридиентов рецепта."""
+        if not ingredients_data:
+            return
         RecipeIngredient.objects.bulk_create([
             RecipeIngredient(
                 recipe=recipe,
@@ -313,6 +471,11 @@ class SubscriptionSerializer(serializers.ModelSerializer):
 class SubscriptionListSerializer(UserSerializer):
     """Сериализатор для вывода подписок."""
 
+    collapsed_fields = {
+        'recipes': lambda: serializers.SerializerMethodField(
+            method_name='get_recipe_ids'),
+    }
+
     recipes = serializers.SerializerMethodField()
     recipes_count = serializers.IntegerField(
         read_only=True, default=RECIPE_COUNT
@@ -323,8 +486,8 @@ class SubscriptionListSerializer(UserSerializer):
 
         fields = UserSerializer.Meta.fields + ('recipes', 'recipes_count')
 
-    def get_recipes(self, obj):
-        """Метод вывода подписок."""
+    def _get_limited_recipes(self, obj):
+        """Рецепты автора с учетом параметра recipes_limit."""
         request = self.context.get('request')
         limit = request.query_params.get('recipes_limit') if request else None
         recipes = obj.recipes.all()
@@ -333,8 +496,92 @@ class SubscriptionListSerializer(UserSerializer):
                 recipes = recipes[:int(limit)]
             except ValueError:
                 pass
+        return recipes
+
+    def get_recipes(self, obj):
+        """Метод вывода подписок."""
         return ShortRecipeSerializer(
-            recipes,
+            self._get_limited_recipes(obj),
             many=True,
             context=self.context
         ).data
+
+    def get_recipe_ids(self, obj):
+        """Метод вывода id рецептов автора (свернутые рецепты)."""
+        return [recipe.id for recipe in self._get_limited_recipes(obj)]
+
+
+class RecipeReadListSerializer(serializers.ListSerializer):
+    """Список рецептов для RecipeReadSerializer.
+
+    Документы рецептов и подписки на авторов загружаются одним
+    запросом на каждый вид для всей страницы.
+    """
+
+    def to_representation(self, data):
+        """Преобразует строки рецептов в список словарей."""
+        rows = list(data)
+        self.child.related = self.child.load_related(rows)
+        return [self.child.to_representation(row) for row in rows]
+
+
+class RecipeReadSerializer(serializers.BaseSerializer):
+    """Быстрый сериализатор для чтения рецептов.
+
+    Строит тот же JSON, что и RecipeSerializer, из предвычисленных
+    документов рецептов (recipes.documents), добавляя в них только
+    поля текущего пользователя: избранное, корзину и подписку на
+    автора из строк values() (см. RecipeViewSet.get_queryset).
+    """
+
+    row_fields = (
+        'id', 'author_id', 'document_version', 'favorited',
+        'in_shopping_cart'
+    )
+    related = None
+
+    class Meta:
+        """Мета класс для списка рецептов."""
+
+        list_serializer_class = RecipeReadListSerializer
+
+    def load_related(self, rows):
+        """Загружает документы рецептов и подписки на их авторов."""
+        documents = get_documents({
+            row['id']: row['document_version'] for row in rows
+        })
+        user = self._get_user()
+        subscribed = set()
+        if user is not None:
+            subscribed = set(Subscription.objects.filter(
+                user=user, author_id__in={row['author_id'] for row in rows}
+            ).order_by().values_list('author_id', flat=True))
+        return documents, subscribed
+
+    def to_representation(self, row):
+        """Дополняет документ рецепта полями текущего пользователя."""
+        if self.related is None:
+            self.related = self.load_related([row])
+        documents, subscribed = self.related
+        document = documents[row['id']]
+        author = document['author']
+        author['is_subscribed'] = author['id'] in subscribed
+        author['avatar'] = self._absolute_url(author['avatar'])
+        document['image'] = self._absolute_url(document['image'])
+        document['is_favorited'] = bool(row.get('favorited'))
+        document['is_in_shopping_cart'] = bool(row.get('in_shopping_cart'))
+        return document
+
+    def _get_user(self):
+        """Текущий пользователь или None для анонимного."""
+        request = self.context.get('request')
+        if request and request.user.is_authenticated:
+            return request.user
+        return None
+
+    def _absolute_url(self, url):
+        """URL файла так же, как его выводит ImageField сериализатора."""
+        request = self.context.get('request')
+        if url is None or request is None:
+            return url
+        return request.build_absolute_uri(url)
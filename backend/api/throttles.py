@@ -0,0 +1,183 @@
+"""Ограничение частоты запросов по алгоритму token bucket.
+
+Для каждого ключа (область + пользователь или IP) хранится корзина
+токенов, которая пополняется равномерно со скоростью из настроек;
+запрос забирает один токен. Корзины хранятся в файле SQLite
+THROTTLE_DB_PATH, общем для воркеров хоста, поэтому лимит не зависит
+от числа воркеров и от того, какой из них принял запрос.
+"""
+
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+
+from django.conf import settings
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+from .constants import THROTTLE_DB_TIMEOUT, THROTTLE_PRUNE_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_rate(rate):
+    """Разбирает частоту вида '10/min' в (емкость, токенов в секунду)."""
+    if rate is None:
+        return None
+    count, period = rate.split('/')
+    count = int(count)
+    return count, count / PERIODS[period[0]]
+
+
+class TokenBucketStore:
+    """Корзины токенов в файле SQLite, общем для процессов хоста.
+
+    Корзина читается и обновляется в одной транзакции BEGIN IMMEDIATE,
+    которая сериализует проверки всех процессов. Вместе с корзиной
+    хранится момент, когда она снова наполнится: такая корзина не
+    отличается от отсутствующей, и раз в THROTTLE_PRUNE_INTERVAL секунд
+    процесс удаляет наполнившиеся корзины. Соединения открываются по
+    одному на поток и заново после fork.
+    """
+
+    SCHEMA = (
+        'CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, '
+        'tokens REAL NOT NULL, updated REAL NOT NULL, full_at REAL NOT NULL)',
+        'CREATE INDEX IF NOT EXISTS buckets_full_at ON buckets (full_at)',
+    )
+
+    def __init__(self):
+        """Создает хранилище; файл открывается при первой проверке."""
+        self.local = threading.local()
+        self.last_prune = 0
+
+    def connect(self):
+        """Соединение потока с файлом корзин."""
+        path = settings.THROTTLE_DB_PATH
+        key = (os.getpid(), path)
+        if getattr(self.local, 'key', None) != key:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            connection = sqlite3.connect(
+                path, timeout=THROTTLE_DB_TIMEOUT, isolation_level=None)
+            # Корзины не жалко потерять при сбое питания.
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=OFF')
+            for statement in self.SCHEMA:
+                connection.execute(statement)
+            self.local.connection = connection
+            self.local.key = key
+        return self.local.connection
+
+    def consume(self, key, capacity, refill_rate):
+        """Забирает токен; возвращает (разрешено, сколько секунд ждать).
+
+        Если файл корзин недоступен, запрос пропускается: сбой
+        ограничителя не должен останавливать API.
+        """
+        now = time.time()
+        try:
+            connection = self.connect()
+            connection.execute('BEGIN IMMEDIATE')
+            try:
+                row = connection.execute(
+                    'SELECT tokens, updated FROM buckets WHERE key = ?',
+                    (key,)
+                ).fetchone()
+                tokens, updated = row or (capacity, now)
+                tokens = min(
+                    capacity, tokens + max(now - updated, 0) * refill_rate)
+                allowed = tokens >= 1
+                if allowed:
+                    tokens -= 1
+                connection.execute(
+                    'INSERT OR REPLACE INTO buckets VALUES (?, ?, ?, ?)',
+                    (key, tokens, now,
+                     now + (capacity - tokens) / refill_rate)
+                )
+                if now - self.last_prune >= THROTTLE_PRUNE_INTERVAL:
+                    self.last_prune = now
+                    connection.execute(
+                        'DELETE FROM buckets WHERE full_at <= ?', (now,))
+                connection.execute('COMMIT')
+            except BaseException:
+                connection.execute('ROLLBACK')
+                raise
+        except sqlite3.Error:
+            logger.exception('Хранилище корзин токенов недоступно')
+            return True, None
+        if allowed:
+            return True, None
+        return False, (1 - tokens) / refill_rate
+
+    def clear(self):
+        """Удаляет все корзины."""
+        self.connect().execute('DELETE FROM buckets')
+
+
+store = TokenBucketStore()
+
+
+class ActionTokenBucketThrottle(BaseThrottle):
+    """Базовый класс ограничения частоты для действий ViewSet.
+
+    Область ограничения берется из атрибута throttle_scopes view
+    (словарь действие -> область); действия без области и области без
+    частоты в DEFAULT_THROTTLE_RATES не ограничиваются.
+    """
+
+    rate_suffix = ''
+
+    def __init__(self):
+        """Готовит ограничение к проверке запроса."""
+        self.wait_time = None
+
+    def get_scope(self, view):
+        """Область ограничения для текущего действия."""
+        scopes = getattr(view, 'throttle_scopes', {})
+        return scopes.get(getattr(view, 'action', None))
+
+    def get_ident_key(self, request):
+        """Идентификатор клиента внутри области; по умолчанию IP."""
+        return self.get_ident(request)
+
+    def allow_request(self, request, view):
+        """Пропускает запрос, если в корзине клиента есть токен."""
+        scope = self.get_scope(view)
+        if scope is None:
+            return True
+        rate = parse_rate(
+            api_settings.DEFAULT_THROTTLE_RATES.get(scope + self.rate_suffix))
+        if rate is None:
+            return True
+        allowed, self.wait_time = store.consume(
+            f'{scope}{self.rate_suffix}:{self.get_ident_key(request)}',
+            *rate,
+        )
+        return allowed
+
+    def wait(self):
+        """Через сколько секунд появится токен (для Retry-After)."""
+        if self.wait_time is None:
+            return None
+        return math.ceil(self.wait_time)
+
+
+class UserTokenBucketThrottle(ActionTokenBucketThrottle):
+    """Ограничение на пользователя; анонимы ограничиваются по IP."""
+
+    def get_ident_key(self, request):
+        """Id пользователя или IP анонимного клиента."""
+        if request.user and request.user.is_authenticated:
+            return f'user:{request.user.pk}'
+        return f'ip:{self.get_ident(request)}'
+
+
+class IPTokenBucketThrottle(ActionTokenBucketThrottle):
+    """Ограничение на IP-адрес; частота задается как '<область>_ip'."""
+
+    rate_suffix = '_ip'
@@ -3,6 +3,7 @@
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
+from .events import events
 from .views import (IngredientViewSet,
                     RecipeViewSet, TagViewSet, UserViewSet)
 
@@ -14,6 +15,7 @@ router.register('ingredients', IngredientViewSet, basename='ingredients')
 router.register('recipes', RecipeViewSet, basename='recipes')
 
 urlpatterns = [
+    path('events/', events, name='events'),
     path('', include(router.urls)),
     path('auth/', include('djoser.urls.authtoken')),
 ]
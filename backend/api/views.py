@@ -1,17 +1,24 @@
 """View-классы для обработки запросов API приложения recipes."""
 
-from django.db.models import Sum, Count
-from django.http import FileResponse
+import io
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Exists, OuterRef, Prefetch, Value
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
 from djoser.views import UserViewSet as DjoserUserViewSet
 from django.shortcuts import get_object_or_404, reverse
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
 from rest_framework.permissions import (
+    IsAdminUser,
     IsAuthenticated,
     IsAuthenticatedOrReadOnly,
     AllowAny
 )
+from rest_framework.renderers import BrowsableAPIRenderer
 from rest_framework.response import Response
 
 from recipes.models import (
@@ -26,11 +33,27 @@ from recipes.models import (
     User,
     generate_hash,
 )
+from recipes.catalog import export_catalog
+from recipes.changes import read_changes, record_user_changes
+from recipes.documents import bump_document_version
+from recipes.purge import purge_recipe_batch, purge_user_later
+from recipes.tasks import delete_orphaned_media
+from recipes.shopping_list import (
+    FORMATS,
+    bump_cart_version,
+    get_etag,
+    get_shopping_list,
+)
 from .permissions import IsAuthorOrReadOnly
+from .renderers import ORJSONRenderer
+from .throttles import IPTokenBucketThrottle, UserTokenBucketThrottle
 from .serializers import (
+    RecipeChangesQuerySerializer,
     RecipeCreateSerializer,
     RecipeSerializer,
     FavoriteSerializer,
+    RecipeIdsSerializer,
+    RecipeReadSerializer,
     ShoppingCartSerializer,
     SubscriptionListSerializer,
     SubscriptionSerializer,
@@ -38,14 +61,50 @@ from .serializers import (
     IngredientSerializer,
     UserSerializer
 )
+from .fieldsets import Fieldset
 from .filters import IngredientFilter, RecipeFilterSet
 
+THROTTLE_CLASSES = (UserTokenBucketThrottle, IPTokenBucketThrottle)
+
+USER_COLUMNS = ('id', 'email', 'username', 'first_name', 'last_name', 'avatar')
+RECIPE_COLUMNS = ('name', 'image', 'text', 'cooking_time')
+SHORT_RECIPE_COLUMNS = ('id', 'author_id', 'name', 'image', 'cooking_time')
+
+
+def subscribed_to(user, outer_ref):
+    """Подзапрос: подписан ли пользователь на автора из outer_ref."""
+    return Exists(Subscription.objects.filter(
+        user=user, author=OuterRef(outer_ref)))
+
 
 class UserViewSet(DjoserUserViewSet):
     """ViewSet для работы с пользователями и подписками."""
 
     queryset = User.objects.all()
     serializer_class = UserSerializer
+    throttle_classes = THROTTLE_CLASSES
+    throttle_scopes = {
+        'create': 'signup',
+        'avatar': 'upload',
+        'subscribe': 'write',
+        'unsubscribe': 'write',
+    }
+
+    def get_queryset(self):
+        """Выбирает только поля и аннотации, нужные для ответа."""
+        queryset = super().get_queryset()
+        if self.action not in ('list', 'retrieve'):
+            return queryset
+        fieldset = Fieldset.from_request(self.request)
+        queryset = queryset.only(*(
+            column for column in USER_COLUMNS
+            if column == 'id' or fieldset.includes(column)
+        ))
+        if (fieldset.includes('is_subscribed')
+                and self.request.user.is_authenticated):
+            queryset = queryset.annotate(
+                subscribed=subscribed_to(self.request.user, 'pk'))
+        return queryset
 
     @action(detail=False, methods=('get',))
     def me(self, request):
@@ -57,11 +116,23 @@ class UserViewSet(DjoserUserViewSet):
         detail=False, methods=('get',), permission_classes=(IsAuthenticated,))
     def subscriptions(self, request):
         """Список подписок с пагинацией."""
+        fieldset = Fieldset.from_request(request)
         authors = User.objects.filter(
             subscriptions_to_author__user=request.user
-        ).annotate(
-            recipes_count=Count('recipes')
-        ).prefetch_related('recipes').order_by('username')
+        ).only(*(
+            column for column in USER_COLUMNS
+            if column == 'id' or fieldset.includes(column)
+        )).annotate(subscribed=Value(True)).order_by('username')
+        if fieldset.includes('recipes_count'):
+            authors = authors.annotate(recipes_count=Count('recipes'))
+        if fieldset.includes('recipes'):
+            authors = authors.prefetch_related(Prefetch(
+                'recipes',
+                queryset=Recipe.objects.only(
+                    *SHORT_RECIPE_COLUMNS if fieldset.expands('recipes')
+                    else ('id', 'author_id')
+                )
+            ))
 
         page = self.paginate_queryset(authors)
         serializer = SubscriptionListSerializer(
@@ -87,6 +158,7 @@ class UserViewSet(DjoserUserViewSet):
         serializer.is_valid(raise_exception=True)
 
         serializer.save()
+        record_user_changes(Subscription, request.user.pk, (author.id,))
 
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
@@ -97,11 +169,29 @@ class UserViewSet(DjoserUserViewSet):
             user=request.user,
             author_id=id
         ).delete()
+        if deleted:
+            record_user_changes(
+                Subscription, request.user.pk, (int(id),), deleted=True)
         return Response(
             status=status.HTTP_204_NO_CONTENT if deleted
             else status.HTTP_400_BAD_REQUEST
         )
 
+    def perform_update(self, serializer, *args, **kwargs):
+        """Сохраняет профиль и обновляет документы рецептов автора."""
+        super().perform_update(serializer, *args, **kwargs)
+        bump_document_version(author=serializer.instance)
+
+    def perform_destroy(self, instance):
+        """Деактивирует пользователя и ставит удаление его данных в очередь."""
+        purge_user_later(instance)
+
+    @staticmethod
+    def _cleanup_media(name):
+        """Ставит в очередь удаление замененного файла."""
+        delete_orphaned_media.delay(
+            delay_seconds=settings.MEDIA_CLEANUP_DELAY, names=[name])
+
     @action(
         methods=('put',),
         detail=False,
@@ -111,6 +201,7 @@ class UserViewSet(DjoserUserViewSet):
     )
     def avatar(self, request):
         """Обновление аватара текущего пользователя."""
+        previous = request.user.avatar.name
         serializer = self.get_serializer(
             request.user,
             data=request.data,
@@ -118,13 +209,25 @@ class UserViewSet(DjoserUserViewSet):
         )
         serializer.is_valid(raise_exception=True)
         serializer.save()
+        bump_document_version(author=request.user)
+        if previous and previous != request.user.avatar.name:
+            self._cleanup_media(previous)
         return Response(serializer.data)
 
     @avatar.mapping.delete
     def delete_avatar(self, request):
-        """Удаление аватара текущего пользователя."""
+        """Удаление аватара текущего пользователя.
+
+        Файл удаляется фоновой задачей, если на него больше нет ссылок:
+        с дедупликацией он может быть общим.
+        """
         user = request.user
-        user.avatar.delete()
+        previous = user.avatar.name
+        user.avatar = None
+        user.save(update_fields=('avatar',))
+        bump_document_version(author=user)
+        if previous:
+            self._cleanup_media(previous)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
@@ -151,22 +254,120 @@ class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
 class RecipeViewSet(viewsets.ModelViewSet):
     """ViewSet для работы с рецептами."""
 
-    queryset = Recipe.objects.prefetch_related(
-        'tags', 'ingredients').select_related('author')
+    queryset = Recipe.objects.all()
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilterSet
     permission_classes = (IsAuthenticatedOrReadOnly, IsAuthorOrReadOnly)
+    renderer_classes = (ORJSONRenderer, BrowsableAPIRenderer)
+    throttle_classes = THROTTLE_CLASSES
+    throttle_scopes = {
+        'create': 'upload',
+        'update': 'upload',
+        'partial_update': 'upload',
+        'download_shopping_cart': 'download',
+        'get_link': 'link',
+        'favorite_bulk': 'write',
+        'shopping_cart_bulk': 'write',
+        'clear_shopping_cart': 'write',
+    }
+
+    @property
+    def uses_read_serializer(self):
+        """Можно ли отдать ответ быстрым RecipeReadSerializer."""
+        return (
+            self.action in ('list', 'retrieve', 'changes')
+            and Fieldset.from_request(self.request).is_default
+        )
+
+    def get_queryset(self):
+        """Загружает только то, что попадет в ответ списка/рецепта.
+
+        Учитываются параметры ?fields=, ?omit= и ?expand=: пропущенные
+        поля не выбираются из базы, а для свернутых вложенных объектов
+        загружаются только их id.
+        """
+        queryset = super().get_queryset()
+        if self.action not in ('list', 'retrieve', 'changes'):
+            return queryset
+
+        fieldset = Fieldset.from_request(self.request)
+        user = self.request.user
+        if self.uses_read_serializer:
+            if user.is_authenticated:
+                queryset = queryset.annotate(
+                    favorited=Exists(Favorite.objects.filter(
+                        user=user, recipe=OuterRef('pk'))),
+                    in_shopping_cart=Exists(ShoppingCart.objects.filter(
+                        user=user, recipe=OuterRef('pk'))),
+                )
+            return queryset.values(*(
+                field for field in RecipeReadSerializer.row_fields
+                if user.is_authenticated
+                or field not in ('favorited', 'in_shopping_cart')
+            ))
+
+        columns = ['id', *(
+            column for column in RECIPE_COLUMNS if fieldset.includes(column)
+        )]
+
+        if fieldset.expands('author'):
+            queryset = queryset.select_related('author')
+            columns.extend(f'author__{column}' for column in USER_COLUMNS)
+            if user.is_authenticated:
+                queryset = queryset.annotate(
+                    author_subscribed=subscribed_to(user, 'author'))
+        elif fieldset.includes('author'):
+            columns.append('author')
+
+        if fieldset.includes('tags'):
+            queryset = queryset.prefetch_related(Prefetch(
+                'tags',
+                queryset=(
+                    Tag.objects.all() if fieldset.expands('tags')
+                    else Tag.objects.only('id')
+                )
+            ))
+
+        if fieldset.includes('ingredients'):
+            queryset = queryset.prefetch_related(Prefetch(
+                'recipe_ingredients',
+                queryset=(
+                    RecipeIngredient.objects.select_related('ingredient')
+                    if fieldset.expands('ingredients')
+                    else RecipeIngredient.objects.only(
+                        'recipe_id', 'ingredient_id', 'amount')
+                )
+            ))
+
+        if user.is_authenticated:
+            if fieldset.includes('is_favorited'):
+                queryset = queryset.annotate(favorited=Exists(
+                    Favorite.objects.filter(user=user, recipe=OuterRef('pk'))
+                ))
+            if fieldset.includes('is_in_shopping_cart'):
+                queryset = queryset.annotate(in_shopping_cart=Exists(
+                    ShoppingCart.objects.filter(
+                        user=user, recipe=OuterRef('pk'))
+                ))
+
+        return queryset.only(*columns)
 
     def get_serializer_class(self):
         """Возвращает класс сериализатора в зависимости от действия."""
         if self.action in ('create', 'update', 'partial_update'):
             return RecipeCreateSerializer
+        if self.uses_read_serializer:
+            return RecipeReadSerializer
         return RecipeSerializer
 
     def perform_create(self, serializer):
         """Создает рецепт с текущим пользователем в качестве автора."""
         serializer.save(author=self.request.user)
 
+    def perform_destroy(self, instance):
+        """Удаляет рецепт со связанными строками без загрузки в память."""
+        purge_recipe_batch((instance.pk,))
+
     def _handle_favorite_shopping_action(self, serializer_class, request, pk):
         """Общий метод для добавления в избранное/корзину."""
         data = {
@@ -179,6 +380,9 @@ class RecipeViewSet(viewsets.ModelViewSet):
         )
         serializer.is_valid(raise_exception=True)
         serializer.save()
+        record_user_changes(
+            serializer_class.Meta.model, request.user.pk,
+            (serializer.instance.recipe_id,))
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     def _handle_favorite_shopping_delete(self, model, request, pk):
@@ -187,12 +391,99 @@ class RecipeViewSet(viewsets.ModelViewSet):
             user=request.user,
             recipe_id=pk
         ).delete()
+        if deleted_count:
+            record_user_changes(model, request.user.pk, (pk,), deleted=True)
 
         return Response(
             status=status.HTTP_204_NO_CONTENT if deleted_count
             else status.HTTP_400_BAD_REQUEST
         )
 
+    @staticmethod
+    def _insert_missing(model, user, recipe_ids, present):
+        """Добавляет строки model для recipe_ids, которых еще нет.
+
+        Если параллельный запрос успел добавить часть строк, вставка
+        повторяется без них, а их id попадают в present: такие рецепты
+        не считаются добавленными этим запросом.
+        """
+        while recipe_ids:
+            try:
+                with transaction.atomic():
+                    model.objects.bulk_create(
+                        model(user=user, recipe_id=recipe_id)
+                        for recipe_id in recipe_ids
+                    )
+                return
+            except IntegrityError:
+                added = set(model.objects.filter(
+                    user=user, recipe_id__in=recipe_ids
+                ).values_list('recipe_id', flat=True))
+                if not added:
+                    raise
+                present |= added
+                recipe_ids = [
+                    recipe_id for recipe_id in recipe_ids
+                    if recipe_id not in added
+                ]
+
+    def _handle_bulk_action(self, model, request):
+        """Общий метод массового добавления/удаления избранного/корзины.
+
+        Все id обрабатываются в одной транзакции, для каждого id
+        возвращается результат: added/exists/not_found при добавлении
+        и removed/absent при удалении.
+        """
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = serializer.validated_data['ids']
+
+        with transaction.atomic():
+            present = set(model.objects.filter(
+                user=request.user,
+                recipe_id__in=ids
+            ).values_list('recipe_id', flat=True))
+            if request.method == 'POST':
+                found = set(Recipe.objects.filter(
+                    id__in=ids).values_list('id', flat=True))
+                self._insert_missing(
+                    model, request.user, [
+                        recipe_id for recipe_id in ids
+                        if recipe_id in found and recipe_id not in present
+                    ], present)
+                outcomes = {
+                    recipe_id: (
+                        'exists' if recipe_id in present
+                        else 'added' if recipe_id in found
+                        else 'not_found'
+                    )
+                    for recipe_id in ids
+                }
+                record_user_changes(model, request.user.pk, [
+                    recipe_id for recipe_id, outcome in outcomes.items()
+                    if outcome == 'added'
+                ])
+            else:
+                model.objects.filter(
+                    user=request.user,
+                    recipe_id__in=present
+                ).delete()
+                record_user_changes(
+                    model, request.user.pk, present, deleted=True)
+                outcomes = {
+                    recipe_id: (
+                        'removed' if recipe_id in present else 'absent'
+                    )
+                    for recipe_id in ids
+                }
+
+        return Response({
+            'results': [
+                {'id': recipe_id, 'status': outcomes[recipe_id]}
+                for recipe_id in ids
+            ]
+        })
+
     @action(
         detail=True,
         methods=('post',),
@@ -212,6 +503,18 @@ class RecipeViewSet(viewsets.ModelViewSet):
             Favorite, request, pk
         )
 
+    @action(
+        detail=False,
+        methods=('post', 'delete'),
+        url_path='favorite/bulk',
+        url_name='favorite-bulk',
+        permission_classes=(IsAuthenticated,),
+        serializer_class=RecipeIdsSerializer
+    )
+    def favorite_bulk(self, request):
+        """Массовое добавление/удаление рецептов в избранном."""
+        return self._handle_bulk_action(Favorite, request)
+
     @action(
         detail=True,
         methods=('post',),
@@ -220,46 +523,134 @@ class RecipeViewSet(viewsets.ModelViewSet):
     )
     def shopping_cart(self, request, pk=None):
         """Добавление рецепта в корзину."""
-        return self._handle_favorite_shopping_action(
+        response = self._handle_favorite_shopping_action(
             ShoppingCartSerializer, request, pk
         )
+        if response.status_code == status.HTTP_201_CREATED:
+            bump_cart_version((request.user.pk,))
+        return response
 
     @shopping_cart.mapping.delete
     def delete_shopping_cart(self, request, pk=None):
         """Удаление рецепта из корзины."""
-        return self._handle_favorite_shopping_delete(
+        response = self._handle_favorite_shopping_delete(
             ShoppingCart, request, pk
         )
+        if response.status_code == status.HTTP_204_NO_CONTENT:
+            bump_cart_version((request.user.pk,))
+        return response
 
-    @staticmethod
-    def _generate_shopping_list_text(ingredients):
-        return '\n'.join(
-            f'{item["ingredient__name"]} '
-            f'({item["ingredient__measurement_unit"]}) - '
-            f'{item["total_amount"]}'
-            for item in ingredients
-        )
+    @action(
+        detail=False,
+        methods=('post', 'delete'),
+        url_path='shopping_cart/bulk',
+        url_name='shopping-cart-bulk',
+        permission_classes=(IsAuthenticated,),
+        serializer_class=RecipeIdsSerializer
+    )
+    def shopping_cart_bulk(self, request):
+        """Массовое добавление/удаление рецептов в корзине."""
+        response = self._handle_bulk_action(ShoppingCart, request)
+        if any(
+            result['status'] in ('added', 'removed')
+            for result in response.data['results']
+        ):
+            bump_cart_version((request.user.pk,))
+        return response
+
+    @action(
+        detail=False,
+        methods=('delete',),
+        url_path='shopping_cart',
+        url_name='shopping-cart-clear',
+        permission_classes=(IsAuthenticated,)
+    )
+    def clear_shopping_cart(self, request):
+        """Очищает корзину покупок текущего пользователя."""
+        with transaction.atomic():
+            cart = ShoppingCart.objects.filter(user=request.user)
+            removed = list(cart.values_list('recipe_id', flat=True))
+            cart.delete()
+            record_user_changes(
+                ShoppingCart, request.user.pk, removed, deleted=True)
+        if removed:
+            bump_cart_version((request.user.pk,))
+        return Response(status=status.HTTP_204_NO_CONTENT)
 
     @action(
         detail=False, methods=('get',),
         permission_classes=(IsAuthenticated,))
     def download_shopping_cart(self, request):
-        """Скачивает список покупок в виде текстового файла."""
-        ingredients = RecipeIngredient.objects.filter(
-            recipe__shoppingcart__user=request.user
-        ).values(
-            'ingredient__name',
-            'ingredient__measurement_unit'
-        ).annotate(total_amount=Sum('amount')).order_by('ingredient__name')
-
-        response = FileResponse(
-            self._generate_shopping_list_text(ingredients),
-            content_type='text/plain',
-            as_attachment=True,
-            filename='shopping_list.txt'
-        )
+        """Скачивает список покупок в виде текстового файла.
+
+        Файл кешируется до изменения корзины; по If-None-Match с
+        актуальным ETag возвращается 304 без сборки списка.
+        """
+        format_name = 'txt'
+        shopping_list_format = FORMATS[format_name]
+        etag = get_etag(request.user, format_name)
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = FileResponse(
+                io.BytesIO(get_shopping_list(request.user, format_name)),
+                content_type=shopping_list_format.content_type,
+                as_attachment=True,
+                filename=shopping_list_format.filename
+            )
+        response['ETag'] = etag
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+    @action(
+        detail=False, methods=('get',),
+        permission_classes=(IsAdminUser,))
+    def export(self, request):
+        """Выгружает каталог рецептов в NDJSON для import_recipes.
+
+        Ответ формируется по мере чтения рецептов пакетами.
+        """
+        response = StreamingHttpResponse(
+            export_catalog(), content_type='application/x-ndjson')
+        response['Content-Disposition'] = (
+            'attachment; filename="recipes.ndjson"')
         return response
 
+    @action(detail=False, methods=('get',))
+    def changes(self, request):
+        """Рецепты, избранное, корзина и подписки после курсора.
+
+        Без ?since= возвращает только текущий курсор: клиент берет его
+        перед полной загрузкой списка. Рецепты отдаются в том же виде,
+        что и в списке; reset: true означает, что курсор устарел и
+        список нужно загрузить заново.
+        """
+        params = RecipeChangesQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        batch = read_changes(
+            request.user.pk if request.user.is_authenticated else None,
+            params.validated_data.get('since'),
+            params.validated_data['limit'],
+        )
+        updated = self.get_serializer_class()(
+            self.get_queryset().filter(pk__in=batch.updated),
+            many=True,
+            context=self.get_serializer_context(),
+        ).data
+        found = {recipe['id'] for recipe in updated}
+        return Response({
+            'cursor': batch.cursor,
+            'has_more': batch.has_more,
+            'reset': batch.reset,
+            'recipes': {
+                'updated': updated,
+                'deleted': batch.deleted + [
+                    pk for pk in batch.updated if pk not in found],
+            },
+            'favorites': batch.favorites,
+            'shopping_cart': batch.shopping_cart,
+            'subscriptions': batch.subscriptions,
+        })
+
     @action(
         methods=('get',),
         detail=True,
@@ -0,0 +1,40 @@
+"""Шаги прогрева приложения api (см. foodgram.warmup)."""
+
+from django.urls import get_resolver, resolve
+from rest_framework.serializers import (
+    BaseSerializer,
+    ListSerializer,
+    ModelSerializer,
+)
+
+from recipes.models import Recipe
+from . import serializers
+from .filters import RecipeFilterSet
+
+
+def build_url_resolver():
+    """Компилирует URL-шаблоны и таблицу обратного разрешения."""
+    get_resolver().reverse_dict
+    resolve('/api/recipes/')
+
+
+def build_serializer_fields():
+    """Строит поля всех сериализаторов API."""
+    for serializer_class in vars(serializers).values():
+        if not (
+            isinstance(serializer_class, type)
+            and issubclass(serializer_class, BaseSerializer)
+            and serializer_class.__module__ == serializers.__name__
+        ) or issubclass(serializer_class, ListSerializer):
+            continue
+        if issubclass(serializer_class, ModelSerializer) and not hasattr(
+            serializer_class, 'Meta'
+        ):
+            # Абстрактная база без модели.
+            continue
+        getattr(serializer_class(context={}), 'fields', None)
+
+
+def build_filter_forms():
+    """Строит форму фильтров списка рецептов."""
+    RecipeFilterSet(queryset=Recipe.objects.none()).form
@@ -3,14 +3,24 @@ ASGI config for foodgram project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Besides regular requests, the ASGI app serves the long-lived event stream
+at /api/events/ (api.events), which is unavailable under WSGI. Like
+foodgram.wsgi, the module warms the process up before it takes traffic.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
 """
 
 import os
+import time
 
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.settings')
 
+started = time.perf_counter()
 application = get_asgi_application()
+
+from foodgram.warmup import warm_up  # noqa: E402
+
+warm_up(setup_seconds=time.perf_counter() - started)
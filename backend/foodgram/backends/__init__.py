@@ -0,0 +1 @@
+"""Доработанные бэкенды баз данных."""
@@ -0,0 +1,190 @@
+"""Пул соединений с базой внутри процесса.
+
+Пул не зависит от драйвера: соединение создает переданная функция
+connect, проверку перед выдачей делает функция check. Держит не больше
+size простаивающих соединений и открывает до max_overflow сверх них под
+пиковую нагрузку; когда все заняты, запрос ждет освобождения не дольше
+timeout секунд. Соединения старше max_lifetime или простоявшие дольше
+max_idle закрываются вместо выдачи.
+"""
+
+import os
+import threading
+import time
+from collections import deque
+
+pools = {}
+# Пулы, унаследованные от родителя при fork: их сокеты общие с
+# родителем, поэтому соединения нельзя ни закрывать, ни отдавать сборщику
+# мусора (драйвер закрыл бы соединение на сервере).
+inherited = []
+
+
+class PoolTimeoutError(Exception):
+    """Свободное соединение не появилось за отведенное время."""
+
+
+class ConnectionPool:
+    """Ограниченный пул соединений, безопасный для потоков."""
+
+    counters = (
+        'connects', 'checkouts', 'waits', 'timeouts', 'discarded',
+        'wait_seconds')
+
+    def __init__(self, size=5, max_overflow=5, timeout=10.0,
+                 max_idle=300.0, max_lifetime=3600.0):
+        """Создает пустой пул; соединения открываются по запросу."""
+        self.size = size
+        self.max_overflow = max_overflow
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.max_lifetime = max_lifetime
+        self.pid = os.getpid()
+        self.condition = threading.Condition()
+        self.idle = deque()
+        self.born = {}
+        self.opened = 0
+        self.stats = dict.fromkeys(self.counters, 0)
+
+    def acquire(self, connect, check):
+        """Выдает проверенное соединение из пула или открывает новое.
+
+        check(conn) возвращает False для непригодного соединения: оно
+        закрывается, и выдается следующее.
+        """
+        deadline = time.monotonic() + self.timeout
+        with self.condition:
+            self.stats['checkouts'] += 1
+        while True:
+            conn, released = self._checkout(deadline)
+            if conn is None:
+                return self._connect(connect)
+            if not self._expired(conn, released) and check(conn):
+                return conn
+            self._discard(conn)
+
+    def release(self, conn, reusable=True):
+        """Возвращает соединение в пул или закрывает лишнее и негодное."""
+        now = time.monotonic()
+        if reusable and not self._expired(conn, now):
+            with self.condition:
+                if len(self.idle) < self.size:
+                    self.idle.append((conn, now))
+                    self.condition.notify()
+                    return
+        self._discard(conn)
+
+    def snapshot(self):
+        """Возвращает текущее состояние и счетчики пула."""
+        with self.condition:
+            return {
+                'size': self.size,
+                'max_overflow': self.max_overflow,
+                'idle': len(self.idle),
+                'in_use': self.opened - len(self.idle),
+                **self.stats,
+            }
+
+    def close_idle(self):
+        """Закрывает все простаивающие соединения."""
+        with self.condition:
+            idle = list(self.idle)
+            self.idle.clear()
+        for conn, _ in idle:
+            self._discard(conn)
+
+    def _checkout(self, deadline):
+        """Берет свободное соединение или резервирует место под новое.
+
+        Возвращает (соединение, время возврата в пул) или (None, None),
+        если нужно открыть новое соединение.
+        """
+        started = time.monotonic()
+        with self.condition:
+            waited = False
+            while True:
+                if self.idle:
+                    # Последнее возвращенное: лишние соединения остаются
+                    # в хвосте и закрываются по max_idle.
+                    conn, released = self.idle.pop()
+                    break
+                if self.opened < self.size + self.max_overflow:
+                    self.opened += 1
+                    conn, released = None, None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.stats['timeouts'] += 1
+                    raise PoolTimeoutError(
+                        f'Нет свободного соединения за {self.timeout} с '
+                        f'(занято {self.opened})')
+                if not waited:
+                    self.stats['waits'] += 1
+                    waited = True
+                self.condition.wait(remaining)
+            if waited:
+                self.stats['wait_seconds'] += time.monotonic() - started
+        return conn, released
+
+    def _connect(self, connect):
+        """Открывает соединение на зарезервированном месте."""
+        try:
+            conn = connect()
+        except BaseException:
+            with self.condition:
+                self.opened -= 1
+                self.condition.notify()
+            raise
+        with self.condition:
+            self.born[id(conn)] = time.monotonic()
+            self.stats['connects'] += 1
+        return conn
+
+    def _expired(self, conn, released):
+        """Пора ли закрыть соединение по возрасту или простою."""
+        now = time.monotonic()
+        born = self.born.get(id(conn), now)
+        return (now - born > self.max_lifetime
+                or now - released > self.max_idle)
+
+    def _discard(self, conn):
+        """Закрывает соединение и освобождает его место в пуле."""
+        try:
+            conn.close()
+        except Exception:
+            pass
+        with self.condition:
+            self.born.pop(id(conn), None)
+            self.opened -= 1
+            self.stats['discarded'] += 1
+            self.condition.notify()
+
+
+def get_pool(alias, options):
+    """Возвращает пул соединения alias в текущем процессе."""
+    pool = pools.get(alias)
+    if pool is not None and pool.pid != os.getpid():
+        inherited.append(pools.pop(alias))
+        pool = None
+    if pool is None:
+        pool = pools.setdefault(alias, ConnectionPool(**options))
+    return pool
+
+
+def close_pools():
+    """Закрывает простаивающие соединения пулов текущего процесса.
+
+    Вызывается перед fork (gunicorn --preload): иначе каждый воркер
+    унаследует сокеты мастера в inherited.
+    """
+    for pool in list(pools.values()):
+        if pool.pid == os.getpid():
+            pool.close_idle()
+
+
+def pool_stats():
+    """Возвращает состояние пулов текущего процесса по алиасам."""
+    return {
+        alias: pool.snapshot() for alias, pool in list(pools.items())
+        if pool.pid == os.getpid()
+    }
@@ -0,0 +1,79 @@
+"""PostgreSQL с пулом соединений внутри процесса.
+
+Вместо открытия соединения соединение берется из пула
+(foodgram.backends.pool), а закрытие в конце запроса возвращает его
+обратно. Пул общий для потоков процесса, поэтому работает и в
+синхронном gunicorn, и под ASGI, где каждый запрос обслуживает свой
+поток. Параметры пула задаются в OPTIONS['pool'].
+"""
+
+from functools import partial
+
+from django.db.backends.postgresql import base
+from psycopg2 import extensions
+
+from ..pool import PoolTimeoutError, get_pool
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """Соединение PostgreSQL, переиспользуемое через пул."""
+
+    def get_connection_params(self):
+        """Отделяет параметры пула от параметров psycopg2.connect."""
+        options = dict(self.settings_dict['OPTIONS'])
+        self.pool_options = dict(options.pop('pool', {}))
+        self.pre_ping = self.pool_options.pop('pre_ping', True)
+        params = super().get_connection_params()
+        params.pop('pool', None)
+        return params
+
+    def get_new_connection(self, conn_params):
+        """Берет соединение из пула или открывает новое."""
+        self.pool = get_pool(self.alias, self.pool_options)
+        try:
+            conn = self.pool.acquire(
+                partial(super().get_new_connection, conn_params),
+                self.is_connection_healthy,
+            )
+        except PoolTimeoutError as error:
+            raise base.Database.OperationalError(str(error)) from error
+        # Уровень изоляции выставляется при открытии соединения, а
+        # соединение из пула могло открыть другое DatabaseWrapper.
+        self.isolation_level = base.IsolationLevel(
+            self.settings_dict['OPTIONS'].get(
+                'isolation_level', base.IsolationLevel.READ_COMMITTED))
+        return conn
+
+    def is_connection_healthy(self, conn):
+        """Проверяет соединение из пула перед выдачей."""
+        if conn.closed:
+            return False
+        if not self.pre_ping:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute('SELECT 1')
+        except base.Database.Error:
+            return False
+        # Вне автокоммита SELECT открыл транзакцию.
+        return self.reset(conn)
+
+    def _close(self):
+        """Возвращает соединение в пул вместо закрытия."""
+        if self.connection is None:
+            return
+        self.pool.release(self.connection, self.reset(self.connection))
+
+    @staticmethod
+    def reset(conn):
+        """Откатывает незавершенную транзакцию; False - соединение негодно."""
+        if conn.closed:
+            return False
+        if conn.get_transaction_status() == extensions.TRANSACTION_STATUS_IDLE:
+            return True
+        try:
+            conn.rollback()
+        except base.Database.Error:
+            return False
+        return (conn.get_transaction_status()
+                == extensions.TRANSACTION_STATUS_IDLE)
@@ -0,0 +1 @@
+"""Бэкенд SQLite для продакшена на небольших инстансах."""
@@ -0,0 +1,86 @@
+"""SQLite с WAL, настроенными PRAGMA и сериализацией записи.
+
+Каждое соединение получает PRAGMA из OPTIONS['pragmas']. Транзакции
+открываются через BEGIN IMMEDIATE: блокировка записи берется сразу, и
+конкурирующие обработчики ждут ее в busy_timeout, а не получают
+"database is locked" при попытке повысить блокировку чтения. Запросы
+вне транзакции и сам BEGIN при занятой базе повторяются с
+экспоненциальной задержкой.
+"""
+
+import random
+import time
+
+from django.db.backends.sqlite3 import base
+
+DEFAULT_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'cache_size': -20000,
+    'mmap_size': 128 * 1024 * 1024,
+    'temp_store': 'MEMORY',
+}
+
+
+def is_locked_error(error):
+    """Является ли ошибка следствием занятой базы."""
+    return isinstance(error, base.Database.OperationalError) and (
+        'locked' in str(error) or 'busy' in str(error))
+
+
+class RetryingCursorWrapper(base.SQLiteCursorWrapper):
+    """Курсор, повторяющий запросы вне транзакции при занятой базе."""
+
+    db = None
+
+    def execute(self, query, params=None):
+        """Выполняет запрос, повторяя его при блокировке базы."""
+        if self.db is None or self.db.in_atomic_block:
+            return super().execute(query, params)
+        return self.db.retry(super().execute, query, params)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """Соединение SQLite, настроенное для нескольких обработчиков."""
+
+    def get_connection_params(self):
+        """Отделяет собственные параметры от параметров sqlite3.connect."""
+        options = dict(self.settings_dict['OPTIONS'])
+        self.pragmas = {**DEFAULT_PRAGMAS, **options.pop('pragmas', {})}
+        self.write_retries = options.pop('write_retries', 5)
+        self.retry_backoff = options.pop('retry_backoff', 0.05)
+        params = super().get_connection_params()
+        for key in ('pragmas', 'write_retries', 'retry_backoff'):
+            params.pop(key, None)
+        return params
+
+    def get_new_connection(self, conn_params):
+        """Открывает соединение и применяет PRAGMA."""
+        conn = super().get_new_connection(conn_params)
+        for name, value in self.pragmas.items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
+    def create_cursor(self, name=None):
+        """Создает курсор с повтором запросов при блокировке."""
+        cursor = self.connection.cursor(factory=RetryingCursorWrapper)
+        cursor.db = self
+        return cursor
+
+    def _start_transaction_under_autocommit(self):
+        """Начинает транзакцию с немедленной блокировкой записи."""
+        cursor = self.connection.cursor()
+        self.retry(cursor.execute, 'BEGIN IMMEDIATE')
+
+    def retry(self, func, *args):
+        """Вызывает func, повторяя его при занятой базе."""
+        for attempt in range(self.write_retries + 1):
+            try:
+                return func(*args)
+            except base.Database.OperationalError as error:
+                if not is_locked_error(error) or (
+                        attempt == self.write_retries):
+                    raise
+            time.sleep(
+                self.retry_backoff * 2 ** attempt * random.uniform(0.5, 1))
@@ -27,21 +27,29 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'rest_framework.authtoken',
     'djoser',
     'django_filters',
     'api',
     'recipes',
+    'monitoring',
+    'jobs',
+    'stats',
     'corsheaders',
 ]
 
 MIDDLEWARE = [
+    'monitoring.middleware.RequestMetricsMiddleware',
+    'monitoring.middleware.AccessLogMiddleware',
+    'monitoring.middleware.QueryLogMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'monitoring.middleware.ProfilerMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -93,15 +101,57 @@ STATIC_ROOT = BASE_DIR / 'collected_static'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Медиафайлы называются по хешу содержимого: одинаковые загрузки
+# хранятся один раз, а nginx отдает /media/ с immutable-кешированием.
+
+STORAGES = {
+    'default': {
+        'BACKEND': 'recipes.storage.ContentAddressedStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+    },
+}
+
 
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
+# SQLite подключается через foodgram.backends.sqlite3: WAL, PRAGMA для
+# каждого соединения, BEGIN IMMEDIATE и повторы при занятой базе.
+# SQLITE_TUNED=False возвращает стандартный бэкенд.
+#
+# PostgreSQL: соединение живет DB_CONN_MAX_AGE секунд и проверяется
+# перед повторным использованием. DB_POOL=True включает пул соединений
+# процесса (foodgram.backends.postgresql): соединения возвращаются в пул
+# в конце каждого запроса, поэтому CONN_MAX_AGE не нужен. Пул нужен под
+# ASGI, где запросы обслуживают разные потоки и постоянные соединения
+# не переиспользуются.
+
 if os.getenv('USE_SQLITE', 'False') == 'True':
+    if os.getenv('SQLITE_TUNED', 'True') == 'True':
+        SQLITE_ENGINE = 'foodgram.backends.sqlite3'
+        SQLITE_OPTIONS = {
+            'pragmas': {
+                'journal_mode': 'WAL',
+                'synchronous': os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL'),
+                'busy_timeout': int(os.getenv('SQLITE_BUSY_TIMEOUT', '5000')),
+                'cache_size': int(os.getenv('SQLITE_CACHE_SIZE', '-20000')),
+                'mmap_size': int(
+                    os.getenv('SQLITE_MMAP_SIZE', str(128 * 1024 * 1024))),
+                'temp_store': 'MEMORY',
+            },
+            'write_retries': int(os.getenv('SQLITE_WRITE_RETRIES', '5')),
+            'retry_backoff': float(os.getenv('SQLITE_RETRY_BACKOFF', '0.05')),
+        }
+    else:
+        SQLITE_ENGINE = 'django.db.backends.sqlite3'
+        SQLITE_OPTIONS = {}
     DATABASES = {
         'default': {
-            'ENGINE': 'django.db.backends.sqlite3',
+            'ENGINE': SQLITE_ENGINE,
             'NAME': os.path.join(os.path.dirname(BASE_DIR), 'db.sqlite3'),
+            'OPTIONS': SQLITE_OPTIONS,
         }
     }
 else:
@@ -112,9 +162,169 @@ else:
             'USER': os.getenv('POSTGRES_USER', 'django'),
             'PASSWORD': os.getenv('POSTGRES_PASSWORD', ''),
             'HOST': os.getenv('DB_HOST', 'db'),
-            'PORT': os.getenv('DB_PORT', '5432')
+            'PORT': os.getenv('DB_PORT', '5432'),
+            'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', '60')),
+            'CONN_HEALTH_CHECKS': (
+                os.getenv('DB_CONN_HEALTH_CHECKS', 'True') == 'True'),
         }
     }
+    if os.getenv('DB_POOL', 'False') == 'True':
+        DATABASES['default'].update({
+            'ENGINE': 'foodgram.backends.postgresql',
+            'CONN_MAX_AGE': 0,
+            'OPTIONS': {
+                'pool': {
+                    'size': int(os.getenv('DB_POOL_SIZE', '5')),
+                    'max_overflow': int(
+                        os.getenv('DB_POOL_MAX_OVERFLOW', '5')),
+                    'timeout': float(os.getenv('DB_POOL_TIMEOUT', '10')),
+                    'max_idle': float(os.getenv('DB_POOL_MAX_IDLE', '300')),
+                    'max_lifetime': float(
+                        os.getenv('DB_POOL_MAX_LIFETIME', '3600')),
+                    'pre_ping': (
+                        os.getenv('DB_POOL_PRE_PING', 'True') == 'True'),
+                },
+            },
+        })
+
+
+# Метрики запросов: доля измеряемых запросов (0 - выключено) и токен
+# для выдачи /metrics без авторизации сотрудника. Процессы сбрасывают
+# метрики в METRICS_DIR не чаще раза в METRICS_FLUSH_INTERVAL секунд,
+# /metrics складывает их; каталог очищается при новом развертывании.
+
+METRICS_SAMPLE_RATE = float(os.getenv('METRICS_SAMPLE_RATE', '0'))
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+METRICS_DIR = os.getenv('METRICS_DIR', os.path.join(BASE_DIR, 'metrics'))
+METRICS_FLUSH_INTERVAL = float(os.getenv('METRICS_FLUSH_INTERVAL', '5'))
+
+# Профилирование запросов сотрудников по заголовку X-Profile. Отчеты
+# хранятся вне MEDIA_ROOT и доступны только из админки.
+
+PROFILER_HEADER = 'X-Profile'
+PROFILER_ROOT = os.getenv('PROFILER_ROOT', os.path.join(BASE_DIR, 'profiles'))
+PROFILER_SAMPLE_INTERVAL = float(
+    os.getenv('PROFILER_SAMPLE_INTERVAL', '0.002'))
+PROFILER_EXPLAIN_LIMIT = int(os.getenv('PROFILER_EXPLAIN_LIMIT', '20'))
+
+# Статистика SQL-запросов по отпечаткам и журнал медленных запросов.
+# Процессы сбрасывают статистику в QUERY_LOG_DIR, команда query_stats
+# выводит сводку.
+
+QUERY_LOG_ENABLED = os.getenv('QUERY_LOG_ENABLED', 'False') == 'True'
+QUERY_LOG_SLOW_MS = float(os.getenv('QUERY_LOG_SLOW_MS', '100'))
+QUERY_LOG_DIR = os.getenv(
+    'QUERY_LOG_DIR', os.path.join(BASE_DIR, 'query_stats'))
+QUERY_LOG_FLUSH_INTERVAL = float(
+    os.getenv('QUERY_LOG_FLUSH_INTERVAL', '10'))
+
+# Объединение одновременных промахов (foodgram.singleflight): файлы
+# блокировок общие для воркеров одного хоста. Пока документ рецепта
+# пересобирается, остальные запросы получают его предыдущую версию.
+
+SINGLE_FLIGHT_LOCK_DIR = os.getenv(
+    'SINGLE_FLIGHT_LOCK_DIR', os.path.join(BASE_DIR, 'locks'))
+SINGLE_FLIGHT_TIMEOUT = float(os.getenv('SINGLE_FLIGHT_TIMEOUT', '5'))
+RECIPE_DOCUMENT_SERVE_STALE = (
+    os.getenv('RECIPE_DOCUMENT_SERVE_STALE', 'True') == 'True')
+
+# Журнал изменений для /api/recipes/changes/: записи моложе
+# CHANGES_SETTLE_SECONDS не выдаются (их транзакции могут быть еще не
+# зафиксированы), prune_recipe_changes удаляет записи старше
+# CHANGES_RETENTION_DAYS.
+
+CHANGES_SETTLE_SECONDS = float(os.getenv('CHANGES_SETTLE_SECONDS', '1'))
+CHANGES_RETENTION_DAYS = int(os.getenv('CHANGES_RETENTION_DAYS', '30'))
+
+# Поток событий /api/events/ (только под ASGI). Изменения из других
+# процессов находятся опросом журнала раз в EVENTS_POLL_INTERVAL секунд
+# (0 - не опрашивать, если ASGI-процесс один). Без событий поток шлет
+# комментарий раз в EVENTS_HEARTBEAT_SECONDS и закрывается через
+# EVENTS_STREAM_SECONDS, после чего клиент переподключается.
+
+EVENTS_POLL_INTERVAL = float(os.getenv('EVENTS_POLL_INTERVAL', '2'))
+EVENTS_HEARTBEAT_SECONDS = float(os.getenv('EVENTS_HEARTBEAT_SECONDS', '15'))
+EVENTS_STREAM_SECONDS = float(os.getenv('EVENTS_STREAM_SECONDS', '300'))
+
+# Прогрев процесса при загрузке foodgram.wsgi/foodgram.asgi: шаги
+# приложений и внутренние GET-запросы к WARMUP_URLS (через запятую).
+# Под gunicorn --preload выполняется один раз в мастере.
+
+WARMUP_ENABLED = os.getenv('WARMUP_ENABLED', 'True') == 'True'
+WARMUP_URLS = [
+    url for url in os.getenv(
+        'WARMUP_URLS',
+        '/api/tags/,/api/ingredients/?name=%D0%B0,/api/recipes/'
+    ).split(',') if url
+]
+
+# Структурированный журнал (JSON lines): access-лог и логи приложений.
+# Запись идет через очередь в памяти, в файл пишет фоновый поток; при
+# заполнении очереди записи ниже WARNING прореживаются (доля
+# LOG_SAMPLE_UNDER_LOAD), при полной очереди отбрасываются. Каждый
+# процесс пишет в свой файл (access-<pid>.log, app-<pid>.log) и сам
+# ротирует его по размеру LOG_MAX_BYTES.
+
+ACCESS_LOG_ENABLED = os.getenv('ACCESS_LOG_ENABLED', 'False') == 'True'
+LOG_DIR = os.getenv('LOG_DIR', os.path.join(BASE_DIR, 'logs'))
+LOG_MAX_BYTES = int(os.getenv('LOG_MAX_BYTES', str(10 * 1024 * 1024)))
+LOG_BACKUP_COUNT = int(os.getenv('LOG_BACKUP_COUNT', '5'))
+LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', '10000'))
+LOG_SAMPLE_UNDER_LOAD = float(os.getenv('LOG_SAMPLE_UNDER_LOAD', '0.1'))
+
+if ACCESS_LOG_ENABLED:
+    LOGGING = {
+        'version': 1,
+        'disable_existing_loggers': False,
+        'handlers': {
+            'access': {
+                'class': 'monitoring.logs.NonBlockingLogHandler',
+                'filename': os.path.join(LOG_DIR, 'access.log'),
+                'max_bytes': LOG_MAX_BYTES,
+                'backup_count': LOG_BACKUP_COUNT,
+                'queue_size': LOG_QUEUE_SIZE,
+                'sample_rate': LOG_SAMPLE_UNDER_LOAD,
+            },
+            'app': {
+                'class': 'monitoring.logs.NonBlockingLogHandler',
+                'filename': os.path.join(LOG_DIR, 'app.log'),
+                'max_bytes': LOG_MAX_BYTES,
+                'backup_count': LOG_BACKUP_COUNT,
+                'queue_size': LOG_QUEUE_SIZE,
+                'sample_rate': LOG_SAMPLE_UNDER_LOAD,
+            },
+        },
+        'loggers': {
+            'monitoring.access': {
+                'handlers': ['access'],
+                'level': 'INFO',
+                'propagate': False,
+            },
+            'monitoring': {'handlers': ['app'], 'level': 'INFO'},
+            'api': {'handlers': ['app'], 'level': 'INFO'},
+            'recipes': {'handlers': ['app'], 'level': 'INFO'},
+            'jobs': {'handlers': ['app'], 'level': 'INFO'},
+            'foodgram': {'handlers': ['app'], 'level': 'INFO'},
+        },
+    }
+
+# Очередь фоновых задач в базе данных (команда run_worker): число
+# потоков обработчика, пауза опроса, повторы с экспоненциальной
+# задержкой, время, после которого задача зависшего обработчика
+# возвращается в очередь, и сколько секунд хранить завершенные задачи.
+
+JOBS_CONCURRENCY = int(os.getenv('JOBS_CONCURRENCY', '4'))
+JOBS_POLL_INTERVAL = float(os.getenv('JOBS_POLL_INTERVAL', '1'))
+JOBS_MAX_ATTEMPTS = int(os.getenv('JOBS_MAX_ATTEMPTS', '5'))
+JOBS_RETRY_BACKOFF = float(os.getenv('JOBS_RETRY_BACKOFF', '5'))
+JOBS_RETRY_BACKOFF_MAX = float(os.getenv('JOBS_RETRY_BACKOFF_MAX', '600'))
+JOBS_LOCK_TIMEOUT = float(os.getenv('JOBS_LOCK_TIMEOUT', '900'))
+JOBS_RETENTION = float(os.getenv('JOBS_RETENTION', str(7 * 24 * 3600)))
+
+# Через сколько секунд удалять замененные изображения и аватары, если
+# на них больше нет ссылок.
+
+MEDIA_CLEANUP_DELAY = int(os.getenv('MEDIA_CLEANUP_DELAY', '3600'))
 
 
 # Password validation
@@ -135,6 +345,12 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Корзины токенов ограничителя частоты (api.throttles): файл SQLite,
+# общий для воркеров хоста.
+
+THROTTLE_DB_PATH = os.getenv(
+    'THROTTLE_DB_PATH', os.path.join(BASE_DIR, 'throttle', 'buckets.sqlite3'))
+
 REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticatedOrReadOnly',
@@ -147,6 +363,20 @@ REST_FRAMEWORK = {
     ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 6,
+    # Число прокси перед приложением (nginx): адрес клиента для
+    # ограничений по IP берется из X-Forwarded-For с учетом этого числа.
+    'NUM_PROXIES': int(os.getenv('NUM_PROXIES', '1')),
+    'DEFAULT_THROTTLE_RATES': {
+        'upload': os.getenv('THROTTLE_UPLOAD', '20/min'),
+        'upload_ip': os.getenv('THROTTLE_UPLOAD_IP', '60/min'),
+        'download': os.getenv('THROTTLE_DOWNLOAD', '10/min'),
+        'download_ip': os.getenv('THROTTLE_DOWNLOAD_IP', '30/min'),
+        'link': os.getenv('THROTTLE_LINK', '60/min'),
+        'link_ip': os.getenv('THROTTLE_LINK_IP', '120/min'),
+        'write': os.getenv('THROTTLE_WRITE', '120/min'),
+        'write_ip': os.getenv('THROTTLE_WRITE_IP', '300/min'),
+        'signup_ip': os.getenv('THROTTLE_SIGNUP_IP', '10/hour'),
+    },
 }
 
 DJOSER = {
@@ -0,0 +1,196 @@
+"""Объединение одинаковых вычислений (single flight).
+
+Когда много запросов одновременно промахиваются мимо одного значения,
+вычисляет его только один. Внутри процесса остальные потоки ждут
+результат ведущего, между процессами (воркерами gunicorn) очередность
+задает блокировка файла ключа в SINGLE_FLIGHT_LOCK_DIR: дождавшись ее
+снятия, процесс читает готовое значение из общего хранилища. Если для
+ключа есть устаревшее значение, оно отдается сразу, не дожидаясь
+пересчета (stale-while-revalidate).
+
+Файл блокировки удаляется ведущим перед снятием блокировки, поэтому
+каталог не растет; ждущие только читают хранилище, так что удаленный
+файл не мешает им.
+"""
+
+import fcntl
+import hashlib
+import os
+import threading
+import time
+
+from django.conf import settings
+
+MISSING = object()
+
+
+class Flight:
+    """Вычисление ключа, выполняемое одним из потоков процесса."""
+
+    def __init__(self):
+        """Создает незавершенное вычисление."""
+        self.done = threading.Event()
+        self.value = MISSING
+
+    def publish(self, value=MISSING):
+        """Передает результат ждущим потокам (MISSING - результата нет)."""
+        self.value = value
+        self.done.set()
+
+
+class SingleFlight:
+    """Группа ключей, вычисление которых объединяется.
+
+    load(keys) читает готовые значения из общего хранилища, compute(keys)
+    вычисляет значения и сохраняет их туда же; обе функции возвращают
+    словарь {ключ: значение}. Ключи должны иметь стабильный repr.
+    """
+
+    def __init__(self, name):
+        """Создает группу; name отделяет ее файлы блокировок."""
+        self.name = name
+        self.flights = {}
+        self.lock = threading.Lock()
+
+    def get_many(self, keys, load, compute, stale=None):
+        """Возвращает значения keys, вычисляя каждое не более одного раза.
+
+        stale - устаревшие значения {ключ: значение}, которые можно
+        отдать, пока ключ вычисляет кто-то другой.
+        """
+        stale = stale or {}
+        deadline = time.monotonic() + settings.SINGLE_FLIGHT_TIMEOUT
+        leading, remote, local = {}, {}, {}
+        values = {}
+        try:
+            for key in keys:
+                with self.lock:
+                    flight = self.flights.get(key)
+                    if flight is not None:
+                        local[key] = flight
+                        continue
+                    flight = self.flights[key] = Flight()
+                # Ключ учтен до взятия блокировки, чтобы при ошибке
+                # _try_lock его вычисление завершилось в finally.
+                remote[key] = flight
+                fd = self._try_lock(key)
+                if fd is not None:
+                    leading[key] = (remote.pop(key), fd)
+            if leading:
+                values.update(self._lead(leading, load, compute))
+            for key, flight in remote.items():
+                values[key] = self._follow_remote(
+                    key, flight, load, stale, deadline)
+        finally:
+            # После ошибки ожидающие ключи процесса иначе ждали бы их до
+            # тайм-аута, а блокировки ведущего оставались бы взятыми.
+            for key, (flight, fd) in leading.items():
+                if not flight.done.is_set():
+                    self._unlock(key, fd)
+                    self._finish(key, flight)
+            for key, flight in remote.items():
+                if not flight.done.is_set():
+                    self._finish(key, flight)
+        for key, flight in local.items():
+            if key in stale:
+                values[key] = stale[key]
+                continue
+            flight.done.wait(max(deadline - time.monotonic(), 0))
+            values[key] = flight.value
+
+        missing = [key for key, value in values.items() if value is MISSING]
+        if missing:
+            # Ведущий не справился или не уложился в тайм-аут.
+            found = load(missing)
+            found.update(compute(
+                [key for key in missing if key not in found]))
+            values.update(found)
+        return values
+
+    def _lead(self, leading, load, compute):
+        """Вычисляет ключи, для которых процесс стал ведущим."""
+        values = {}
+        try:
+            # Другой процесс мог закончить между промахом и блокировкой.
+            values.update(load(list(leading)))
+            values.update(compute(
+                [key for key in leading if key not in values]))
+        finally:
+            for key, (flight, fd) in leading.items():
+                self._unlock(key, fd)
+                self._finish(key, flight, values.get(key, MISSING))
+        return values
+
+    def _follow_remote(self, key, flight, load, stale, deadline):
+        """Ждет ключ, который вычисляет другой процесс."""
+        if key in stale:
+            value = stale[key]
+            self._finish(key, flight)
+            return value
+        value = MISSING
+        try:
+            if self._wait_unlocked(key, deadline):
+                value = load([key]).get(key, MISSING)
+        finally:
+            self._finish(key, flight, value)
+        return value
+
+    def _finish(self, key, flight, value=MISSING):
+        """Завершает вычисление ключа в процессе."""
+        with self.lock:
+            if self.flights.get(key) is flight:
+                del self.flights[key]
+        flight.publish(value)
+
+    def _lock_path(self, key):
+        """Путь к файлу блокировки ключа."""
+        digest = hashlib.sha1(repr(key).encode()).hexdigest()
+        return os.path.join(
+            settings.SINGLE_FLIGHT_LOCK_DIR, f'{self.name}-{digest}.lock')
+
+    def _try_lock(self, key):
+        """Пытается взять блокировку ключа; дескриптор файла или None."""
+        path = self._lock_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        while True:
+            fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                os.close(fd)
+                return None
+            try:
+                if os.stat(path).st_ino == os.fstat(fd).st_ino:
+                    return fd
+            except FileNotFoundError:
+                pass
+            # Файл удалил предыдущий ведущий: берем блокировку заново.
+            os.close(fd)
+
+    def _unlock(self, key, fd):
+        """Удаляет файл блокировки и снимает ее."""
+        try:
+            os.unlink(self._lock_path(key))
+        except FileNotFoundError:
+            pass
+        os.close(fd)
+
+    def _wait_unlocked(self, key, deadline):
+        """Ждет снятия блокировки ключа; False по тайм-ауту."""
+        try:
+            fd = os.open(self._lock_path(key), os.O_RDONLY)
+        except FileNotFoundError:
+            return True
+        try:
+            delay = 0.002
+            while True:
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_SH | fcntl.LOCK_NB)
+                    return True
+                except BlockingIOError:
+                    if time.monotonic() >= deadline:
+                        return False
+                time.sleep(min(delay, max(deadline - time.monotonic(), 0)))
+                delay = min(delay * 2, 0.05)
+        finally:
+            os.close(fd)
@@ -5,6 +5,7 @@ from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import include, path
 
+from monitoring.views import metrics
 from recipes.views import recipe_by_short_link
 
 urlpatterns = [
@@ -12,7 +13,8 @@ urlpatterns = [
     path('api/', include('api.urls')),
     path(
         's/<slug:short_link>/', recipe_by_short_link, name='recipe-short-link'
-    )
+    ),
+    path('metrics', metrics, name='metrics'),
 ]
 
 if settings.DEBUG:
@@ -0,0 +1,113 @@
+"""Прогрев процесса перед приемом запросов.
+
+Без прогрева первые запросы каждого воркера платят за ленивую
+инициализацию: компиляцию URL-шаблонов, построение полей
+сериализаторов и форм фильтров, первое соединение с базой. Приложения
+регистрируют шаги прогрева в AppConfig.ready(), а точки входа
+foodgram.wsgi и foodgram.asgi выполняют их сразу после загрузки
+приложения: сначала соединение с базой, затем шаги приложений, затем
+несколько внутренних запросов из WARMUP_URLS через весь стек
+middleware. Время каждого шага пишется в журнал и в /metrics.
+
+С gunicorn --preload прогрев выполняется один раз в мастере, и
+перезапущенные воркеры получают прогретые структуры при fork.
+Соединения с базой после прогрева закрываются вместе с простаивающими
+соединениями пула, чтобы воркеры не унаследовали общий сокет.
+"""
+
+import io
+import logging
+import time
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIHandler
+from django.db import connections
+from django.dispatch import Signal
+
+from foodgram.backends.pool import close_pools
+
+logger = logging.getLogger(__name__)
+
+steps = []
+# Последний замер: [(шаг, секунды)].
+report = []
+# Отправляется после прогрева, например, чтобы сбросить метрики
+# внутренних запросов.
+warmup_finished = Signal()
+
+
+def register(name, func):
+    """Добавляет шаг прогрева; повторная регистрация имени заменяет его."""
+    steps[:] = [step for step in steps if step[0] != name]
+    steps.append((name, func))
+
+
+def connect_database():
+    """Открывает соединения со всеми базами."""
+    for connection in connections.all():
+        connection.ensure_connection()
+
+
+def request(handler, url):
+    """Выполняет внутренний GET-запрос; возвращает код ответа."""
+    parts = urlsplit(url)
+    host = settings.ALLOWED_HOSTS[0]
+    statuses = []
+    response = handler({
+        'REQUEST_METHOD': 'GET',
+        'PATH_INFO': parts.path,
+        'QUERY_STRING': parts.query,
+        'SERVER_NAME': host,
+        'SERVER_PORT': '80',
+        'HTTP_HOST': host,
+        'REMOTE_ADDR': '127.0.0.1',
+        'wsgi.input': io.BytesIO(),
+        'wsgi.errors': io.StringIO(),
+        'wsgi.url_scheme': 'http',
+    }, lambda status, headers, exc_info=None: statuses.append(status))
+    try:
+        for _ in response:
+            pass
+    finally:
+        if hasattr(response, 'close'):
+            response.close()
+    return int(statuses[0].split()[0])
+
+
+def warm_up(handler=None, setup_seconds=None):
+    """Выполняет шаги прогрева и возвращает замер [(шаг, секунды)].
+
+    handler - WSGI-приложение для внутренних запросов (по умолчанию
+    новое), setup_seconds - время загрузки Django, если его замерили.
+    Ошибка шага не мешает запуску: она пишется в журнал.
+    """
+    if not settings.WARMUP_ENABLED:
+        return []
+    timings = []
+    if setup_seconds is not None:
+        timings.append(('django_setup', setup_seconds))
+    handler = handler or WSGIHandler()
+    plan = [('database', connect_database), *steps] + [
+        (f'request {url}', lambda url=url: request(handler, url))
+        for url in settings.WARMUP_URLS
+    ]
+    for name, func in plan:
+        started = time.perf_counter()
+        try:
+            result = func()
+        except Exception:
+            logger.exception('Шаг прогрева %s не выполнен', name)
+        else:
+            if name.startswith('request ') and result >= 400:
+                logger.warning('Прогрев: %s вернул %s', name, result)
+        timings.append((name, time.perf_counter() - started))
+    connections.close_all()
+    close_pools()
+    warmup_finished.send(sender=None)
+    report[:] = timings
+    logger.info(
+        'Прогрев завершен за %.3f с', sum(seconds for _, seconds in timings),
+        extra={'startup': {name: round(seconds, 4)
+                           for name, seconds in timings}})
+    return timings
@@ -3,14 +3,25 @@ WSGI config for foodgram project.
 
 It exposes the WSGI callable as a module-level variable named ``application``.
 
+Before the module finishes importing, the process is warmed up (see
+foodgram.warmup), so a worker takes traffic only once lazy structures are
+built. With ``gunicorn --preload`` this happens once in the master and
+forked workers inherit the warm state.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/wsgi/
 """
 
 import os
+import time
 
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.settings')
 
+started = time.perf_counter()
 application = get_wsgi_application()
+
+from foodgram.warmup import warm_up  # noqa: E402
+
+warm_up(application, setup_seconds=time.perf_counter() - started)
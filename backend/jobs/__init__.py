@@ -0,0 +1 @@
+"""Пакет jobs содержит очередь фоновых задач в базе данных."""
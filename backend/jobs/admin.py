@@ -0,0 +1,32 @@
+"""Административная панель для фоновых задач."""
+
+from django.contrib import admin
+from django.utils import timezone
+
+from .models import Job
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    """Административная панель для фоновых задач."""
+
+    list_display = ('id', 'name', 'status', 'attempts', 'max_attempts',
+                    'run_at', 'created_at', 'finished_at', 'locked_by')
+    list_filter = ('status', 'name')
+    search_fields = ('name',)
+    readonly_fields = ('name', 'payload', 'status', 'attempts',
+                       'max_attempts', 'run_at', 'locked_by', 'locked_at',
+                       'last_error', 'created_at', 'finished_at')
+    actions = ('retry',)
+
+    def has_add_permission(self, request):
+        """Задачи ставятся в очередь только из кода."""
+        return False
+
+    @admin.action(description='Повторить выбранные задачи')
+    def retry(self, request, queryset):
+        """Возвращает задачи с ошибкой в очередь."""
+        count = queryset.filter(status=Job.FAILED).update(
+            status=Job.QUEUED, attempts=0, run_at=timezone.now(),
+            finished_at=None, locked_by='', locked_at=None)
+        self.message_user(request, f'Поставлено в очередь: {count}')
@@ -0,0 +1,16 @@
+"""Конфигурация приложения jobs."""
+
+from django.apps import AppConfig
+
+
+class JobsConfig(AppConfig):
+    """Конфигурация приложения jobs."""
+
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'jobs'
+
+    def ready(self):
+        """Регистрирует задачи из модулей tasks всех приложений."""
+        from django.utils.module_loading import autodiscover_modules
+
+        autodiscover_modules('tasks')
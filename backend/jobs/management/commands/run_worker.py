@@ -0,0 +1,97 @@
+"""Модуль для запуска обработчика фоновых задач."""
+
+import signal
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+
+from jobs.queue import (
+    claim,
+    execute,
+    purge_finished,
+    requeue_stale,
+    worker_name,
+)
+
+
+def run_job(job):
+    """Выполняет задачу в потоке пула и закрывает его соединение."""
+    try:
+        return execute(job)
+    finally:
+        connection.close()
+
+
+class Command(BaseCommand):
+    """Команда для обработки очереди фоновых задач.
+
+    Забирает готовые задачи пачками по числу свободных потоков и
+    выполняет их параллельно. Время от времени возвращает в очередь
+    задачи зависших обработчиков и удаляет старые завершенные задачи.
+    По SIGTERM/SIGINT перестает брать новые задачи и дожидается
+    выполняемых.
+    """
+
+    help = 'Process background jobs from the database queue'
+
+    def add_arguments(self, parser):
+        """Добавляет параметры команды."""
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=settings.JOBS_CONCURRENCY,
+            help='Количество задач, выполняемых одновременно',
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=settings.JOBS_POLL_INTERVAL,
+            help='Пауза между опросами пустой очереди, с',
+        )
+        parser.add_argument(
+            '--burst',
+            action='store_true',
+            help='Завершиться, когда очередь опустеет',
+        )
+
+    def handle(self, *args, **options):
+        """Обрабатывает задачи до остановки."""
+        self.stopping = False
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        concurrency = options['concurrency']
+        poll_interval = options['poll_interval']
+        worker = worker_name()
+        self.stdout.write(f'Обработчик {worker}, потоков: {concurrency}')
+
+        running = set()
+        last_requeue = 0
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            while not self.stopping:
+                close_old_connections()
+                if time.monotonic() - last_requeue > poll_interval * 10:
+                    requeue_stale()
+                    purge_finished()
+                    last_requeue = time.monotonic()
+                jobs = claim(worker, concurrency - len(running))
+                running.update(pool.submit(run_job, job) for job in jobs)
+                if not running:
+                    if options['burst']:
+                        break
+                    time.sleep(poll_interval)
+                    continue
+                done, running = wait(
+                    running,
+                    timeout=poll_interval if not jobs else 0,
+                    return_when=FIRST_COMPLETED,
+                )
+            wait(running)
+        connection.close()
+
+    def stop(self, signum, frame):
+        """Останавливает прием новых задач."""
+        self.stopping = True
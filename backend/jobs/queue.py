@@ -0,0 +1,162 @@
+"""Очередь фоновых задач в базе данных.
+
+Задача - функция, зарегистрированная декоратором task; в очередь
+кладется ее имя и именованные аргументы в JSON. Обработчики (команда
+run_worker) забирают задачи через SELECT ... FOR UPDATE SKIP LOCKED,
+а на СУБД без SKIP LOCKED (SQLite) - условным UPDATE по статусу.
+Брокер не нужен: запись задачи коммитится вместе с транзакцией,
+которая ее поставила.
+"""
+
+import logging
+import os
+import random
+import socket
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from api.constants import JOB_PURGE_BATCH_SIZE
+from .models import Job
+
+logger = logging.getLogger('jobs')
+
+TASKS = {}
+
+
+def task(name=None, max_attempts=None):
+    """Декоратор, регистрирующий функцию как фоновую задачу.
+
+    У функции появляется метод delay(**kwargs), ставящий ее в очередь.
+    """
+    def decorator(func):
+        task_name = name or f'{func.__module__}.{func.__name__}'
+        TASKS[task_name] = func
+
+        def delay(delay_seconds=0, **kwargs):
+            return enqueue(
+                task_name, kwargs, delay=delay_seconds,
+                max_attempts=max_attempts)
+
+        func.task_name = task_name
+        func.delay = delay
+        return func
+    return decorator
+
+
+def enqueue(name, payload=None, delay=0, max_attempts=None):
+    """Ставит задачу в очередь; выполнится не раньше чем через delay с."""
+    if name not in TASKS:
+        raise KeyError(f'Неизвестная задача: {name}')
+    return Job.objects.create(
+        name=name,
+        payload=payload or {},
+        max_attempts=max_attempts or settings.JOBS_MAX_ATTEMPTS,
+        run_at=timezone.now() + timedelta(seconds=delay),
+    )
+
+
+def worker_name():
+    """Имя обработчика для поля locked_by."""
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def claim(worker, limit):
+    """Забирает до limit готовых задач и помечает их выполняемыми."""
+    if limit <= 0:
+        return []
+    now = timezone.now()
+    ready = Job.objects.filter(
+        status=Job.QUEUED, run_at__lte=now).order_by('run_at')
+    running = {
+        'status': Job.RUNNING,
+        'locked_by': worker,
+        'locked_at': now,
+        'attempts': F('attempts') + 1,
+    }
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            ids = [job.pk for job in ready.select_for_update(
+                skip_locked=True).only('pk')[:limit]]
+            Job.objects.filter(pk__in=ids).update(**running)
+    else:
+        ids = [
+            pk for pk in ready.values_list('pk', flat=True)[:limit]
+            if Job.objects.filter(pk=pk, status=Job.QUEUED).update(**running)
+        ]
+    return list(Job.objects.filter(pk__in=ids).order_by('run_at'))
+
+
+def requeue_stale():
+    """Возвращает в очередь задачи обработчиков, переставших отвечать."""
+    expired = Job.objects.filter(
+        status=Job.RUNNING,
+        locked_at__lt=timezone.now() - timedelta(
+            seconds=settings.JOBS_LOCK_TIMEOUT),
+    )
+    expired.filter(attempts__gte=F('max_attempts')).update(
+        status=Job.FAILED, finished_at=timezone.now(),
+        last_error='Превышено время выполнения')
+    return expired.update(status=Job.QUEUED, locked_by='', locked_at=None)
+
+
+def purge_finished(batch_size=JOB_PURGE_BATCH_SIZE):
+    """Удаляет выполненные и упавшие задачи старше JOBS_RETENTION.
+
+    Удаляет пачками, чтобы не держать долгих блокировок; возвращает
+    число удаленных задач.
+    """
+    finished = Job.objects.filter(
+        status__in=(Job.DONE, Job.FAILED),
+        finished_at__lt=timezone.now() - timedelta(
+            seconds=settings.JOBS_RETENTION),
+    ).order_by('pk').values_list('pk', flat=True)
+    purged = 0
+    while True:
+        ids = list(finished[:batch_size])
+        if ids:
+            purged += Job.objects.filter(pk__in=ids).delete()[0]
+        if len(ids) < batch_size:
+            return purged
+
+
+def backoff(attempts):
+    """Задержка перед повтором: экспонента с разбросом, в секундах."""
+    delay = min(
+        settings.JOBS_RETRY_BACKOFF * 2 ** (attempts - 1),
+        settings.JOBS_RETRY_BACKOFF_MAX,
+    )
+    return delay * random.uniform(0.5, 1)
+
+
+def execute(job):
+    """Выполняет задачу и сохраняет результат или план повтора."""
+    func = TASKS.get(job.name)
+    try:
+        if func is None:
+            raise KeyError(f'Неизвестная задача: {job.name}')
+        func(**job.payload)
+    except Exception:
+        error = traceback.format_exc()
+        logger.exception('Задача %s #%s завершилась ошибкой', job.name, job.pk)
+        if func is not None and job.attempts < job.max_attempts:
+            Job.objects.filter(pk=job.pk).update(
+                status=Job.QUEUED,
+                locked_by='',
+                locked_at=None,
+                last_error=error,
+                run_at=timezone.now() + timedelta(
+                    seconds=backoff(job.attempts)),
+            )
+        else:
+            Job.objects.filter(pk=job.pk).update(
+                status=Job.FAILED, last_error=error,
+                finished_at=timezone.now())
+        return False
+    Job.objects.filter(pk=job.pk).update(
+        status=Job.DONE, locked_by='', finished_at=timezone.now())
+    return True
@@ -0,0 +1 @@
+"""Пакет monitoring содержит инструменты измерения производительности."""
@@ -0,0 +1,77 @@
+"""Административная панель для отчетов профилировщика."""
+
+from django.contrib import admin
+from django.contrib.admin import display
+from django.http import FileResponse, Http404, HttpResponse
+from django.shortcuts import get_object_or_404
+from django.urls import path, reverse
+from django.utils.html import format_html
+
+from .models import ProfileReport
+
+
+@admin.register(ProfileReport)
+class ProfileReportAdmin(admin.ModelAdmin):
+    """Административная панель для отчетов профилировщика."""
+
+    list_display = ('created_at', 'method', 'path', 'status_code',
+                    'duration', 'queries', 'sql_time', 'user', 'downloads')
+    list_filter = ('method', 'status_code')
+    search_fields = ('path',)
+    readonly_fields = ('created_at', 'user', 'method', 'path', 'status_code',
+                       'duration', 'queries', 'sql_time', 'downloads',
+                       'sql_report')
+    exclude = ('pstats', 'collapsed')
+
+    def has_add_permission(self, request):
+        """Отчеты создаются только профилировщиком."""
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        """Отчеты нельзя редактировать."""
+        return False
+
+    def get_urls(self):
+        """Добавляет адрес для скачивания файлов отчета."""
+        return [
+            path(
+                '<int:pk>/download/<str:kind>/',
+                self.admin_site.admin_view(self.download),
+                name='monitoring_profilereport_download',
+            ),
+        ] + super().get_urls()
+
+    @display(description='Файлы')
+    def downloads(self, obj):
+        """Ссылки на скачивание pstats, стеков и SQL-отчета."""
+        return format_html(
+            '<a href="{}">pstats</a> | <a href="{}">collapsed</a> | '
+            '<a href="{}">sql</a>',
+            *(
+                reverse(
+                    'admin:monitoring_profilereport_download',
+                    args=(obj.pk, kind)
+                )
+                for kind in ('pstats', 'collapsed', 'sql')
+            )
+        )
+
+    def download(self, request, pk, kind):
+        """Отдает файл отчета сотруднику."""
+        if not self.has_view_permission(request):
+            raise Http404
+        report = get_object_or_404(ProfileReport, pk=pk)
+        if kind == 'sql':
+            response = HttpResponse(
+                report.sql_report, content_type='text/plain; charset=utf-8')
+            response['Content-Disposition'] = (
+                f'attachment; filename="profile-{report.pk}.sql.txt"')
+            return response
+        if kind not in ('pstats', 'collapsed'):
+            raise Http404
+        file = getattr(report, kind)
+        return FileResponse(
+            file.open('rb'),
+            as_attachment=True,
+            filename=file.name.rsplit('/', 1)[-1],
+        )
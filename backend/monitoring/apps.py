@@ -0,0 +1,30 @@
+"""Конфигурация приложения monitoring."""
+
+from django.apps import AppConfig
+
+
+class MonitoringConfig(AppConfig):
+    """Конфигурация приложения monitoring."""
+
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'monitoring'
+
+    def ready(self):
+        """Подключает журнал SQL-запросов и сброс метрик после прогрева."""
+        from django.conf import settings
+        from django.db.backends.signals import connection_created
+
+        from foodgram.warmup import warmup_finished
+        from .metrics import reset_after_warmup
+        from .querylog import install_query_logger
+
+        warmup_finished.connect(
+            reset_after_warmup,
+            dispatch_uid='monitoring_reset_after_warmup'
+        )
+
+        if settings.QUERY_LOG_ENABLED:
+            connection_created.connect(
+                install_query_logger,
+                dispatch_uid='monitoring_query_logger'
+            )
@@ -0,0 +1,138 @@
+"""Неблокирующее структурированное логирование в формате JSON lines.
+
+Записи кладутся в ограниченную очередь в памяти, а в файл их пишет
+фоновый поток (QueueHandler/QueueListener). Потоки запросов никогда не
+ждут диска: при заполнении очереди обычные записи access-лога
+прореживаются, а при полной очереди отбрасываются с подсчетом.
+"""
+
+import json
+import logging
+import os
+import queue
+import random
+import threading
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+RESERVED_ATTRS = frozenset(vars(logging.makeLogRecord({}))) | {'message'}
+
+
+class JSONFormatter(logging.Formatter):
+    """Форматирует запись как один JSON-объект в строке."""
+
+    def format(self, record):
+        """Собирает время, уровень, логгер, сообщение и доп. поля."""
+        data = {
+            'ts': datetime.fromtimestamp(
+                record.created, tz=timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in RESERVED_ATTRS and not key.startswith('_'):
+                data[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            data['exc'] = record.exc_text
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class NonBlockingLogHandler(QueueHandler):
+    """Обработчик, передающий записи фоновому потоку через очередь.
+
+    Фоновый поток пишет их в файл процесса с ротацией по размеру: к
+    имени filename добавляется pid, потому что RotatingFileHandler
+    нескольких процессов над одним файлом теряет и перемешивает записи
+    при ротации. Когда очередь
+    заполнена больше чем на high_watermark, записи ниже WARNING
+    сохраняются с вероятностью sample_rate; когда очередь полна, они
+    отбрасываются, а их количество попадает в журнал при освобождении
+    места.
+    """
+
+    def __init__(self, filename, max_bytes=10 * 1024 * 1024,
+                 backup_count=5, queue_size=10000, high_watermark=0.8,
+                 sample_rate=0.1):
+        """Создает очередь; файл открывается при запуске потока."""
+        super().__init__(queue.Queue(maxsize=queue_size))
+        os.makedirs(os.path.dirname(filename) or '.', exist_ok=True)
+        self.filename = filename
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.file_handler = None
+        self.high_watermark = int(queue_size * high_watermark)
+        self.sample_rate = sample_rate
+        self.dropped = 0
+        self.listener = None
+        self.listener_pid = None
+        self.start_lock = threading.Lock()
+
+    def start(self):
+        """Запускает фоновый поток в текущем процессе.
+
+        Поток не переживает fork, поэтому после форка worker'а gunicorn
+        он запускается заново при первой записи и с файлом своего pid.
+        """
+        with self.start_lock:
+            pid = os.getpid()
+            if self.listener_pid == pid:
+                return
+            root, ext = os.path.splitext(self.filename)
+            self.file_handler = RotatingFileHandler(
+                f'{root}-{pid}{ext}', maxBytes=self.max_bytes,
+                backupCount=self.backup_count, encoding='utf-8', delay=True)
+            self.file_handler.setFormatter(JSONFormatter())
+            self.listener = QueueListener(
+                self.queue, self.file_handler, respect_handler_level=True)
+            self.listener.start()
+            self.listener_pid = pid
+
+    def prepare(self, record):
+        """Подготавливает запись к передаче в другой поток."""
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = JSONFormatter().formatException(
+                record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        """Кладет запись в очередь, не блокируя вызывающий поток."""
+        if self.listener_pid != os.getpid():
+            self.start()
+        if (record.levelno < logging.WARNING
+                and self.queue.qsize() >= self.high_watermark
+                and random.random() >= self.sample_rate):
+            self.dropped += 1
+            return
+        dropped = self.dropped
+        try:
+            if dropped:
+                self.queue.put_nowait(logging.makeLogRecord({
+                    'name': 'monitoring.logs',
+                    'levelno': logging.WARNING,
+                    'levelname': 'WARNING',
+                    'msg': f'Пропущено записей под нагрузкой: {dropped}',
+                    'dropped': dropped,
+                }))
+                self.dropped -= dropped
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self):
+        """Останавливает фоновый поток, дописав очередь.
+
+        Вызывается и при завершении процесса (logging.shutdown).
+        """
+        if self.listener is not None and self.listener_pid == os.getpid():
+            self.listener.stop()
+            self.listener = None
+            self.listener_pid = None
+        if self.file_handler is not None:
+            self.file_handler.close()
+        super().close()
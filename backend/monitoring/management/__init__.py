@@ -0,0 +1 @@
+"""Служебные команды приложения monitoring."""
@@ -0,0 +1,90 @@
+"""Модуль для вывода статистики SQL-запросов по отпечаткам."""
+
+import json
+import os
+import shutil
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from monitoring.querylog import (
+    merge_snapshots,
+    percentile,
+    read_snapshots,
+    stats,
+)
+
+SORT_KEYS = {
+    'total': lambda entry: entry['total_ms'],
+    'count': lambda entry: entry['count'],
+    'mean': lambda entry: entry['total_ms'] / entry['count'],
+    'p95': lambda entry: percentile(entry['buckets'], 0.95),
+}
+
+
+class Command(BaseCommand):
+    """Команда для вывода сводки по SQL-запросам всех процессов.
+
+    Аналог pg_stat_statements, работающий и на SQLite: данные собирает
+    журнал запросов (QUERY_LOG_ENABLED) каждого процесса.
+    """
+
+    help = 'Show aggregated SQL statistics grouped by query fingerprint'
+
+    def add_arguments(self, parser):
+        """Добавляет параметры команды."""
+        parser.add_argument('--top', type=int, default=20)
+        parser.add_argument(
+            '--sort', choices=tuple(SORT_KEYS), default='total')
+        parser.add_argument(
+            '--json', action='store_true', help='Вывести сводку в JSON')
+        parser.add_argument(
+            '--reset', action='store_true',
+            help='Удалить накопленную статистику')
+
+    def handle(self, *args, **options):
+        """Выводит или сбрасывает статистику запросов."""
+        directory = settings.QUERY_LOG_DIR
+        if options['reset']:
+            shutil.rmtree(directory, ignore_errors=True)
+            self.stdout.write(self.style.SUCCESS('Статистика сброшена'))
+            return
+
+        snapshots = read_snapshots(directory)
+        if stats.entries and (
+                stats.path is None or not os.path.exists(stats.path)):
+            snapshots.append(stats.snapshot())
+        merged = merge_snapshots(snapshots)
+        rows = sorted(
+            merged.items(), key=lambda item: SORT_KEYS[options['sort']](
+                item[1]), reverse=True)[:options['top']]
+
+        if options['json']:
+            self.stdout.write(json.dumps([
+                {
+                    'fingerprint': key,
+                    'sql': entry['sql'],
+                    'count': entry['count'],
+                    'total_ms': round(entry['total_ms'], 3),
+                    'mean_ms': round(entry['total_ms'] / entry['count'], 3),
+                    'p95_ms': percentile(entry['buckets'], 0.95),
+                    'max_ms': round(entry['max_ms'], 3),
+                    'sources': dict(entry['sources'].most_common()),
+                }
+                for key, entry in rows
+            ], ensure_ascii=False, indent=2))
+            return
+
+        if not rows:
+            self.stdout.write('Статистика пуста')
+            return
+        for key, entry in rows:
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f'[{key}] {entry["count"]} раз, '
+                f'всего {entry["total_ms"]:.1f} мс, '
+                f'среднее {entry["total_ms"] / entry["count"]:.2f} мс, '
+                f'p95 <= {percentile(entry["buckets"], 0.95)} мс, '
+                f'макс {entry["max_ms"]:.1f} мс'))
+            self.stdout.write(f'  {entry["sql"][:500]}')
+            for source, count in entry['sources'].most_common(3):
+                self.stdout.write(f'  {count:>6}  {source}')
@@ -0,0 +1,319 @@
+"""Гистограммы и счетчики запросов в формате Prometheus.
+
+Каждый процесс копит метрики в памяти и периодически сбрасывает их в
+свой файл в METRICS_DIR; /metrics складывает файлы всех процессов,
+поэтому счетчики не зависят от того, какой воркер ответил на запрос
+Prometheus. Файлы завершившихся процессов при сборе переносятся в
+общий файл RETIRED_NAME: иначе сумма счетчиков уменьшалась бы при
+перезапуске воркера, а число файлов росло бы с каждым перезапуском.
+"""
+
+import fcntl
+import json
+import os
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from collections import defaultdict
+
+from django.conf import settings
+
+from foodgram import warmup
+from foodgram.backends.pool import pool_stats
+from .querylog import read_snapshots
+
+DURATION_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+RETIRED_NAME = 'retired.json'
+
+
+class Histogram:
+    """Гистограмма с фиксированными границами корзин."""
+
+    def __init__(self, buckets):
+        """Создает пустую гистограмму."""
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        """Добавляет значение в гистограмму."""
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+
+    def cumulative(self):
+        """Возвращает пары (граница, накопленное количество)."""
+        running = 0
+        for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+            running += count
+            yield bound, running
+
+
+class MetricsRegistry:
+    """Метрики запросов процесса, сгруппированные по маршрутам.
+
+    Файл процесса называется по pid и случайному суффиксу: процесс с
+    повторно выданным pid не перезапишет чужие счетчики. После fork
+    (gunicorn --preload) дочерний процесс начинает с пустых метрик и
+    своего файла.
+    """
+
+    histograms = (
+        ('foodgram_request_duration_seconds',
+         'Полное время обработки запроса', DURATION_BUCKETS),
+        ('foodgram_request_db_duration_seconds',
+         'Время SQL-запросов за запрос', DURATION_BUCKETS),
+        ('foodgram_request_app_duration_seconds',
+         'Время во view без SQL (сериализация и логика)', DURATION_BUCKETS),
+        ('foodgram_request_render_duration_seconds',
+         'Время рендеринга ответа', DURATION_BUCKETS),
+        ('foodgram_request_db_queries',
+         'Количество SQL-запросов за запрос', QUERY_BUCKETS),
+    )
+
+    def __init__(self):
+        """Создает пустой реестр."""
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Сбрасывает накопленные метрики и удаляет файл процесса."""
+        with self.lock:
+            path = getattr(self, 'path', None)
+            self._clear()
+        if path is not None and os.path.exists(path):
+            os.remove(path)
+
+    def _clear(self):
+        """Начинает метрики процесса с нуля (под блокировкой)."""
+        self.data = {
+            name: defaultdict(lambda buckets=buckets: Histogram(buckets))
+            for name, _, buckets in self.histograms
+        }
+        self.responses = defaultdict(int)
+        self.pid = os.getpid()
+        self.path = None
+        self.last_flush = time.monotonic()
+
+    def _check_fork(self):
+        """Сбрасывает метрики, унаследованные от родительского процесса."""
+        if self.pid != os.getpid():
+            self._clear()
+
+    def record(self, route, method, status, request_metrics):
+        """Учитывает измерения одного запроса."""
+        labels = (route, method)
+        values = (
+            request_metrics.total_time,
+            request_metrics.db_time,
+            request_metrics.app_time,
+            request_metrics.render_time,
+            request_metrics.queries,
+        )
+        with self.lock:
+            self._check_fork()
+            for (name, _, _), value in zip(self.histograms, values):
+                self.data[name][labels].observe(value)
+            self.responses[(route, method, str(status))] += 1
+
+    def snapshot(self):
+        """Копия метрик, пригодная для сохранения в JSON."""
+        with self.lock:
+            self._check_fork()
+            return {
+                'histograms': {
+                    name: [
+                        [route, method, histogram.counts, histogram.total,
+                         histogram.count]
+                        for (route, method), histogram in histograms.items()
+                    ]
+                    for name, histograms in self.data.items()
+                },
+                'responses': [
+                    [*labels, count]
+                    for labels, count in self.responses.items()
+                ],
+            }
+
+    def merge(self, snapshot):
+        """Добавляет метрики из снимка другого процесса.
+
+        Гистограммы с другими границами корзин (снимок от прошлой версии
+        кода) пропускаются.
+        """
+        with self.lock:
+            for name, rows in snapshot.get('histograms', {}).items():
+                if name not in self.data:
+                    continue
+                for route, method, counts, total, count in rows:
+                    histogram = self.data[name][(route, method)]
+                    if len(counts) != len(histogram.counts):
+                        continue
+                    histogram.counts = [
+                        left + right
+                        for left, right in zip(histogram.counts, counts)
+                    ]
+                    histogram.total += total
+                    histogram.count += count
+            for route, method, status, count in snapshot.get(
+                    'responses', ()):
+                self.responses[(route, method, status)] += count
+
+    def flush(self, directory, force=False):
+        """Сохраняет метрики процесса в файл не чаще раза в интервал."""
+        with self.lock:
+            self._check_fork()
+            now = time.monotonic()
+            if not force and (
+                    now - self.last_flush < settings.METRICS_FLUSH_INTERVAL):
+                return
+            self.last_flush = now
+            if self.path is None:
+                self.path = os.path.join(
+                    directory, f'{self.pid}-{uuid.uuid4().hex[:8]}.json')
+            path = self.path
+        os.makedirs(directory, exist_ok=True)
+        temporary = f'{path}.{threading.get_ident()}.tmp'
+        with open(temporary, 'w', encoding='utf-8') as file:
+            json.dump(self.snapshot(), file)
+        os.replace(temporary, path)
+
+    def render(self):
+        """Выводит метрики в текстовом формате Prometheus."""
+        lines = []
+        with self.lock:
+            for name, description, _ in self.histograms:
+                lines.append(f'# HELP {name} {description}')
+                lines.append(f'# TYPE {name} histogram')
+                for (route, method), histogram in sorted(
+                        self.data[name].items()):
+                    labels = f'route="{route}",method="{method}"'
+                    for bound, count in histogram.cumulative():
+                        lines.append(
+                            f'{name}_bucket{{{labels},le="{bound}"}} {count}')
+                    lines.append(f'{name}_sum{{{labels}}} {histogram.total}')
+                    lines.append(f'{name}_count{{{labels}}} {histogram.count}')
+            name = 'foodgram_responses_total'
+            lines.append(f'# HELP {name} Количество ответов')
+            lines.append(f'# TYPE {name} counter')
+            for (route, method, status), count in sorted(
+                    self.responses.items()):
+                lines.append(
+                    f'{name}{{route="{route}",method="{method}",'
+                    f'status="{status}"}} {count}')
+        return '\n'.join(lines) + '\n'
+
+
+def is_alive(pid):
+    """Существует ли процесс с данным pid."""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def retire_dead(directory):
+    """Переносит метрики завершившихся процессов в файл RETIRED_NAME.
+
+    Блокировка не дает двум процессам одновременно перенести одни и те
+    же файлы и посчитать их дважды.
+    """
+    with open(os.path.join(directory, '.lock'), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        dead = []
+        for name in os.listdir(directory):
+            pid, _, rest = name.partition('-')
+            if (rest.endswith('.json') and pid.isdigit()
+                    and not is_alive(int(pid))):
+                dead.append(os.path.join(directory, name))
+        if not dead:
+            return
+        retired_path = os.path.join(directory, RETIRED_NAME)
+        retired = MetricsRegistry()
+        for path in (retired_path, *dead):
+            try:
+                with open(path, encoding='utf-8') as file:
+                    retired.merge(json.load(file))
+            except (OSError, ValueError):
+                continue
+        temporary = f'{retired_path}.tmp'
+        with open(temporary, 'w', encoding='utf-8') as file:
+            json.dump(retired.snapshot(), file)
+        os.replace(temporary, retired_path)
+        for path in dead:
+            os.remove(path)
+
+
+def collect(directory):
+    """Метрики всех процессов из файлов в directory."""
+    registry.flush(directory, force=True)
+    retire_dead(directory)
+    merged = MetricsRegistry()
+    for snapshot in read_snapshots(directory):
+        merged.merge(snapshot)
+    return merged
+
+
+def render_pool_metrics():
+    """Выводит состояние пулов соединений с базой текущего процесса."""
+    stats = pool_stats()
+    if not stats:
+        return ''
+    metrics = (
+        ('foodgram_db_pool_size', 'gauge', 'Размер пула', 'size'),
+        ('foodgram_db_pool_max_overflow', 'gauge',
+         'Соединений сверх размера пула', 'max_overflow'),
+        ('foodgram_db_pool_idle_connections', 'gauge',
+         'Свободные соединения', 'idle'),
+        ('foodgram_db_pool_in_use_connections', 'gauge',
+         'Выданные соединения', 'in_use'),
+        ('foodgram_db_pool_connects_total', 'counter',
+         'Открытые соединения', 'connects'),
+        ('foodgram_db_pool_checkouts_total', 'counter',
+         'Запросы соединения из пула', 'checkouts'),
+        ('foodgram_db_pool_waits_total', 'counter',
+         'Запросы, ждавшие свободного соединения', 'waits'),
+        ('foodgram_db_pool_wait_seconds_total', 'counter',
+         'Суммарное ожидание соединения', 'wait_seconds'),
+        ('foodgram_db_pool_timeouts_total', 'counter',
+         'Запросы, не дождавшиеся соединения', 'timeouts'),
+        ('foodgram_db_pool_discarded_total', 'counter',
+         'Закрытые пулом соединения', 'discarded'),
+    )
+    lines = []
+    for name, kind, description, key in metrics:
+        lines.append(f'# HELP {name} {description}')
+        lines.append(f'# TYPE {name} {kind}')
+        for alias, values in sorted(stats.items()):
+            lines.append(f'{name}{{alias="{alias}"}} {values[key]}')
+    return '\n'.join(lines) + '\n'
+
+
+def render_startup_metrics():
+    """Выводит длительность шагов прогрева текущего процесса."""
+    if not warmup.report:
+        return ''
+    name = 'foodgram_startup_seconds'
+    lines = [
+        f'# HELP {name} Длительность шагов запуска и прогрева',
+        f'# TYPE {name} gauge',
+    ]
+    for step, seconds in warmup.report:
+        lines.append(f'{name}{{step="{step}"}} {seconds}')
+    return '\n'.join(lines) + '\n'
+
+
+def reset_after_warmup(sender, **kwargs):
+    """Сбрасывает метрики, набранные внутренними запросами прогрева."""
+    registry.reset()
+
+
+registry = MetricsRegistry()
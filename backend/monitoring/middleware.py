@@ -0,0 +1,248 @@
+"""Middleware для измерения времени обработки запросов."""
+
+import logging
+import random
+import time
+import uuid
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.utils import timezone
+
+from api.constants import PROFILE_PATH
+from .metrics import registry
+from .models import ProfileReport
+from .profiler import RequestProfiler, get_request_user
+from .querylog import current_view
+
+access_logger = logging.getLogger('monitoring.access')
+
+
+class RequestMetrics:
+    """Измерения одного запроса: SQL, view, рендеринг.
+
+    Экземпляр подключается к соединениям с базой как execute_wrapper
+    и доступен во view как request.metrics.
+    """
+
+    def __init__(self):
+        """Начинает измерение запроса."""
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.view_started = None
+        self.view_time = 0.0
+        self.render_started = None
+        self.render_time = 0.0
+        self.total_time = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        """Выполняет SQL-запрос, учитывая его время."""
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.db_time += time.perf_counter() - started
+
+    @property
+    def app_time(self):
+        """Время во view без SQL: сериализация и логика."""
+        return max(self.view_time - self.db_time, 0.0)
+
+    def view_finished(self):
+        """Отмечает окончание работы view."""
+        if self.view_started is not None and not self.view_time:
+            self.view_time = time.perf_counter() - self.view_started
+
+    def render_finished(self, response):
+        """Отмечает окончание рендеринга ответа."""
+        if self.render_started is not None:
+            self.render_time = time.perf_counter() - self.render_started
+        return response
+
+    def finish(self):
+        """Завершает измерение запроса."""
+        self.view_finished()
+        self.total_time = time.perf_counter() - self.started
+
+    def server_timing(self):
+        """Значение заголовка Server-Timing."""
+        return ', '.join((
+            f'db;dur={self.db_time * 1000:.1f};desc="{self.queries} queries"',
+            f'app;dur={self.app_time * 1000:.1f}',
+            f'render;dur={self.render_time * 1000:.1f}',
+            f'total;dur={self.total_time * 1000:.1f}',
+        ))
+
+
+def get_route(request):
+    """Имя маршрута запроса для меток метрик."""
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unmatched'
+    return match.view_name or match.route
+
+
+class RequestMetricsMiddleware:
+    """Собирает метрики запросов и отдает их в заголовке Server-Timing.
+
+    Измеряется доля запросов METRICS_SAMPLE_RATE (от 0 до 1); при
+    нулевой доле middleware только передает запрос дальше.
+    """
+
+    def __init__(self, get_response):
+        """Сохраняет обработчик и долю измеряемых запросов."""
+        self.get_response = get_response
+        self.sample_rate = settings.METRICS_SAMPLE_RATE
+
+    def __call__(self, request):
+        """Измеряет запрос, если он попал в выборку."""
+        if not self.sample_rate or random.random() >= self.sample_rate:
+            return self.get_response(request)
+
+        metrics = RequestMetrics()
+        request.metrics = metrics
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(metrics))
+            response = self.get_response(request)
+        metrics.finish()
+
+        registry.record(
+            get_route(request), request.method, response.status_code, metrics)
+        registry.flush(settings.METRICS_DIR)
+        response['Server-Timing'] = metrics.server_timing()
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        """Отмечает начало работы view."""
+        metrics = getattr(request, 'metrics', None)
+        if metrics is not None:
+            metrics.view_started = time.perf_counter()
+
+    def process_template_response(self, request, response):
+        """Отмечает конец работы view и начало рендеринга ответа."""
+        metrics = getattr(request, 'metrics', None)
+        if metrics is not None:
+            metrics.view_finished()
+            metrics.render_started = time.perf_counter()
+            response.add_post_render_callback(metrics.render_finished)
+        return response
+
+
+class ProfilerMiddleware:
+    """Профилирует запрос сотрудника, если передан заголовок PROFILER_HEADER.
+
+    Отчет (pstats, свернутые стеки и SQL с планами) сохраняется в
+    ProfileReport, его id возвращается в заголовке X-Profile-Report.
+    """
+
+    def __init__(self, get_response):
+        """Сохраняет обработчик и настройки профилировщика."""
+        self.get_response = get_response
+        self.header = settings.PROFILER_HEADER
+
+    def __call__(self, request):
+        """Профилирует запрос, если он этого требует."""
+        if self.header not in request.headers:
+            return self.get_response(request)
+        user = get_request_user(request)
+        if user is None or not user.is_staff:
+            return self.get_response(request)
+
+        profiler = RequestProfiler(
+            sample_interval=settings.PROFILER_SAMPLE_INTERVAL,
+            explain_limit=settings.PROFILER_EXPLAIN_LIMIT,
+        )
+        response = profiler.run(self.get_response, request)
+        queries = profiler.queries
+        report = ProfileReport(
+            user=user,
+            method=request.method,
+            path=request.get_full_path()[:PROFILE_PATH],
+            status_code=response.status_code,
+            duration=profiler.duration * 1000,
+            queries=len(queries),
+            sql_time=sum(query[-1] for query in queries) * 1000,
+            sql_report=profiler.sql_report(),
+        )
+        name = f'{timezone.now():%Y%m%d-%H%M%S}-{uuid.uuid4().hex[:8]}'
+        report.pstats.save(
+            f'{name}.pstats', profiler.pstats_file(), save=False)
+        report.collapsed.save(
+            f'{name}.collapsed', profiler.collapsed_file(), save=False)
+        report.save()
+        response['X-Profile-Report'] = str(report.pk)
+        return response
+
+
+class QueryLogMiddleware:
+    """Передает журналу SQL-запросов имя текущего view."""
+
+    def __init__(self, get_response):
+        """Отключается, если журнал запросов выключен."""
+        if not settings.QUERY_LOG_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        """Обрабатывает запрос, затем сбрасывает имя view."""
+        token = current_view.set('-')
+        try:
+            return self.get_response(request)
+        finally:
+            current_view.reset(token)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        """Запоминает имя маршрута для запросов этого view."""
+        current_view.set(get_route(request))
+
+
+class AccessLogMiddleware:
+    """Пишет структурированную запись access-лога для каждого запроса.
+
+    Запись уходит в логгер monitoring.access; в настройках он направлен
+    в неблокирующий обработчик monitoring.logs.NonBlockingLogHandler.
+    """
+
+    def __init__(self, get_response):
+        """Отключается, если access-лог выключен."""
+        if not settings.ACCESS_LOG_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        """Обрабатывает запрос и передает запись о нем в журнал."""
+        metrics = getattr(request, 'metrics', None)
+        if metrics is not None:
+            response = self.get_response(request)
+        else:
+            metrics = RequestMetrics()
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(metrics))
+                response = self.get_response(request)
+        latency = time.perf_counter() - metrics.started
+
+        if response.streaming:
+            size = response.get('Content-Length')
+        else:
+            size = len(response.content)
+        access_logger.info(
+            '%s %s %s', request.method, request.path, response.status_code,
+            extra={
+                'route': get_route(request),
+                'method': request.method,
+                'path': request.path,
+                'status': response.status_code,
+                'latency_ms': round(latency * 1000, 2),
+                'queries': metrics.queries,
+                'db_ms': round(metrics.db_time * 1000, 2),
+                'user_id': getattr(getattr(request, 'user', None), 'pk', None),
+                'size': int(size) if size is not None else None,
+            },
+        )
+        return response
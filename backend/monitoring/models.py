@@ -0,0 +1,64 @@
+"""Модели приложения monitoring."""
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.db import models
+
+from api.constants import PROFILE_METHOD, PROFILE_PATH
+
+
+def profile_storage():
+    """Хранилище отчетов профилировщика вне публичного MEDIA_ROOT."""
+    return FileSystemStorage(location=settings.PROFILER_ROOT)
+
+
+class ProfileReport(models.Model):
+    """Отчет профилировщика об одном запросе."""
+
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Дата'
+    )
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name='profile_reports',
+        verbose_name='Пользователь'
+    )
+    method = models.CharField(
+        max_length=PROFILE_METHOD,
+        verbose_name='Метод'
+    )
+    path = models.CharField(
+        max_length=PROFILE_PATH,
+        verbose_name='Адрес'
+    )
+    status_code = models.PositiveSmallIntegerField(
+        verbose_name='Код ответа'
+    )
+    duration = models.FloatField(verbose_name='Время, мс')
+    queries = models.PositiveIntegerField(verbose_name='SQL-запросов')
+    sql_time = models.FloatField(verbose_name='Время SQL, мс')
+    pstats = models.FileField(
+        upload_to='pstats/',
+        storage=profile_storage,
+        verbose_name='pstats'
+    )
+    collapsed = models.FileField(
+        upload_to='collapsed/',
+        storage=profile_storage,
+        verbose_name='Стеки (collapsed)'
+    )
+    sql_report = models.TextField(verbose_name='SQL и планы')
+
+    class Meta:
+        """Мета-класс для модели ProfileReport."""
+
+        verbose_name = 'Отчет профилировщика'
+        verbose_name_plural = 'Отчеты профилировщика'
+        ordering = ('-created_at',)
+
+    def __str__(self):
+        """Возвращает строковое представление отчета."""
+        return f'{self.method} {self.path[:50]} ({self.duration:.0f} мс)'
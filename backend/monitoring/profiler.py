@@ -0,0 +1,179 @@
+"""Профилирование отдельных запросов по заголовку для сотрудников."""
+
+import cProfile
+import io
+import marshal
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from django.core.files.base import ContentFile
+from django.db import DatabaseError, connections
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+
+
+class QueryLog:
+    """Execute wrapper, сохраняющий SQL-запросы с параметрами и временем."""
+
+    def __init__(self, alias):
+        """Создает пустой журнал для соединения alias."""
+        self.alias = alias
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        """Выполняет запрос и записывает его в журнал."""
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append(
+                (sql, params, many, time.perf_counter() - started))
+
+
+class StackSampler(threading.Thread):
+    """Поток, периодически снимающий стек потока запроса.
+
+    Результат - счетчик свернутых стеков (формат collapsed для
+    flamegraph.pl и speedscope).
+    """
+
+    def __init__(self, thread_id, interval):
+        """Готовит сэмплер для потока thread_id."""
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.stopped = threading.Event()
+
+    def run(self):
+        """Снимает стеки, пока не будет вызван stop()."""
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(
+                    f'{code.co_name} ({code.co_filename}:{frame.f_lineno})')
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def stop(self):
+        """Останавливает сэмплер и дожидается его завершения."""
+        self.stopped.set()
+        self.join()
+
+    def collapsed(self):
+        """Стеки в формате collapsed: 'a;b;c count' на строку."""
+        return ''.join(
+            f'{stack} {count}\n' for stack, count in self.stacks.items())
+
+
+class RequestProfiler:
+    """Профилирует обработку одного запроса.
+
+    Одновременно работают cProfile (точные времена функций для pstats)
+    и сэмплер стеков (для flamegraph), а все SQL-запросы записываются,
+    чтобы после ответа получить для них планы EXPLAIN.
+    """
+
+    def __init__(self, sample_interval, explain_limit):
+        """Готовит профилировщик."""
+        self.sample_interval = sample_interval
+        self.explain_limit = explain_limit
+        self.profile = cProfile.Profile()
+        self.query_logs = [QueryLog(alias) for alias in connections]
+        self.duration = 0.0
+
+    def run(self, get_response, request):
+        """Обрабатывает запрос под профилировщиком."""
+        sampler = StackSampler(threading.get_ident(), self.sample_interval)
+        with ExitStack() as stack:
+            for log in self.query_logs:
+                stack.enter_context(
+                    connections[log.alias].execute_wrapper(log))
+            sampler.start()
+            started = time.perf_counter()
+            self.profile.enable()
+            try:
+                response = get_response(request)
+            finally:
+                self.profile.disable()
+                self.duration = time.perf_counter() - started
+                sampler.stop()
+        self.sampler = sampler
+        return response
+
+    @property
+    def queries(self):
+        """Все выполненные запросы: (alias, sql, params, many, время)."""
+        return [
+            (log.alias, *query)
+            for log in self.query_logs for query in log.queries
+        ]
+
+    def pstats_file(self):
+        """Файл статистики в формате pstats (python -m pstats)."""
+        self.profile.create_stats()
+        return ContentFile(marshal.dumps(self.profile.stats))
+
+    def collapsed_file(self):
+        """Файл свернутых стеков для flamegraph."""
+        return ContentFile(self.sampler.collapsed().encode())
+
+    def sql_report(self):
+        """Текстовый отчет по SQL: самые долгие запросы и их планы."""
+        grouped = {}
+        for alias, sql, params, many, duration in self.queries:
+            entry = grouped.setdefault(
+                (alias, sql), [0, 0.0, params, many])
+            entry[0] += 1
+            entry[1] += duration
+        report = io.StringIO()
+        report.write(
+            f'Запросов: {len(self.queries)}, '
+            f'уникальных: {len(grouped)}\n\n')
+        ordered = sorted(
+            grouped.items(), key=lambda item: item[1][1], reverse=True)
+        for index, ((alias, sql), (count, total, params, many)) in (
+                enumerate(ordered)):
+            report.write(
+                f'-- [{alias}] {total * 1000:.2f} мс, выполнен {count} раз\n'
+                f'{sql}\n-- параметры: {params!r}\n')
+            if index < self.explain_limit and not many:
+                report.write(self.explain(alias, sql, params))
+            report.write('\n')
+        return report.getvalue()
+
+    @staticmethod
+    def explain(alias, sql, params):
+        """План выполнения SELECT-запроса."""
+        if not sql.lstrip().upper().startswith('SELECT'):
+            return ''
+        connection = connections[alias]
+        prefix = connection.ops.explain_query_prefix()
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(f'{prefix} {sql}', params)
+                rows = cursor.fetchall()
+        except DatabaseError as error:
+            return f'-- EXPLAIN не выполнен: {error}\n'
+        return ''.join(
+            '-- ' + ' '.join(str(column) for column in row) + '\n'
+            for row in rows
+        )
+
+
+def get_request_user(request):
+    """Пользователь запроса: из сессии или по токену API."""
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return user
+    try:
+        result = TokenAuthentication().authenticate(request)
+    except AuthenticationFailed:
+        return None
+    return result[0] if result else None
@@ -0,0 +1,254 @@
+"""Журнал медленных SQL-запросов и статистика по отпечаткам запросов.
+
+Каждый запрос приводится к отпечатку: литералы и параметры заменяются
+на ?, списки значений сворачиваются. По отпечаткам копится количество,
+суммарное время, p95 и источники (view и сериализатор). Статистика
+процесса периодически сбрасывается в файл в QUERY_LOG_DIR, откуда ее
+собирает команда query_stats.
+"""
+
+import contextvars
+import hashlib
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from collections import Counter
+
+from django.conf import settings
+from rest_framework.serializers import BaseSerializer
+
+logger = logging.getLogger('monitoring.slow_queries')
+
+current_view = contextvars.ContextVar('current_view', default='-')
+
+# Границы корзин времени запроса в миллисекундах; по ним считается p95
+# и складываются данные разных процессов.
+BUCKETS_MS = (
+    0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000
+)
+STACK_SUMMARY_DEPTH = 6
+
+STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+NUMBER_LITERAL = re.compile(r'\b\d+(?:\.\d+)?\b')
+PLACEHOLDER = re.compile(r'%s|\?')
+VALUE_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+REPEATED_LISTS = re.compile(r'\(\.\.\.\)(?:\s*,\s*\(\.\.\.\))+')
+WHITESPACE = re.compile(r'\s+')
+
+
+def normalize(sql):
+    """Приводит SQL к виду без литералов и с свернутыми списками."""
+    sql = STRING_LITERAL.sub('?', sql)
+    sql = NUMBER_LITERAL.sub('?', sql)
+    sql = PLACEHOLDER.sub('?', sql)
+    sql = VALUE_LIST.sub('(...)', sql)
+    sql = REPEATED_LISTS.sub('(...)', sql)
+    return WHITESPACE.sub(' ', sql).strip()
+
+
+def fingerprint(normalized_sql):
+    """Короткий идентификатор нормализованного запроса."""
+    return hashlib.md5(normalized_sql.encode()).hexdigest()[:12]
+
+
+def percentile(buckets, share):
+    """Оценка перцентиля по корзинам (верхняя граница корзины)."""
+    total = sum(buckets)
+    if not total:
+        return 0.0
+    threshold = total * share
+    running = 0
+    for bound, count in zip(BUCKETS_MS + (float('inf'),), buckets):
+        running += count
+        if running >= threshold:
+            return bound
+    return float('inf')
+
+
+def find_sources():
+    """Ищет в стеке сериализатор и строки кода проекта, вызвавшие запрос."""
+    base_dir = str(settings.BASE_DIR)
+    serializer = '-'
+    project_frames = []
+    frame = sys._getframe(2)
+    while frame is not None:
+        code = frame.f_code
+        in_project = (
+            code.co_filename.startswith(base_dir)
+            and 'site-packages' not in code.co_filename
+        )
+        if serializer == '-' and 'self' in code.co_varnames:
+            instance = frame.f_locals.get('self')
+            if isinstance(instance, BaseSerializer) and (
+                    in_project or not project_frames):
+                serializer = type(instance).__name__
+        if in_project and len(project_frames) < STACK_SUMMARY_DEPTH:
+            project_frames.append(
+                f'{os.path.relpath(code.co_filename, base_dir)}:'
+                f'{frame.f_lineno} in {code.co_name}')
+        frame = frame.f_back
+    return serializer, project_frames
+
+
+class QueryStats:
+    """Статистика запросов текущего процесса по отпечаткам.
+
+    Как и MetricsRegistry, файл процесса называется по pid и случайному
+    суффиксу, а после fork дочерний процесс начинает с пустой
+    статистики и своего файла.
+    """
+
+    def __init__(self):
+        """Создает пустую статистику."""
+        self.lock = threading.Lock()
+        self._clear()
+
+    def _clear(self):
+        """Начинает статистику процесса с нуля (под блокировкой)."""
+        self.entries = {}
+        self.pid = os.getpid()
+        self.path = None
+        self.last_flush = time.monotonic()
+
+    def _check_fork(self):
+        """Сбрасывает статистику, унаследованную от родительского процесса."""
+        if self.pid != os.getpid():
+            self._clear()
+
+    def record(self, sql, duration_ms, view, serializer):
+        """Учитывает выполненный запрос."""
+        normalized = normalize(sql)
+        key = fingerprint(normalized)
+        with self.lock:
+            self._check_fork()
+            entry = self.entries.get(key)
+            if entry is None:
+                entry = self.entries[key] = {
+                    'sql': normalized,
+                    'count': 0,
+                    'total_ms': 0.0,
+                    'max_ms': 0.0,
+                    'buckets': [0] * (len(BUCKETS_MS) + 1),
+                    'sources': Counter(),
+                }
+            entry['count'] += 1
+            entry['total_ms'] += duration_ms
+            entry['max_ms'] = max(entry['max_ms'], duration_ms)
+            entry['buckets'][bisect_left(BUCKETS_MS, duration_ms)] += 1
+            entry['sources'][f'{view} | {serializer}'] += 1
+        return key
+
+    def snapshot(self):
+        """Копия статистики, пригодная для сохранения в JSON."""
+        with self.lock:
+            self._check_fork()
+            return {
+                key: {**entry, 'sources': dict(entry['sources'])}
+                for key, entry in self.entries.items()
+            }
+
+    def flush(self, directory, force=False):
+        """Сохраняет статистику процесса в файл не чаще раза в интервал."""
+        with self.lock:
+            self._check_fork()
+            now = time.monotonic()
+            if not force and (
+                    now - self.last_flush < settings.QUERY_LOG_FLUSH_INTERVAL):
+                return
+            self.last_flush = now
+            if self.path is None:
+                self.path = os.path.join(
+                    directory, f'{self.pid}-{uuid.uuid4().hex[:8]}.json')
+            path = self.path
+        os.makedirs(directory, exist_ok=True)
+        temporary = f'{path}.{threading.get_ident()}.tmp'
+        with open(temporary, 'w', encoding='utf-8') as file:
+            json.dump(self.snapshot(), file, ensure_ascii=False)
+        os.replace(temporary, path)
+
+
+stats = QueryStats()
+
+
+def merge_snapshots(snapshots):
+    """Складывает статистику нескольких процессов."""
+    merged = {}
+    for snapshot in snapshots:
+        for key, entry in snapshot.items():
+            target = merged.setdefault(key, {
+                'sql': entry['sql'],
+                'count': 0,
+                'total_ms': 0.0,
+                'max_ms': 0.0,
+                'buckets': [0] * (len(BUCKETS_MS) + 1),
+                'sources': Counter(),
+            })
+            target['count'] += entry['count']
+            target['total_ms'] += entry['total_ms']
+            target['max_ms'] = max(target['max_ms'], entry['max_ms'])
+            target['buckets'] = [
+                left + right
+                for left, right in zip(target['buckets'], entry['buckets'])
+            ]
+            target['sources'].update(entry['sources'])
+    return merged
+
+
+def read_snapshots(directory):
+    """Читает сохраненную статистику всех процессов."""
+    if not os.path.isdir(directory):
+        return []
+    snapshots = []
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(directory, name), encoding='utf-8') as f:
+                snapshots.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return snapshots
+
+
+def query_logger(execute, sql, params, many, context):
+    """Execute wrapper: учитывает запрос и пишет в журнал медленные."""
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration_ms = (time.perf_counter() - started) * 1000
+        try:
+            log_query(sql, duration_ms)
+        except Exception:
+            logger.exception('Не удалось учесть SQL-запрос')
+
+
+def log_query(sql, duration_ms):
+    """Учитывает запрос в статистике и пишет в журнал медленные."""
+    serializer, frames = find_sources()
+    view = current_view.get()
+    key = stats.record(sql, duration_ms, view, serializer)
+    if duration_ms >= settings.QUERY_LOG_SLOW_MS:
+        logger.warning(
+            'Медленный запрос %.1f мс [%s] view=%s serializer=%s\n'
+            '%s\nСтек:\n  %s',
+            duration_ms, key, view, serializer, sql[:2000],
+            '\n  '.join(frames) or '-',
+        )
+    stats.flush(settings.QUERY_LOG_DIR)
+
+
+def install_query_logger(sender, connection, **kwargs):
+    """Подключает журнал запросов к новому соединению с базой.
+
+    Обертка ставится первой: временные обертки (execute_wrapper)
+    добавляются и снимаются с конца списка.
+    """
+    if query_logger not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, query_logger)
@@ -0,0 +1,34 @@
+"""Вью для выдачи метрик в формате Prometheus."""
+
+import hmac
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+
+from .metrics import (
+    collect,
+    render_pool_metrics,
+    render_startup_metrics,
+)
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def metrics(request):
+    """Отдает метрики запросов всех процессов и пулы текущего процесса.
+
+    Доступ есть у сотрудников и у клиентов с заголовком
+    Authorization: Bearer <METRICS_TOKEN>.
+    """
+    token = settings.METRICS_TOKEN
+    authorization = request.headers.get('Authorization', '')
+    allowed = request.user.is_staff or (
+        bool(token)
+        and hmac.compare_digest(authorization, f'Bearer {token}')
+    )
+    if not allowed:
+        return HttpResponseForbidden()
+    return HttpResponse(
+        collect(settings.METRICS_DIR).render() + render_pool_metrics()
+        + render_startup_metrics(),
+        content_type=PROMETHEUS_CONTENT_TYPE)
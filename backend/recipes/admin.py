@@ -16,10 +16,83 @@ from .models import (
     Tag,
     User,
 )
+from .changes import (
+    CHANGE_OBJECT_FIELDS,
+    record_relation_changes,
+    record_user_changes,
+)
+from .documents import bump_document_version
+from .purge import purge_recipe_batch, purge_recipes, purge_user_later
+from .shopping_list import bump_cart_version, bump_cart_version_for_recipes
+
+
+class RecipeDocumentAdminMixin:
+    """Обновляет документы рецептов при изменении связанных объектов.
+
+    recipe_lookup - поле Recipe, по которому выбираются рецепты объекта;
+    bump_carts - меняет ли объект списки покупок: тогда обновляются и
+    версии корзин с его рецептами.
+    """
+
+    recipe_lookup = None
+    bump_carts = False
+
+    def bump_recipes(self, **lookup):
+        """Обновляет версии документов и корзин рецептов по lookup."""
+        bump_document_version(**lookup)
+        if self.bump_carts:
+            bump_cart_version_for_recipes(
+                Recipe.objects.filter(**lookup).values('pk'))
+
+    def save_model(self, request, obj, form, change):
+        """Сохраняет объект и обновляет версии документов его рецептов."""
+        super().save_model(request, obj, form, change)
+        if change:
+            self.bump_recipes(**{self.recipe_lookup: obj})
+
+    def delete_model(self, request, obj):
+        """Обновляет версии документов рецептов и удаляет объект."""
+        self.bump_recipes(**{self.recipe_lookup: obj})
+        super().delete_model(request, obj)
+
+    def delete_queryset(self, request, queryset):
+        """Обновляет версии документов рецептов и удаляет объекты."""
+        self.bump_recipes(**{f'{self.recipe_lookup}__in': queryset})
+        super().delete_queryset(request, queryset)
+
+
+class UserRecipeChangeAdminMixin:
+    """Записывает изменения избранного, корзины или подписок в журнал."""
+
+    def save_model(self, request, obj, form, change):
+        """Сохраняет запись и отмечает удаление прежней и добавление новой."""
+        field = CHANGE_OBJECT_FIELDS[self.model]
+        super().save_model(request, obj, form, change)
+        if change:
+            record_user_changes(
+                self.model, form.initial['user'], (form.initial[field],),
+                deleted=True)
+        record_user_changes(
+            self.model, obj.user_id, (getattr(obj, f'{field}_id'),))
+
+    def delete_model(self, request, obj):
+        """Удаляет запись и отмечает ее удаление."""
+        field = CHANGE_OBJECT_FIELDS[self.model]
+        super().delete_model(request, obj)
+        record_user_changes(
+            self.model, obj.user_id, (getattr(obj, f'{field}_id'),),
+            deleted=True)
+
+    def delete_queryset(self, request, queryset):
+        """Удаляет записи и отмечает их удаление."""
+        removed = list(queryset.values_list(
+            'user_id', f'{CHANGE_OBJECT_FIELDS[self.model]}_id'))
+        super().delete_queryset(request, queryset)
+        record_relation_changes(self.model, removed, deleted=True)
 
 
 @admin.register(User)
-class UserAdmin(BaseUserAdmin):
+class UserAdmin(RecipeDocumentAdminMixin, BaseUserAdmin):
     """Административная панель для модели пользователя."""
 
     list_display = ('email', 'username', 'first_name', 'last_name',
@@ -27,6 +100,30 @@ class UserAdmin(BaseUserAdmin):
     list_filter = ('is_staff', 'is_superuser', 'is_active')
     search_fields = ('email', 'username', 'first_name', 'last_name')
     ordering = ('email',)
+    recipe_lookup = 'author'
+
+    def get_deleted_objects(self, objs, request):
+        """Сводка для страницы подтверждения без обхода всех связей."""
+        objs = list(objs)
+        model_count = {
+            User._meta.verbose_name_plural: len(objs),
+            Recipe._meta.verbose_name_plural: Recipe.objects.filter(
+                author__in=objs).count(),
+        }
+        perms_needed = (
+            set() if self.has_delete_permission(request)
+            else {User._meta.verbose_name}
+        )
+        return [str(obj) for obj in objs], model_count, perms_needed, []
+
+    def delete_model(self, request, obj):
+        """Деактивирует пользователя и ставит удаление в очередь."""
+        purge_user_later(obj)
+
+    def delete_queryset(self, request, queryset):
+        """Деактивирует пользователей и ставит удаление в очередь."""
+        for user in queryset:
+            purge_user_later(user)
 
     @display(description='Рецептов')
     def recipes_count(self, obj):
@@ -58,6 +155,21 @@ class RecipeAdmin(admin.ModelAdmin):
     inlines = [RecipeIngredientInline]
     exclude = ('ingredients',)
 
+    def save_related(self, request, form, formsets, change):
+        """Сохраняет ингредиенты и обновляет версии корзин и документа."""
+        super().save_related(request, form, formsets, change)
+        if change:
+            bump_cart_version_for_recipes((form.instance.pk,))
+        bump_document_version(pk=form.instance.pk)
+
+    def delete_model(self, request, obj):
+        """Удаляет рецепт пакетными запросами."""
+        purge_recipe_batch((obj.pk,))
+
+    def delete_queryset(self, request, queryset):
+        """Удаляет рецепты пакетными запросами."""
+        purge_recipes(queryset)
+
     @display(description='Изображение')
     def image_preview(self, obj):
         """Метод для вывода изображения."""
@@ -81,25 +193,29 @@ class RecipeAdmin(admin.ModelAdmin):
 
 
 @admin.register(Ingredient)
-class IngredientAdmin(admin.ModelAdmin):
+class IngredientAdmin(RecipeDocumentAdminMixin, admin.ModelAdmin):
     """Административная панель для модели ингредиентов."""
 
+    recipe_lookup = 'ingredients'
+    bump_carts = True
     list_display = ('name', 'measurement_unit')
     search_fields = ('name',)
     list_filter = ('measurement_unit',)
 
 
 @admin.register(Tag)
-class TagAdmin(admin.ModelAdmin):
+class TagAdmin(RecipeDocumentAdminMixin, admin.ModelAdmin):
     """Административная панель для модели тегов."""
 
+    recipe_lookup = 'tags'
+    bump_carts = True
     list_display = ('name', 'slug')
     search_fields = ('name', 'slug')
     prepopulated_fields = {'slug': ('name',)}
 
 
 @admin.register(Subscription)
-class SubscriptionAdmin(admin.ModelAdmin):
+class SubscriptionAdmin(UserRecipeChangeAdminMixin, admin.ModelAdmin):
     """Административная панель для модели подписок."""
 
     list_display = ('user', 'author')
@@ -107,7 +223,7 @@ class SubscriptionAdmin(admin.ModelAdmin):
 
 
 @admin.register(Favorite)
-class FavoriteAdmin(admin.ModelAdmin):
+class FavoriteAdmin(UserRecipeChangeAdminMixin, admin.ModelAdmin):
     """Административная панель для модели избранного."""
 
     list_display = ('user', 'recipe')
@@ -115,11 +231,27 @@ class FavoriteAdmin(admin.ModelAdmin):
 
 
 @admin.register(ShoppingCart)
-class ShoppingCartAdmin(admin.ModelAdmin):
+class ShoppingCartAdmin(UserRecipeChangeAdminMixin, admin.ModelAdmin):
     """Административная панель для модели корзины покупок."""
 
     list_display = ('user', 'recipe')
     list_filter = ('user',)
 
+    def save_model(self, request, obj, form, change):
+        """Сохраняет запись и обновляет версию корзины."""
+        super().save_model(request, obj, form, change)
+        bump_cart_version({obj.user_id, form.initial.get('user', obj.user_id)})
+
+    def delete_model(self, request, obj):
+        """Удаляет запись и обновляет версию корзины."""
+        super().delete_model(request, obj)
+        bump_cart_version((obj.user_id,))
+
+    def delete_queryset(self, request, queryset):
+        """Удаляет записи и обновляет версии корзин."""
+        user_ids = set(queryset.values_list('user_id', flat=True))
+        super().delete_queryset(request, queryset)
+        bump_cart_version(user_ids)
+
 
 admin.site.unregister(Group)
@@ -8,3 +8,11 @@ class RecipesConfig(AppConfig):
 
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'recipes'
+
+    def ready(self):
+        """Регистрирует шаг прогрева со справочниками."""
+        from foodgram.warmup import register
+
+        from .warmup import load_reference_data
+
+        register('reference_data', load_reference_data)
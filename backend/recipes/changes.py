@@ -0,0 +1,196 @@
+"""Журнал изменений рецептов для синхронизации клиентов.
+
+Каждое изменение рецепта (создание, правка, удаление), каждое
+добавление или удаление рецепта в избранном и корзине и каждая подписка
+или отписка пишется в RecipeChange. Клиент хранит курсор - id последней
+полученной записи - и запрашивает только записи после него.
+
+Записи вставляются сразу после фиксации транзакции, которая сделала
+изменение, короткой отдельной транзакцией: id выделяется при вставке,
+и запись из долгой транзакции (пакет удаления или загрузки каталога),
+вставленная до фиксации, оказалась бы позади курсора клиентов, уже
+получивших более поздние записи. Оставшийся зазор между вставкой и
+фиксацией закрывает CHANGES_SETTLE_SECONDS: более молодые записи не
+выдаются. Если курсор старше удаленных командой prune_recipe_changes
+записей (RecipeChangePrune), клиенту отвечают reset: он должен заново
+загрузить список целиком.
+
+После фиксации изменений в списках пользователя его открытые потоки
+событий (recipes.events) получают уведомление.
+"""
+
+from dataclasses import dataclass, field
+from datetime import timedelta
+from functools import partial
+from heapq import merge
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max, Min
+from django.utils import timezone
+
+from .events import broker
+from .models import (
+    Favorite,
+    RecipeChange,
+    RecipeChangePrune,
+    ShoppingCart,
+    Subscription,
+)
+
+USER_CHANGE_KINDS = {
+    Favorite: RecipeChange.FAVORITE,
+    ShoppingCart: RecipeChange.SHOPPING_CART,
+    Subscription: RecipeChange.SUBSCRIPTION,
+}
+# Поле связи, id которого пишется в RecipeChange.object_id.
+CHANGE_OBJECT_FIELDS = {
+    Favorite: 'recipe',
+    ShoppingCart: 'recipe',
+    Subscription: 'author',
+}
+
+
+@dataclass
+class ChangeBatch:
+    """Пачка изменений после курсора, свернутая до последних состояний."""
+
+    cursor: int
+    has_more: bool = False
+    reset: bool = False
+    updated: list = field(default_factory=list)
+    deleted: list = field(default_factory=list)
+    favorites: dict = field(
+        default_factory=lambda: {'added': [], 'removed': []})
+    shopping_cart: dict = field(
+        default_factory=lambda: {'added': [], 'removed': []})
+    subscriptions: dict = field(
+        default_factory=lambda: {'added': [], 'removed': []})
+
+
+def write_changes(changes):
+    """Вставляет записи журнала после фиксации текущей транзакции.
+
+    Вне транзакции записи вставляются сразу.
+    """
+    changes = list(changes)
+    if changes:
+        transaction.on_commit(
+            partial(RecipeChange.objects.bulk_create, changes))
+
+
+def record_recipe_changes(recipe_ids, deleted=False):
+    """Записывает изменение или удаление рецептов."""
+    write_changes(
+        RecipeChange(kind=RecipeChange.RECIPE, object_id=pk, deleted=deleted)
+        for pk in recipe_ids
+    )
+
+
+def record_user_changes(model, user_id, object_ids, deleted=False):
+    """Записывает изменения избранного, корзины или подписок пользователя.
+
+    model - Favorite, ShoppingCart или Subscription, object_ids - id
+    рецептов или авторов.
+    """
+    record_relation_changes(
+        model, ((user_id, pk) for pk in object_ids), deleted)
+
+
+def record_relation_changes(model, pairs, deleted=False):
+    """Записывает изменения строк model по парам (user_id, object_id)."""
+    changes = [
+        RecipeChange(
+            kind=USER_CHANGE_KINDS[model],
+            object_id=object_id,
+            user_id=user_id,
+            deleted=deleted,
+        )
+        for user_id, object_id in pairs
+    ]
+    write_changes(changes)
+    user_ids = {change.user_id for change in changes}
+    if user_ids:
+        transaction.on_commit(partial(broker.notify, user_ids))
+
+
+def settled_changes():
+    """Записи журнала, которые уже можно выдавать клиентам."""
+    settle = timedelta(seconds=settings.CHANGES_SETTLE_SECONDS)
+    return RecipeChange.objects.filter(
+        created_at__lte=timezone.now() - settle)
+
+
+def pruned_through():
+    """id, до которого записи журнала могли быть удалены.
+
+    Это отметка последней очистки, а если записи удаляли в обход
+    prune_changes - id перед первой оставшейся записью.
+    """
+    pruned = RecipeChangePrune.objects.aggregate(
+        last=Max('last_id'))['last'] or 0
+    first = RecipeChange.objects.aggregate(first=Min('pk'))['first']
+    return pruned if first is None else max(pruned, first - 1)
+
+
+def latest_cursor():
+    """Курсор, с которого начинает клиент, только что загрузивший список."""
+    return settled_changes().aggregate(cursor=Max('pk'))['cursor'] or 0
+
+
+def read_changes(user_id, since, limit):
+    """Возвращает до limit изменений после курсора since.
+
+    Без курсора возвращается только текущий курсор. user_id - владелец
+    избранного, корзины и подписок, None для анонимного клиента.
+    """
+    if since is None:
+        return ChangeBatch(cursor=latest_cursor())
+    if since < pruned_through():
+        return ChangeBatch(cursor=latest_cursor(), reset=True)
+
+    columns = ('pk', 'kind', 'object_id', 'deleted')
+    changes = settled_changes().filter(pk__gt=since).order_by('pk')
+    streams = [changes.filter(user_id__isnull=True).values_list(
+        *columns)[:limit]]
+    if user_id is not None:
+        streams.append(changes.filter(user_id=user_id).values_list(
+            *columns)[:limit])
+    # Каждый поток упорядочен по id, поэтому первые limit записей
+    # слияния - это первые limit записей журнала для клиента.
+    rows = list(merge(*map(list, streams)))[:limit]
+    if not rows:
+        return ChangeBatch(cursor=since)
+
+    latest = {}
+    for _, kind, object_id, deleted in rows:
+        latest[(kind, object_id)] = deleted
+    batch = ChangeBatch(cursor=rows[-1][0], has_more=len(rows) == limit)
+    targets = {
+        RecipeChange.FAVORITE: batch.favorites,
+        RecipeChange.SHOPPING_CART: batch.shopping_cart,
+        RecipeChange.SUBSCRIPTION: batch.subscriptions,
+    }
+    for (kind, object_id), deleted in latest.items():
+        if kind == RecipeChange.RECIPE:
+            (batch.deleted if deleted else batch.updated).append(object_id)
+        else:
+            targets[kind]['removed' if deleted else 'added'].append(object_id)
+    return batch
+
+
+@transaction.atomic
+def prune_changes(days):
+    """Удаляет записи журнала старше days дней; возвращает их число.
+
+    Удаляются все записи до последней устаревшей, чтобы ниже отметки
+    очистки не осталось пропусков.
+    """
+    last_id = RecipeChange.objects.filter(
+        created_at__lt=timezone.now() - timedelta(days=days)
+    ).aggregate(last=Max('pk'))['last']
+    if last_id is None:
+        return 0
+    deleted = RecipeChange.objects.filter(pk__lte=last_id).delete()[0]
+    RecipeChangePrune.objects.create(last_id=last_id, deleted=deleted)
+    return deleted
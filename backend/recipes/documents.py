@@ -0,0 +1,190 @@
+"""Предвычисленные документы рецептов.
+
+Документ - готовый JSON рецепта (автор, теги, ингредиенты с названиями
+и единицами) с заглушками вместо полей, зависящих от пользователя. Он
+хранится в RecipeDocument вместе с Recipe.document_version, для которой
+построен. Версия увеличивается в той же транзакции, что и изменение
+рецепта, его ингредиентов и тегов или профиля автора; документ другой
+версии считается устаревшим и пересобирается при следующем чтении.
+Одновременные промахи по одному документу объединяются
+(foodgram.singleflight): его собирает один запрос, остальные ждут или
+получают предыдущую версию.
+
+JSON хранится текстом, а не в JSONField: jsonb в PostgreSQL меняет
+порядок ключей, а ответ должен совпадать с ответом сериализатора.
+"""
+
+import json
+
+from django.conf import settings
+from django.db.models import F
+
+from api.constants import RECIPE_DOCUMENT_BATCH_SIZE
+from foodgram.singleflight import SingleFlight
+from .changes import record_recipe_changes
+from .models import Recipe, RecipeDocument, RecipeIngredient, User
+
+flights = SingleFlight('recipe_document')
+
+
+def bump_document_version(**filters):
+    """Увеличивает версию документов рецептов, выбранных filters.
+
+    Изменение рецептов записывается и в журнал синхронизации.
+    """
+    ids = list(Recipe.objects.filter(**filters).order_by().values_list(
+        'pk', flat=True).distinct())
+    Recipe.objects.filter(pk__in=ids).update(
+        document_version=F('document_version') + 1)
+    record_recipe_changes(ids)
+
+
+def file_url(model, field_name, name):
+    """URL файла поля модели относительно сайта; None без файла."""
+    if not name:
+        return None
+    return model._meta.get_field(field_name).storage.url(name)
+
+
+def build_documents(recipe_ids):
+    """Собирает документы рецептов; возвращает {id: (версия, JSON)}."""
+    recipes = list(Recipe.objects.filter(pk__in=recipe_ids).order_by().values(
+        'id', 'author_id', 'name', 'image', 'text', 'cooking_time',
+        'document_version'
+    ))
+    recipe_ids = [recipe['id'] for recipe in recipes]
+
+    tags = {}
+    for tag in Recipe.tags.through.objects.filter(
+        recipe_id__in=recipe_ids
+    ).order_by('tag__name').values(
+        'recipe_id', 'tag_id', 'tag__name', 'tag__slug'
+    ):
+        tags.setdefault(tag['recipe_id'], []).append({
+            'id': tag['tag_id'],
+            'name': tag['tag__name'],
+            'slug': tag['tag__slug'],
+        })
+
+    ingredients = {}
+    for item in RecipeIngredient.objects.filter(
+        recipe_id__in=recipe_ids
+    ).values(
+        'recipe_id', 'ingredient_id', 'ingredient__name',
+        'ingredient__measurement_unit', 'amount'
+    ):
+        ingredients.setdefault(item['recipe_id'], []).append({
+            'id': item['ingredient_id'],
+            'name': item['ingredient__name'],
+            'measurement_unit': item['ingredient__measurement_unit'],
+            'amount': item['amount'],
+        })
+
+    authors = {
+        author['id']: {
+            'username': author['username'],
+            'first_name': author['first_name'],
+            'last_name': author['last_name'],
+            'id': author['id'],
+            'email': author['email'],
+            'is_subscribed': False,
+            'avatar': file_url(User, 'avatar', author['avatar']),
+        }
+        for author in User.objects.filter(
+            id__in={recipe['author_id'] for recipe in recipes}
+        ).order_by().values(
+            'id', 'email', 'username', 'first_name', 'last_name', 'avatar'
+        )
+    }
+
+    return {
+        recipe['id']: (recipe['document_version'], json.dumps({
+            'id': recipe['id'],
+            'tags': tags.get(recipe['id'], []),
+            'author': authors[recipe['author_id']],
+            'ingredients': ingredients.get(recipe['id'], []),
+            'name': recipe['name'],
+            'image': file_url(Recipe, 'image', recipe['image']),
+            'text': recipe['text'],
+            'cooking_time': recipe['cooking_time'],
+            'is_favorited': False,
+            'is_in_shopping_cart': False,
+        }, ensure_ascii=False))
+        for recipe in recipes
+    }
+
+
+def save_documents(documents):
+    """Сохраняет собранные документы, заменяя прежние."""
+    RecipeDocument.objects.bulk_create(
+        (
+            RecipeDocument(recipe_id=pk, version=version, content=content)
+            for pk, (version, content) in documents.items()
+        ),
+        update_conflicts=True,
+        unique_fields=('recipe',),
+        update_fields=('version', 'content'),
+    )
+
+
+def load_documents(keys):
+    """Читает сохраненные документы по ключам (id, версия)."""
+    versions = dict(keys)
+    return {
+        (pk, version): content
+        for pk, version, content in RecipeDocument.objects.filter(
+            recipe_id__in=versions
+        ).values_list('recipe_id', 'version', 'content')
+        if versions[pk] == version
+    }
+
+
+def compute_documents(keys):
+    """Собирает и сохраняет документы по ключам (id, версия)."""
+    built = build_documents([pk for pk, _ in keys])
+    save_documents(built)
+    return {
+        (pk, version): built[pk][1] for pk, version in keys if pk in built
+    }
+
+
+def get_documents(versions):
+    """Возвращает документы рецептов {id: dict} по {id: версия}.
+
+    Отсутствующие и устаревшие документы собираются и сохраняются,
+    причем каждый - одним запросом на все процессы. Пока документ
+    пересобирает другой запрос, отдается его предыдущая версия.
+    """
+    stored, stale = {}, {}
+    for pk, version, content in RecipeDocument.objects.filter(
+        recipe_id__in=versions
+    ).values_list('recipe_id', 'version', 'content'):
+        if versions[pk] == version:
+            stored[pk] = content
+        elif settings.RECIPE_DOCUMENT_SERVE_STALE:
+            stale[(pk, versions[pk])] = content
+    missing = [
+        (pk, version) for pk, version in versions.items()
+        if pk not in stored
+    ]
+    if missing:
+        stored.update(
+            (pk, content) for (pk, _), content in flights.get_many(
+                missing, load_documents, compute_documents, stale
+            ).items()
+        )
+    return {pk: json.loads(content) for pk, content in stored.items()}
+
+
+def rebuild_documents(batch_size=RECIPE_DOCUMENT_BATCH_SIZE):
+    """Пересобирает документы всех рецептов; возвращает их количество."""
+    total = 0
+    last_id = 0
+    while True:
+        ids = list(Recipe.objects.filter(pk__gt=last_id).order_by(
+            'pk').values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            return total
+        save_documents(build_documents(ids))
+        total += len(ids)
+        last_id = ids[-1]
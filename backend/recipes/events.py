@@ -0,0 +1,147 @@
+"""Уведомления об изменениях избранного, корзины и подписок.
+
+Источник событий - журнал RecipeChange: у записей о списках
+пользователя заполнен user_id, а id записи служит id события, по
+которому клиент продолжает поток после переподключения. Брокер только
+будит потоки событий, которым пора перечитать журнал.
+
+Внутри процесса брокер будится сразу после фиксации транзакции
+(recipes.changes.record_relation_changes). Изменения из других
+процессов - воркеров gunicorn и других ASGI-воркеров - брокер находит,
+раз в EVENTS_POLL_INTERVAL секунд читая новые записи журнала одним
+запросом на весь процесс. EVENTS_POLL_INTERVAL = 0 отключает опрос,
+если приложение работает в одном ASGI-процессе.
+
+События - подсказки: получив событие, клиент догружает изменения через
+/api/recipes/changes/, который учитывает поздно зафиксированные записи.
+"""
+
+import asyncio
+import logging
+import threading
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections
+from django.db.models import Max
+
+from .models import RecipeChange
+
+logger = logging.getLogger(__name__)
+
+
+def run_sync(func):
+    """Обертка для вызова кода с БД из потока событий.
+
+    Код выполняется в общем пуле потоков, а не в отдельном потоке
+    запроса, поэтому открытые потоки событий не держат по соединению
+    с БД каждый.
+    """
+    def call(*args):
+        close_old_connections()
+        return func(*args)
+    return sync_to_async(call, thread_sensitive=False)
+
+
+def latest_event_id():
+    """id последней записи журнала."""
+    return RecipeChange.objects.aggregate(
+        last=Max('pk'))['last'] or 0
+
+
+def changed_users(since, user_ids):
+    """Курсор и пользователи из user_ids, у которых есть записи после since."""
+    rows = list(RecipeChange.objects.filter(
+        pk__gt=since, user_id__isnull=False
+    ).order_by().values_list('pk', 'user_id'))
+    if not rows:
+        return since, set()
+    return (
+        max(pk for pk, _ in rows),
+        {user_id for _, user_id in rows} & set(user_ids),
+    )
+
+
+def read_user_events(user_id, since, limit):
+    """До limit записей журнала пользователя после since."""
+    return list(RecipeChange.objects.filter(
+        user_id=user_id, pk__gt=since
+    ).order_by('pk').values_list(
+        'pk', 'kind', 'object_id', 'deleted')[:limit])
+
+
+class EventBroker:
+    """Брокер уведомлений для потоков событий процесса.
+
+    Потоки событий работают в цикле событий ASGI-сервера, а
+    уведомления приходят из потоков запросов, поэтому notify передает
+    их в цикл через call_soon_threadsafe.
+    """
+
+    def __init__(self):
+        """Создает брокер без подписчиков."""
+        self.loop = None
+        self.waiters = {}
+        self.poller = None
+        self.lock = threading.Lock()
+
+    def subscribe(self, user_id):
+        """Подписывает поток событий; возвращает asyncio.Event пробуждения."""
+        loop = asyncio.get_running_loop()
+        with self.lock:
+            self.loop = loop
+        waiter = asyncio.Event()
+        self.waiters.setdefault(user_id, set()).add(waiter)
+        if settings.EVENTS_POLL_INTERVAL and (
+            self.poller is None or self.poller.done()
+        ):
+            self.poller = loop.create_task(self._poll())
+        return waiter
+
+    def unsubscribe(self, user_id, waiter):
+        """Отписывает поток событий."""
+        waiters = self.waiters.get(user_id)
+        if waiters is None:
+            return
+        waiters.discard(waiter)
+        if not waiters:
+            del self.waiters[user_id]
+
+    def notify(self, user_ids):
+        """Будит потоки событий пользователей; можно вызывать из любого потока.
+
+        В процессе без потоков событий (например, WSGI) ничего не делает.
+        """
+        with self.lock:
+            loop = self.loop
+        if loop is None or loop.is_closed():
+            return
+        try:
+            loop.call_soon_threadsafe(self._wake, tuple(user_ids))
+        except RuntimeError:
+            # Цикл событий закрылся между проверкой и вызовом.
+            pass
+
+    def _wake(self, user_ids):
+        """Будит потоки событий пользователей (в цикле событий)."""
+        for user_id in user_ids:
+            for waiter in self.waiters.get(user_id, ()):
+                waiter.set()
+
+    async def _poll(self):
+        """Находит изменения из других процессов, пока есть подписчики."""
+        cursor = None
+        while self.waiters:
+            try:
+                if cursor is None:
+                    cursor = await run_sync(latest_event_id)()
+                else:
+                    cursor, user_ids = await run_sync(changed_users)(
+                        cursor, list(self.waiters))
+                    self._wake(user_ids)
+            except DatabaseError:
+                logger.exception('Не удалось прочитать журнал изменений')
+            await asyncio.sleep(settings.EVENTS_POLL_INTERVAL)
+
+
+broker = EventBroker()
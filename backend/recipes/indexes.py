@@ -0,0 +1,28 @@
+"""Индексы, учитывающие особенности конкретной СУБД."""
+
+from django.db import models
+
+
+class PrefixSearchIndex(models.Index):
+    """Индекс для поиска по префиксу без учета регистра (istartswith).
+
+    На PostgreSQL выражение индексируется с классом операторов
+    text_pattern_ops, иначе LIKE 'abc%' не сможет его использовать
+    при локали, отличной от C. На остальных СУБД создается обычный
+    индекс по выражению.
+    """
+
+    def create_sql(self, model, schema_editor, using='', **kwargs):
+        """Добавляет класс операторов для PostgreSQL."""
+        index = self
+        if schema_editor.connection.vendor == 'postgresql':
+            from django.contrib.postgres.indexes import OpClass
+
+            index = self.clone()
+            index.expressions = tuple(
+                OpClass(expression, name='text_pattern_ops')
+                for expression in self.expressions
+            )
+        return super(PrefixSearchIndex, index).create_sql(
+            model, schema_editor, using=using, **kwargs
+        )
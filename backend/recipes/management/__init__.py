@@ -0,0 +1 @@
+"""Служебные команды и тестовые данные приложения recipes."""
@@ -0,0 +1,109 @@
+"""Модуль для сравнения сериализаторов списка рецептов."""
+
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from api.renderers import ORJSONRenderer
+from api.serializers import RecipeReadSerializer, RecipeSerializer
+from api.views import RecipeViewSet
+from recipes.management.seeding import seed_dataset
+
+# Полностью раскрытый ответ совпадает с ответом по умолчанию, но
+# отключает быстрый путь, поэтому отдается RecipeSerializer.
+FULL_EXPAND = 'expand=author,tags,ingredients'
+
+
+class Command(BaseCommand):
+    """Команда для сравнения RecipeSerializer и RecipeReadSerializer.
+
+    Проверяет, что оба сериализатора выдают побайтно одинаковый JSON
+    для страницы рецептов, и измеряет время сериализации вместе с
+    запросами и рендерингом. Тестовые данные откатываются.
+    """
+
+    help = 'Check parity and benchmark recipe list serializers'
+
+    def add_arguments(self, parser):
+        """Добавляет параметры команды."""
+        parser.add_argument('--seed', type=int, default=200)
+        parser.add_argument('--page-size', type=int, default=50)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        """Сравнивает вывод и время работы сериализаторов."""
+        with transaction.atomic():
+            users, _ = seed_dataset(options['seed'], prefix='bench')
+            user = users[0]
+            page_size = options['page_size']
+
+            old_request = self.make_request(user, FULL_EXPAND)
+            new_request = self.make_request(user)
+
+            def render_old():
+                page = list(self.get_queryset(old_request)[:page_size])
+                data = RecipeSerializer(
+                    page, many=True, context={'request': old_request}).data
+                return JSONRenderer().render(data)
+
+            def render_new():
+                page = self.get_queryset(new_request)[:page_size]
+                data = RecipeReadSerializer(
+                    page, many=True, context={'request': new_request}).data
+                return ORJSONRenderer().render(data)
+
+            if render_old() != render_new():
+                raise CommandError(
+                    'RecipeReadSerializer выдает ответ, отличный от '
+                    'RecipeSerializer')
+            self.stdout.write(self.style.SUCCESS('Ответы совпадают'))
+
+            results = {
+                'RecipeSerializer + JSONRenderer': self.measure(
+                    render_old, options['repeat']),
+                'RecipeReadSerializer + ORJSONRenderer': self.measure(
+                    render_new, options['repeat']),
+            }
+            transaction.set_rollback(True)
+
+        for label, (wall, cpu) in results.items():
+            self.stdout.write(
+                f'{label}: {wall * 1000:.2f} мс (CPU {cpu * 1000:.2f} мс) '
+                f'на страницу из {page_size} рецептов')
+        (old_wall, old_cpu), (new_wall, new_cpu) = results.values()
+        self.stdout.write(
+            f'Ускорение: {old_wall / new_wall:.1f}x, '
+            f'по CPU {old_cpu / new_cpu:.1f}x')
+
+    @staticmethod
+    def make_request(user, query=''):
+        """Создает запрос к списку рецептов от имени пользователя."""
+        request = Request(APIRequestFactory(
+            HTTP_HOST=settings.ALLOWED_HOSTS[0]
+        ).get(f'/api/recipes/?{query}'))
+        request.user = user
+        return request
+
+    @staticmethod
+    def get_queryset(request):
+        """Возвращает queryset, который построил бы RecipeViewSet."""
+        view = RecipeViewSet(
+            request=request, action='list', format_kwarg=None, kwargs={})
+        return view.get_queryset()
+
+    @staticmethod
+    def measure(func, repeat):
+        """Медианы реального и процессорного времени вызова."""
+        wall, cpu = [], []
+        for _ in range(repeat):
+            wall_start, cpu_start = time.perf_counter(), time.process_time()
+            func()
+            wall.append(time.perf_counter() - wall_start)
+            cpu.append(time.process_time() - cpu_start)
+        return statistics.median(wall), statistics.median(cpu)
@@ -0,0 +1,193 @@
+"""Модуль для измерения пропускной способности SQLite на смеси запросов API."""
+
+import multiprocessing
+import os
+import random
+import statistics
+import tempfile
+import time
+from collections import Counter
+
+from django.apps import apps
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, IntegrityError, connections
+from django.db.utils import load_backend
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from api.views import RecipeViewSet
+from recipes.management.seeding import seed_dataset
+from recipes.models import Recipe, User
+
+PROFILES = {
+    'stock': {'ENGINE': 'django.db.backends.sqlite3', 'OPTIONS': {}},
+    'tuned': {'ENGINE': 'foodgram.backends.sqlite3', 'OPTIONS': {}},
+}
+
+LIST_VIEW = RecipeViewSet.as_view({'get': 'list'})
+DETAIL_VIEW = RecipeViewSet.as_view({'get': 'retrieve'})
+FAVORITE_VIEW = RecipeViewSet.as_view(
+    {'post': 'favorite', 'delete': 'delete_favorite'})
+CART_VIEW = RecipeViewSet.as_view(
+    {'post': 'shopping_cart', 'delete': 'delete_shopping_cart'})
+CART_BULK_VIEW = RecipeViewSet.as_view(
+    {'post': 'shopping_cart_bulk', 'delete': 'shopping_cart_bulk'})
+
+
+def open_database(profile, name):
+    """Подменяет соединение default соединением с нужным профилем."""
+    settings_dict = {
+        **connections.settings['default'],
+        'ENGINE': PROFILES[profile]['ENGINE'],
+        'NAME': name,
+        'OPTIONS': PROFILES[profile]['OPTIONS'],
+    }
+    backend = load_backend(settings_dict['ENGINE'])
+    connections['default'] = backend.DatabaseWrapper(settings_dict, 'default')
+    return connections['default']
+
+
+def create_schema(connection):
+    """Создает таблицы всех моделей в пустой базе."""
+    with connection.schema_editor() as editor:
+        for model in apps.get_models():
+            if model._meta.managed and not model._meta.proxy:
+                editor.create_model(model)
+
+
+def run_client(profile, name, duration, write_share, seed, results):
+    """Процесс-обработчик: выполняет смесь запросов API до конца теста."""
+    open_database(profile, name)
+    rng = random.Random(seed)
+    factory = APIRequestFactory(HTTP_HOST=settings.ALLOWED_HOSTS[0])
+    users = list(User.objects.all())
+    recipe_ids = list(Recipe.objects.values_list('pk', flat=True))
+    latencies = {'read': [], 'write': []}
+    errors = Counter()
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        user = rng.choice(users)
+        pk = rng.choice(recipe_ids)
+        if rng.random() < write_share:
+            kind = 'write'
+            method = rng.choice(('post', 'delete'))
+            if rng.random() < 0.25:
+                view, kwargs = CART_BULK_VIEW, {}
+                request = getattr(factory, method)(
+                    '/api/recipes/shopping_cart/bulk/',
+                    {'ids': rng.sample(recipe_ids, 5)}, format='json')
+            else:
+                view, kwargs = rng.choice((FAVORITE_VIEW, CART_VIEW)), {
+                    'pk': pk}
+                request = getattr(factory, method)(f'/api/recipes/{pk}/')
+        else:
+            kind = 'read'
+            if rng.random() < 0.7:
+                view, kwargs = LIST_VIEW, {}
+                request = factory.get('/api/recipes/')
+            else:
+                view, kwargs = DETAIL_VIEW, {'pk': pk}
+                request = factory.get(f'/api/recipes/{pk}/')
+        force_authenticate(request, user=user)
+        started = time.perf_counter()
+        try:
+            view(request, **kwargs).render()
+        except IntegrityError:
+            # Гонка двух одинаковых добавлений, а не блокировка базы.
+            errors['integrity'] += 1
+            continue
+        except DatabaseError as error:
+            errors['locked' if 'locked' in str(error) else 'other'] += 1
+            continue
+        except Exception:
+            errors['other'] += 1
+            continue
+        latencies[kind].append(time.perf_counter() - started)
+    connections['default'].close()
+    results.put((latencies, errors))
+
+
+class Command(BaseCommand):
+    """Команда для сравнения стандартного и настроенного SQLite.
+
+    Для каждого профиля создает временную базу с тестовыми данными и
+    запускает несколько процессов (как воркеры gunicorn), которые
+    выполняют смесь чтения списка и рецепта и записи в избранное и
+    корзину (в том числе массовой, в транзакции). Выводит пропускную
+    способность, задержки и число ошибок "database is locked".
+    """
+
+    help = 'Benchmark concurrent API throughput on stock and tuned SQLite'
+
+    def add_arguments(self, parser):
+        """Добавляет параметры команды."""
+        parser.add_argument('--seed', type=int, default=200)
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument('--duration', type=float, default=10)
+        parser.add_argument(
+            '--write-share',
+            type=float,
+            default=0.2,
+            help='Доля запросов на запись',
+        )
+        parser.add_argument(
+            '--profiles',
+            default='stock,tuned',
+            help='Профили через запятую: stock, tuned',
+        )
+
+    def handle(self, *args, **options):
+        """Запускает тест для каждого профиля и выводит сводку."""
+        context = multiprocessing.get_context('fork')
+        original = connections['default']
+        try:
+            for profile in options['profiles'].split(','):
+                with tempfile.TemporaryDirectory() as directory:
+                    name = os.path.join(directory, 'benchmark.sqlite3')
+                    connection = open_database(profile, name)
+                    create_schema(connection)
+                    seed_dataset(options['seed'], prefix='bench')
+                    connection.close()
+
+                    results = context.Queue()
+                    workers = [
+                        context.Process(target=run_client, args=(
+                            profile, name, options['duration'],
+                            options['write_share'], index, results))
+                        for index in range(options['workers'])
+                    ]
+                    for worker in workers:
+                        worker.start()
+                    collected = [
+                        results.get(timeout=options['duration'] + 60)
+                        for _ in workers
+                    ]
+                    for worker in workers:
+                        worker.join()
+                self.report(profile, collected, options['duration'])
+        finally:
+            connections['default'] = original
+
+    def report(self, profile, collected, duration):
+        """Выводит результаты одного профиля."""
+        latencies = {'read': [], 'write': []}
+        errors = Counter()
+        for worker_latencies, worker_errors in collected:
+            for kind, values in worker_latencies.items():
+                latencies[kind].extend(values)
+            errors.update(worker_errors)
+        total = sum(len(values) for values in latencies.values())
+        self.stdout.write(self.style.SUCCESS(
+            f'{profile}: {total / duration:.0f} запросов/с'))
+        for kind, values in latencies.items():
+            if not values:
+                continue
+            values.sort()
+            self.stdout.write(
+                f'  {kind}: {len(values) / duration:.0f}/с, '
+                f'p50 {statistics.median(values) * 1000:.1f} мс, '
+                f'p95 {values[int(len(values) * 0.95)] * 1000:.1f} мс')
+        self.stdout.write(
+            f'  ошибки: locked {errors["locked"]}, '
+            f'конфликты вставки {errors["integrity"]}, '
+            f'прочие {errors["other"]}')
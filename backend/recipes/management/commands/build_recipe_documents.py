@@ -0,0 +1,32 @@
+"""Модуль для пересборки документов рецептов."""
+
+from django.core.management.base import BaseCommand
+
+from api.constants import RECIPE_DOCUMENT_BATCH_SIZE
+from recipes.documents import rebuild_documents
+
+
+class Command(BaseCommand):
+    """Команда для предварительной сборки документов всех рецептов.
+
+    Документы собираются и при чтении, но после развертывания или
+    массовой загрузки данных их удобнее собрать заранее, чтобы первые
+    запросы не тратили на это время.
+    """
+
+    help = 'Build precomputed JSON documents for all recipes'
+
+    def add_arguments(self, parser):
+        """Добавляет параметры команды."""
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=RECIPE_DOCUMENT_BATCH_SIZE,
+            help='Количество рецептов, собираемых за один проход',
+        )
+
+    def handle(self, *args, **options):
+        """Пересобирает документы и выводит их количество."""
+        total = rebuild_documents(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Собрано документов: {total}'))
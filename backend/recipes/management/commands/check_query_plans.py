@@ -0,0 +1,202 @@
+"""Модуль для проверки планов выполнения основных запросов API."""
+
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count, Sum
+
+from recipes.management.seeding import seed_dataset
+from recipes.models import (
+    Favorite,
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    ShoppingCart,
+    Subscription,
+    User,
+)
+
+SEQ_SCAN_PATTERNS = {
+    'postgresql': re.compile(r'Seq Scan on (\w+)'),
+    'sqlite': re.compile(r'\bSCAN (?:TABLE )?(\w+)(?: AS \w+)?\s*$'),
+}
+
+
+def hot_queries(user, author, recipe):
+    """Возвращает основные запросы из api/views.py и api/filters.py.
+
+    Каждый элемент - (название, таблицы, queryset, СУБД). Для таблиц
+    из списка последовательное сканирование считается ошибкой;
+    пустой список СУБД означает проверку везде.
+    """
+    return (
+        (
+            'recipes: список по дате',
+            ('recipes_recipe',),
+            Recipe.objects.order_by('-pub_date')[:6],
+            (),
+        ),
+        (
+            'recipes: фильтр по автору',
+            ('recipes_recipe',),
+            Recipe.objects.filter(author=author).order_by('-pub_date')[:6],
+            (),
+        ),
+        (
+            'recipes: is_favorited=1',
+            ('recipes_favorite',),
+            Recipe.objects.filter(favorite__user=user)[:6],
+            (),
+        ),
+        (
+            'recipes: is_in_shopping_cart=1',
+            ('recipes_shoppingcart',),
+            Recipe.objects.filter(shoppingcart__user=user)[:6],
+            (),
+        ),
+        (
+            'recipe: ингредиенты рецепта',
+            ('recipes_recipeingredient',),
+            RecipeIngredient.objects.filter(recipe=recipe).select_related(
+                'ingredient').order_by('ingredient__name'),
+            (),
+        ),
+        (
+            'recipe: is_favorited',
+            ('recipes_favorite',),
+            Favorite.objects.filter(recipe=recipe, user=user),
+            (),
+        ),
+        (
+            'recipe: is_in_shopping_cart',
+            ('recipes_shoppingcart',),
+            ShoppingCart.objects.filter(recipe=recipe, user=user),
+            (),
+        ),
+        (
+            'users: is_subscribed',
+            ('recipes_subscription',),
+            Subscription.objects.filter(author=author, user=user),
+            (),
+        ),
+        (
+            'users: subscriptions',
+            ('recipes_subscription', 'recipes_recipe'),
+            User.objects.filter(
+                subscriptions_to_author__user=user
+            ).annotate(recipes_count=Count('recipes')).order_by('username'),
+            (),
+        ),
+        (
+            'users: subscriptions, рецепты автора',
+            ('recipes_recipe',),
+            author.recipes.all()[:3],
+            (),
+        ),
+        (
+            'recipes: download_shopping_cart',
+            ('recipes_shoppingcart', 'recipes_recipeingredient'),
+            RecipeIngredient.objects.filter(
+                recipe__shoppingcart__user=user
+            ).values(
+                'ingredient__name',
+                'ingredient__measurement_unit'
+            ).annotate(total_amount=Sum('amount')).order_by(
+                'ingredient__name'),
+            (),
+        ),
+        (
+            'ingredients: поиск по началу названия',
+            ('recipes_ingredient',),
+            Ingredient.objects.filter(name__istartswith='сах'),
+            ('postgresql',),
+        ),
+    )
+
+
+class Command(BaseCommand):
+    """Команда для проверки планов основных запросов API.
+
+    Запускает EXPLAIN (на SQLite - EXPLAIN QUERY PLAN) для каждого
+    основного запроса и завершается с ошибкой, если запрос к
+    проверяемой таблице выполняется последовательным сканированием.
+    Тестовые данные создаются внутри транзакции и откатываются.
+    """
+
+    help = 'Check query plans of the hot API queries for sequential scans'
+
+    def add_arguments(self, parser):
+        """Добавляет параметры команды."""
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=500,
+            help='Количество тестовых рецептов (0 - без тестовых данных)',
+        )
+        parser.add_argument(
+            '--verbose-plans',
+            action='store_true',
+            help='Выводить планы всех запросов',
+        )
+
+    def handle(self, *args, **options):
+        """Проверяет планы запросов на тестовом наборе данных."""
+        vendor = connection.vendor
+        if vendor not in SEQ_SCAN_PATTERNS:
+            raise CommandError(f'СУБД {vendor} не поддерживается')
+
+        failures = []
+        with transaction.atomic():
+            if options['seed']:
+                seed_dataset(options['seed'])
+            user, author, recipe = self.get_sample()
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+                if vendor == 'postgresql':
+                    cursor.execute('SET LOCAL enable_seqscan = off')
+            for label, tables, queryset, vendors in hot_queries(
+                    user, author, recipe):
+                if vendors and vendor not in vendors:
+                    continue
+                plan = queryset.explain()
+                scanned = self.find_seq_scans(vendor, plan) & set(tables)
+                if scanned:
+                    failures.append(label)
+                    self.stdout.write(self.style.ERROR(
+                        f'{label}: последовательное сканирование '
+                        f'{", ".join(sorted(scanned))}'))
+                    self.stdout.write(plan)
+                else:
+                    self.stdout.write(self.style.SUCCESS(f'{label}: OK'))
+                    if options['verbose_plans']:
+                        self.stdout.write(plan)
+            transaction.set_rollback(True)
+
+        if failures:
+            raise CommandError(
+                f'Запросов без подходящего индекса: {len(failures)}')
+
+    @staticmethod
+    def find_seq_scans(vendor, plan):
+        """Возвращает таблицы, которые сканируются последовательно."""
+        pattern = SEQ_SCAN_PATTERNS[vendor]
+        tables = set()
+        for line in plan.splitlines():
+            if 'USING' in line:
+                continue
+            match = pattern.search(line)
+            if match:
+                tables.add(match.group(1))
+        return tables
+
+    @staticmethod
+    def get_sample():
+        """Возвращает пользователя, автора и рецепт для запросов."""
+        user = User.objects.filter(shoppingcart__isnull=False).first()
+        author = User.objects.filter(recipes__isnull=False).first()
+        recipe = Recipe.objects.first()
+        if not (user and author and recipe):
+            raise CommandError(
+                'Недостаточно данных: запустите команду с --seed')
+        return user, author, recipe
@@ -0,0 +1,145 @@
+"""Модуль для удаления медиафайлов, на которые нет ссылок."""
+
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from recipes.media import MEDIA_FIELDS, referenced
+
+
+def iter_files(root, directory):
+    """Обходит каталог, не собирая список файлов в память.
+
+    Возвращает пары (имя относительно root в формате поля, stat).
+    """
+    stack = [os.path.join(root, directory)]
+    while stack:
+        try:
+            with os.scandir(stack.pop()) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.is_file(follow_symlinks=False):
+                        name = os.path.relpath(entry.path, root)
+                        yield name.replace(os.sep, '/'), entry.stat()
+        except FileNotFoundError:
+            continue
+
+
+def batched(iterable, size):
+    """Разбивает поток на списки не длиннее size."""
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+class Command(BaseCommand):
+    """Команда для удаления осиротевших медиафайлов.
+
+    Обходит каталоги upload_to полей Recipe.image и User.avatar
+    пакетами и удаляет файлы, на которые нет ссылок в базе. Файлы
+    моложе --grace-hours не трогаются: их могли только что загрузить.
+    """
+
+    help = 'Delete media files not referenced by recipes or users'
+
+    def add_arguments(self, parser):
+        """Добавляет параметры команды."""
+        parser.add_argument(
+            '--grace-hours',
+            type=float,
+            default=24,
+            help='Не удалять файлы, измененные за последние N часов',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Количество файлов, проверяемых одним запросом',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=8,
+            help='Количество потоков удаления',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать, что будет удалено',
+        )
+
+    def handle(self, *args, **options):
+        """Находит и удаляет файлы без ссылок."""
+        root = settings.MEDIA_ROOT
+        deadline = time.time() - options['grace_hours'] * 3600
+        dry_run = options['dry_run']
+        report = {'scanned': 0, 'referenced': 0, 'recent': 0}
+        deleted, failed, freed = 0, 0, 0
+
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            for model, field in MEDIA_FIELDS:
+                directory = model._meta.get_field(field).upload_to
+                for batch in batched(
+                        iter_files(root, directory), options['batch_size']):
+                    report['scanned'] += len(batch)
+                    used = referenced([name for name, _ in batch])
+                    orphans = []
+                    for name, stat in batch:
+                        if name in used:
+                            report['referenced'] += 1
+                        elif stat.st_mtime > deadline:
+                            report['recent'] += 1
+                        else:
+                            orphans.append((name, stat.st_size))
+                    for name, _ in orphans:
+                        if dry_run or options['verbosity'] > 1:
+                            self.stdout.write(name)
+                    if dry_run:
+                        deleted += len(orphans)
+                        freed += sum(size for _, size in orphans)
+                        continue
+                    results = pool.map(
+                        lambda orphan: self.delete(root, *orphan, deadline),
+                        orphans)
+                    for outcome, size in results:
+                        if outcome == 'failed':
+                            failed += 1
+                        elif outcome == 'recent':
+                            report['recent'] += 1
+                        else:
+                            deleted += 1
+                            freed += size
+
+        action = 'Будет удалено' if dry_run else 'Удалено'
+        self.stdout.write(
+            f'Проверено файлов: {report["scanned"]}, '
+            f'используется: {report["referenced"]}, '
+            f'в льготном периоде: {report["recent"]}')
+        self.stdout.write(self.style.SUCCESS(
+            f'{action}: {deleted} ({freed / 1024 / 1024:.1f} МБ)'))
+        if failed:
+            self.stdout.write(self.style.ERROR(
+                f'Не удалось удалить: {failed}'))
+
+    @staticmethod
+    def delete(root, name, size, deadline):
+        """Удаляет файл; возвращает (результат, освобожденный размер).
+
+        Файл перед удалением проверяется еще раз: пока шла проверка
+        ссылок, его могли перезаписать новой загрузкой.
+        """
+        path = os.path.join(root, name)
+        try:
+            if os.stat(path).st_mtime > deadline:
+                return 'recent', 0
+            os.remove(path)
+        except FileNotFoundError:
+            return 'deleted', 0
+        except OSError:
+            return 'failed', 0
+        return 'deleted', size
@@ -0,0 +1,42 @@
+"""Модуль для выгрузки каталога рецептов в NDJSON."""
+
+from django.core.management.base import BaseCommand
+
+from api.constants import CATALOG_BATCH_SIZE
+from recipes.catalog import export_catalog
+
+
+class Command(BaseCommand):
+    """Команда для потоковой выгрузки каталога рецептов.
+
+    В отличие от dumpdata рецепты читаются пакетами, а ссылки на
+    теги, ингредиенты и авторов записываются естественными ключами,
+    поэтому файл можно загрузить в базу с другими id.
+    """
+
+    help = 'Export recipes with tags and ingredients as NDJSON'
+
+    def add_arguments(self, parser):
+        """Добавляет параметры команды."""
+        parser.add_argument(
+            '--output',
+            help='Файл для выгрузки (по умолчанию stdout)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=CATALOG_BATCH_SIZE,
+            help='Количество рецептов, читаемых за один запрос',
+        )
+
+    def handle(self, *args, **options):
+        """Пишет каталог в файл или stdout."""
+        lines = export_catalog(options['batch_size'])
+        if not options['output']:
+            for line in lines:
+                self.stdout.write(line, ending='')
+            return
+        with open(options['output'], 'w', encoding='utf-8') as file:
+            file.writelines(lines)
+        self.stderr.write(self.style.SUCCESS(
+            f'Каталог выгружен в {options["output"]}'))
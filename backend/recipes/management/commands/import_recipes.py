@@ -0,0 +1,53 @@
+"""Модуль для загрузки каталога рецептов из NDJSON."""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.constants import CATALOG_BATCH_SIZE
+from recipes.catalog import CatalogError, import_catalog
+
+
+class Command(BaseCommand):
+    """Команда для потоковой загрузки каталога рецептов.
+
+    Файл читается построчно и загружается пакетами. После сбоя
+    повторный запуск с тем же файлом продолжает загрузку с последнего
+    сохраненного пакета; уже загруженные рецепты не дублируются.
+    """
+
+    help = 'Import recipes from an NDJSON catalog exported by export_recipes'
+
+    def add_arguments(self, parser):
+        """Добавляет параметры команды."""
+        parser.add_argument('path', help='Файл каталога')
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=CATALOG_BATCH_SIZE,
+            help='Количество рецептов в одной транзакции',
+        )
+        parser.add_argument(
+            '--restart',
+            action='store_true',
+            help='Начать загрузку заново, не продолжая прерванную',
+        )
+        parser.add_argument(
+            '--create-authors',
+            action='store_true',
+            help='Создавать недостающих авторов (без пароля)',
+        )
+
+    def handle(self, *args, **options):
+        """Загружает каталог и выводит итог."""
+        try:
+            checkpoint = import_catalog(
+                options['path'],
+                batch_size=options['batch_size'],
+                restart=options['restart'],
+                create_authors=options['create_authors'],
+            )
+        except (CatalogError, OSError) as error:
+            raise CommandError(str(error)) from error
+        self.stdout.write(self.style.SUCCESS(
+            f'Загружено рецептов: {checkpoint.imported}, '
+            f'пропущено (неверные, без автора, уже загруженные): '
+            f'{checkpoint.skipped}'))
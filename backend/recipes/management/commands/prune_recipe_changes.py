@@ -0,0 +1,31 @@
+"""Модуль для очистки журнала изменений рецептов."""
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from recipes.changes import prune_changes
+
+
+class Command(BaseCommand):
+    """Команда для удаления старых записей журнала изменений.
+
+    Клиенты с курсором старше удаленных записей получат reset и
+    загрузят список рецептов заново.
+    """
+
+    help = 'Delete recipe change log entries older than the retention period'
+
+    def add_arguments(self, parser):
+        """Добавляет параметры команды."""
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=settings.CHANGES_RETENTION_DAYS,
+            help='Хранить записи за последние N дней',
+        )
+
+    def handle(self, *args, **options):
+        """Удаляет старые записи и выводит их количество."""
+        deleted = prune_changes(options['days'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Удалено записей журнала: {deleted}'))
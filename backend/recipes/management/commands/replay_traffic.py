@@ -0,0 +1,186 @@
+"""Модуль для нагрузочного теста API смесью запросов из сценария."""
+
+import asyncio
+import json
+import multiprocessing
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from recipes.management.loadgen import (
+    AsyncHttpTransport,
+    AsyncTestClientTransport,
+    HttpTransport,
+    Replayer,
+    Stats,
+    TestClientTransport,
+    collect_pools,
+    load_scenario,
+    run_async,
+    run_worker,
+)
+
+DEFAULT_SCENARIO = os.path.join(
+    settings.BASE_DIR, 'data', 'load_scenario.jsonl')
+MODES = ('threads', 'processes', 'asyncio')
+
+
+def run_process(make_transport, replayer, duration, results):
+    """Процесс-обработчик: выполняет сценарий и отдает статистику."""
+    results.put(run_worker(make_transport(), replayer, duration))
+
+
+class Command(BaseCommand):
+    """Команда для воспроизведения смеси запросов к API.
+
+    Запросы идут к запущенному серверу (--url) или, без него, через
+    тестовый клиент Django в этом же процессе. Данные для запросов и
+    токены пользователей берутся из базы, поэтому сервер должен
+    работать с той же базой. Переключатели избранного, корзины и
+    подписок меняют данные: не запускайте команду на боевой базе.
+    """
+
+    help = 'Replay a weighted API request mix and report latency percentiles'
+
+    def add_arguments(self, parser):
+        """Добавляет параметры команды."""
+        parser.add_argument(
+            '--scenario',
+            default=DEFAULT_SCENARIO,
+            help='Файл сценария JSONL',
+        )
+        parser.add_argument(
+            '--url',
+            help='Адрес сервера, например http://localhost:8000; '
+                 'без него используется тестовый клиент',
+        )
+        parser.add_argument('--mode', choices=MODES, default='threads')
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=8,
+            help='Число одновременных обработчиков',
+        )
+        parser.add_argument('--duration', type=float, default=10)
+        parser.add_argument(
+            '--users',
+            type=int,
+            default=50,
+            help='Число пользователей для запросов с токеном',
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--json',
+            action='store_true',
+            help='Вывести результаты в JSON',
+        )
+
+    def handle(self, *args, **options):
+        """Запускает обработчики и выводит сводку."""
+        try:
+            routes = load_scenario(options['scenario'])
+        except (OSError, ValueError) as error:
+            raise CommandError(f'Сценарий: {error}') from error
+        pools, tokens = collect_pools(options['users'])
+        for route in routes:
+            empty = {name for name in route.fields if not pools.get(name)}
+            if empty:
+                raise CommandError(
+                    f'{route.name}: нет данных для {", ".join(empty)}')
+            if route.auth and not tokens:
+                raise CommandError(f'{route.name}: нет пользователей')
+
+        url, mode = options['url'], options['mode']
+        host = settings.ALLOWED_HOSTS[0]
+        if mode == 'asyncio':
+            def make_transport():
+                return (AsyncHttpTransport(url) if url
+                        else AsyncTestClientTransport(host))
+        else:
+            def make_transport():
+                return HttpTransport(url) if url else TestClientTransport(host)
+        replayers = [
+            Replayer(routes, pools, tokens, options['seed'] + index)
+            for index in range(options['concurrency'])
+        ]
+        duration = options['duration']
+        started = time.monotonic()
+        collected = getattr(self, f'run_{mode}')(
+            make_transport, replayers, duration)
+        elapsed = time.monotonic() - started
+
+        stats = Stats()
+        for worker_stats in collected:
+            stats.merge(worker_stats)
+        self.report(stats.summary(elapsed), elapsed, options['json'])
+
+    def run_threads(self, make_transport, replayers, duration):
+        """Обработчики в потоках этого процесса."""
+        collected = []
+
+        def target(replayer):
+            collected.append(run_worker(make_transport(), replayer, duration))
+            connections.close_all()
+
+        threads = [
+            threading.Thread(target=target, args=(replayer,))
+            for replayer in replayers
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return collected
+
+    def run_processes(self, make_transport, replayers, duration):
+        """Обработчики в отдельных процессах, как воркеры gunicorn."""
+        # Соединения родителя нельзя использовать после fork.
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        results = context.Queue()
+        workers = [
+            context.Process(target=run_process, args=(
+                make_transport, replayer, duration, results))
+            for replayer in replayers
+        ]
+        for worker in workers:
+            worker.start()
+        collected = [
+            results.get(timeout=duration + 60) for _ in workers
+        ]
+        for worker in workers:
+            worker.join()
+        return collected
+
+    def run_asyncio(self, make_transport, replayers, duration):
+        """Обработчики как корутины в одном цикле событий."""
+        return asyncio.run(run_async(make_transport, replayers, duration))
+
+    def report(self, summary, elapsed, as_json):
+        """Выводит пропускную способность и перцентили по маршрутам."""
+        total = sum(row['requests'] for row in summary.values())
+        if as_json:
+            self.stdout.write(json.dumps({
+                'duration': elapsed,
+                'requests': total,
+                'rps': total / elapsed,
+                'routes': summary,
+            }, indent=2))
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f'Всего: {total} запросов, {total / elapsed:.1f} запросов/с'))
+        self.stdout.write(
+            f'{"маршрут":<28}{"запросов":>9}{"в с":>8}'
+            f'{"p50 мс":>9}{"p95 мс":>9}{"p99 мс":>9}  коды')
+        for name, row in summary.items():
+            statuses = ' '.join(
+                f'{code}:{count}'
+                for code, count in sorted(row['statuses'].items()))
+            self.stdout.write(
+                f'{name:<28}{row["requests"]:>9}{row["rps"]:>8.1f}'
+                f'{row["p50"]:>9.1f}{row["p95"]:>9.1f}{row["p99"]:>9.1f}'
+                f'  {statuses}')
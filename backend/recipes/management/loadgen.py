@@ -0,0 +1,326 @@
+"""Воспроизведение смеси запросов к API для нагрузочных тестов.
+
+Сценарий - файл JSONL, строка которого описывает маршрут:
+
+    {"name": "recipe_detail", "weight": 15, "method": "GET",
+     "path": "/api/recipes/{recipe}/"}
+
+weight - относительная частота маршрута, auth - запрос от имени
+случайного пользователя с токеном, toggle - маршрут-переключатель:
+первый запрос пользователя к пути идет методом method, следующий -
+DELETE, и так по очереди (избранное, корзина, подписки). В path
+подставляются случайные значения из базы: {recipe}, {author}, {tag},
+{prefix} (начало названия ингредиента) и {page}.
+"""
+
+import asyncio
+import json
+import math
+import random
+import string
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+
+import httpx
+import requests
+from django.conf import settings
+from django.test import AsyncClient, Client
+from rest_framework.authtoken.models import Token
+
+from recipes.models import Ingredient, Recipe, Tag, User
+
+PERCENTILES = (0.5, 0.95, 0.99)
+
+
+@dataclass
+class Route:
+    """Маршрут сценария."""
+
+    name: str
+    path: str
+    method: str = 'GET'
+    weight: float = 1
+    auth: bool = False
+    toggle: bool = False
+    body: dict = None
+
+    @property
+    def fields(self):
+        """Имена подстановок в пути."""
+        return {
+            name for _, name, _, _ in string.Formatter().parse(self.path)
+            if name
+        }
+
+
+def load_scenario(path):
+    """Читает маршруты сценария из файла JSONL."""
+    routes = []
+    with open(path, encoding='utf-8') as file:
+        for number, line in enumerate(file, 1):
+            if not line.strip():
+                continue
+            try:
+                route = Route(**json.loads(line))
+            except (ValueError, TypeError) as error:
+                raise ValueError(f'Строка {number}: {error}') from error
+            if route.weight <= 0:
+                raise ValueError(f'Строка {number}: вес должен быть больше 0')
+            route.method = route.method.upper()
+            routes.append(route)
+    if not routes:
+        raise ValueError('Сценарий пуст')
+    return routes
+
+
+def collect_pools(user_count):
+    """Значения для подстановок и токены пользователей из базы.
+
+    Недостающие токены создаются, как при входе пользователя.
+    """
+    recipes = list(Recipe.objects.order_by('?').values_list(
+        'pk', 'author_id')[:1000])
+    prefixes = {
+        name[:2].lower()
+        for name in Ingredient.objects.order_by('?').values_list(
+            'name', flat=True)[:200]
+        if len(name) >= 2
+    }
+    users = list(User.objects.filter(is_active=True).order_by(
+        '?')[:user_count])
+    pages = Recipe.objects.count() // settings.REST_FRAMEWORK['PAGE_SIZE']
+    return {
+        'recipe': [pk for pk, _ in recipes],
+        'author': sorted({author for _, author in recipes}),
+        'tag': list(Tag.objects.values_list('slug', flat=True)),
+        'prefix': sorted(prefixes),
+        'page': list(range(1, max(pages, 1) + 1)),
+    }, [Token.objects.get_or_create(user=user)[0].key for user in users]
+
+
+@dataclass
+class Stats:
+    """Задержки и коды ответов по маршрутам."""
+
+    latencies: dict = field(default_factory=dict)
+    statuses: dict = field(default_factory=dict)
+
+    def add(self, route, status, seconds):
+        """Учитывает ответ; status None - ошибка соединения."""
+        self.latencies.setdefault(route, []).append(seconds)
+        self.statuses.setdefault(route, Counter())[
+            'error' if status is None else f'{status // 100}xx'] += 1
+
+    def merge(self, other):
+        """Добавляет результаты другого обработчика."""
+        for route, values in other.latencies.items():
+            self.latencies.setdefault(route, []).extend(values)
+        for route, counts in other.statuses.items():
+            self.statuses.setdefault(route, Counter()).update(counts)
+
+    def summary(self, duration):
+        """Сводка по маршрутам: запросы, запросы/с, коды, перцентили в мс."""
+        rows = {}
+        for route, values in sorted(self.latencies.items()):
+            values = sorted(values)
+            rows[route] = {
+                'requests': len(values),
+                'rps': len(values) / duration,
+                'statuses': dict(self.statuses[route]),
+                **{
+                    f'p{round(share * 100)}': percentile(values, share) * 1000
+                    for share in PERCENTILES
+                },
+            }
+        return rows
+
+
+def percentile(values, share):
+    """Перцентиль отсортированного списка по ближайшему рангу."""
+    return values[max(math.ceil(share * len(values)) - 1, 0)]
+
+
+class Replayer:
+    """Выбирает следующий запрос сценария для одного обработчика."""
+
+    def __init__(self, routes, pools, tokens, seed):
+        """Создает генератор запросов с собственным random."""
+        self.routes = routes
+        self.weights = [route.weight for route in routes]
+        self.pools = pools
+        self.tokens = tokens
+        self.rng = random.Random(seed)
+        self.enabled = set()
+
+    def next_request(self):
+        """Возвращает (маршрут, метод, путь, токен, тело)."""
+        route = self.rng.choices(self.routes, self.weights)[0]
+        path = route.path.format(**{
+            name: self.rng.choice(self.pools[name]) for name in route.fields
+        })
+        token = self.rng.choice(self.tokens) if route.auth else None
+        method = route.method
+        if route.toggle:
+            key = (token, path)
+            if key in self.enabled:
+                self.enabled.discard(key)
+                method = 'DELETE'
+            else:
+                self.enabled.add(key)
+        return route.name, method, path, token, route.body
+
+
+def run_worker(transport, replayer, duration):
+    """Выполняет запросы сценария в течение duration секунд."""
+    stats = Stats()
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        name, method, path, token, body = replayer.next_request()
+        started = time.perf_counter()
+        status = transport.request(method, path, token, body)
+        stats.add(name, status, time.perf_counter() - started)
+    transport.close()
+    return stats
+
+
+async def run_worker_async(transport, replayer, duration):
+    """Асинхронный вариант run_worker."""
+    stats = Stats()
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        name, method, path, token, body = replayer.next_request()
+        started = time.perf_counter()
+        status = await transport.request(method, path, token, body)
+        stats.add(name, status, time.perf_counter() - started)
+    await transport.close()
+    return stats
+
+
+def auth_headers(token):
+    """Заголовки запроса с токеном."""
+    return {'Authorization': f'Token {token}'} if token else {}
+
+
+class HttpTransport:
+    """Запросы к запущенному серверу через requests."""
+
+    def __init__(self, base_url):
+        """Открывает сессию с постоянными соединениями."""
+        self.base_url = base_url.rstrip('/')
+        self.session = requests.Session()
+
+    def request(self, method, path, token, body):
+        """Выполняет запрос и читает ответ; возвращает код или None."""
+        try:
+            response = self.session.request(
+                method, self.base_url + path, json=body,
+                headers=auth_headers(token))
+        except requests.RequestException:
+            return None
+        return response.status_code
+
+    def close(self):
+        """Закрывает сессию."""
+        self.session.close()
+
+
+class TestClientTransport:
+    """Запросы через тестовый клиент Django, без сети и сервера."""
+
+    def __init__(self, host):
+        """Создает клиент; host должен входить в ALLOWED_HOSTS."""
+        self.client = Client(HTTP_HOST=host, raise_request_exception=False)
+
+    def request(self, method, path, token, body):
+        """Выполняет запрос и читает потоковый ответ целиком."""
+        response = self.client.generic(
+            method, path,
+            data=json.dumps(body) if body is not None else '',
+            content_type='application/json',
+            headers=auth_headers(token),
+        )
+        if response.streaming:
+            b''.join(response.streaming_content)
+        response.close()
+        return response.status_code
+
+    def close(self):
+        """Тестовому клиенту закрывать нечего."""
+
+
+class AsyncHttpTransport:
+    """Асинхронные запросы к запущенному серверу через httpx."""
+
+    def __init__(self, base_url):
+        """Создает клиент с пулом соединений."""
+        self.client = httpx.AsyncClient(base_url=base_url, timeout=30)
+
+    async def request(self, method, path, token, body):
+        """Выполняет запрос; возвращает код или None."""
+        try:
+            response = await self.client.request(
+                method, path, json=body, headers=auth_headers(token))
+        except httpx.HTTPError:
+            return None
+        return response.status_code
+
+    async def close(self):
+        """Закрывает клиент."""
+        await self.client.aclose()
+
+
+class HostAsyncClient(AsyncClient):
+    """Асинхронный тестовый клиент с заданным заголовком Host.
+
+    AsyncRequestFactory.generic всегда ставит Host: testserver, а
+    заголовки и параметры клиента его не заменяют, поэтому заголовок
+    подменяется в scope каждого запроса.
+    """
+
+    def __init__(self, host, **defaults):
+        """Создает клиент для хоста host."""
+        super().__init__(**defaults)
+        self.host = host.encode('latin1')
+
+    async def request(self, **request):
+        """Выполняет запрос с заголовком Host клиента."""
+        request['headers'] = [
+            (name, self.host if name == b'host' else value)
+            for name, value in request.get('headers', ())
+        ]
+        return await super().request(**request)
+
+
+class AsyncTestClientTransport:
+    """Запросы через асинхронный тестовый клиент Django (ASGI)."""
+
+    def __init__(self, host):
+        """Создает клиент; host должен входить в ALLOWED_HOSTS."""
+        self.client = HostAsyncClient(host, raise_request_exception=False)
+
+    async def request(self, method, path, token, body):
+        """Выполняет запрос и читает потоковый ответ целиком."""
+        response = await self.client.generic(
+            method, path,
+            data=json.dumps(body) if body is not None else '',
+            content_type='application/json',
+            headers=auth_headers(token),
+        )
+        if response.streaming and response.is_async:
+            async for _ in response.streaming_content:
+                pass
+        elif response.streaming:
+            b''.join(response.streaming_content)
+        return response.status_code
+
+    async def close(self):
+        """Тестовому клиенту закрывать нечего."""
+
+
+async def run_async(make_transport, replayers, duration):
+    """Запускает обработчики как корутины в одном цикле событий."""
+    return await asyncio.gather(*(
+        run_worker_async(make_transport(), replayer, duration)
+        for replayer in replayers
+    ))
@@ -0,0 +1,80 @@
+"""Тестовые данные для служебных команд (проверки планов, бенчмарки)."""
+
+from datetime import timedelta
+
+from django.utils import timezone
+
+from recipes.models import (
+    Favorite,
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    ShoppingCart,
+    Subscription,
+    Tag,
+    User,
+)
+
+
+def seed_dataset(size, prefix='plan'):
+    """Создает тестовый набор данных из size рецептов.
+
+    Возвращает созданных пользователей и рецепты. Команды вызывают
+    функцию внутри транзакции, которая затем откатывается.
+    """
+    users = User.objects.bulk_create(
+        User(
+            email=f'{prefix}{index}@example.com',
+            username=f'{prefix}_user_{index}',
+            first_name='Plan',
+            last_name=f'User{index}',
+        )
+        for index in range(max(size // 10, 2))
+    )
+    tags = Tag.objects.bulk_create(
+        Tag(name=f'{prefix}-tag-{index}', slug=f'{prefix}-tag-{index}')
+        for index in range(8)
+    )
+    ingredients = Ingredient.objects.bulk_create(
+        Ingredient(name=f'сахар {prefix} {index}', measurement_unit='г')
+        for index in range(size)
+    )
+    now = timezone.now()
+    recipes = Recipe.objects.bulk_create(
+        Recipe(
+            author=users[index % len(users)],
+            name=f'Рецепт {index}',
+            image=f'recipes/{prefix}.png',
+            text='Тестовый рецепт',
+            cooking_time=10,
+            short_link=f'{prefix[0]}{index:05x}',
+        )
+        for index in range(size)
+    )
+    for index, recipe in enumerate(recipes):
+        recipe.pub_date = now - timedelta(minutes=index)
+    Recipe.objects.bulk_update(recipes, ('pub_date',))
+    Recipe.tags.through.objects.bulk_create(
+        Recipe.tags.through(
+            recipe=recipe, tag=tags[index % len(tags)])
+        for index, recipe in enumerate(recipes)
+    )
+    RecipeIngredient.objects.bulk_create(
+        RecipeIngredient(
+            recipe=recipe,
+            ingredient=ingredients[(index + offset) % len(ingredients)],
+            amount=offset + 1,
+        )
+        for index, recipe in enumerate(recipes)
+        for offset in range(5)
+    )
+    for model in (Favorite, ShoppingCart):
+        model.objects.bulk_create(
+            model(user=user, recipe=recipes[(index * 7) % len(recipes)])
+            for index, user in enumerate(users)
+        )
+    Subscription.objects.bulk_create(
+        Subscription(user=user, author=users[(index + 1) % len(users)])
+        for index, user in enumerate(users)
+    )
+    return users, recipes
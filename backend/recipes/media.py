@@ -0,0 +1,41 @@
+"""Поиск и удаление медиафайлов, на которые нет ссылок."""
+
+import os
+import time
+
+from django.core.files.storage import default_storage
+
+from .models import Recipe, User
+
+MEDIA_FIELDS = ((Recipe, 'image'), (User, 'avatar'))
+
+
+def referenced(names):
+    """Имена из списка, на которые ссылаются рецепты или пользователи."""
+    found = set()
+    for model, field in MEDIA_FIELDS:
+        found.update(model.objects.filter(
+            **{f'{field}__in': names}).values_list(field, flat=True))
+    return found
+
+
+def delete_orphaned(names, grace_seconds):
+    """Удаляет файлы без ссылок, не изменявшиеся grace_seconds секунд.
+
+    Возвращает список удаленных имен.
+    """
+    names = [name for name in names if name]
+    used = referenced(names)
+    deadline = time.time() - grace_seconds
+    deleted = []
+    for name in names:
+        if name in used:
+            continue
+        try:
+            if os.path.getmtime(default_storage.path(name)) > deadline:
+                continue
+        except OSError:
+            continue
+        default_storage.delete(name)
+        deleted.append(name)
+    return deleted
@@ -3,8 +3,10 @@
 from django.contrib.auth.models import AbstractUser
 from django.core.validators import MinValueValidator, RegexValidator
 from django.db import models
+from django.db.models.functions import Upper
 from django.core.exceptions import ValidationError
 
+from .indexes import PrefixSearchIndex
 from .services import generate_hash
 from api.constants import (
     TAG,
@@ -21,7 +23,9 @@ from api.constants import (
     URL_ORIG,
     STRING_TAG,
     MIN_VALUE,
-    USERNAME_REGEX
+    USERNAME_REGEX,
+    CHANGE_KIND,
+    CATALOG_SOURCE,
 )
 
 
@@ -74,6 +78,11 @@ class User(AbstractUser):
         default=False,
         verbose_name='Подписка',
     )
+    shopping_cart_version = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Версия корзины покупок',
+    )
 
     class Meta:
         """Мета-класс для модели User."""
@@ -138,6 +147,12 @@ class Ingredient(models.Model):
                 name='unique_ingredient'
             ),
         )
+        indexes = (
+            PrefixSearchIndex(
+                Upper('name'),
+                name='ingredient_name_prefix_idx'
+            ),
+        )
 
     def __str__(self):
         """Возвращает строковое представление ингредиента."""
@@ -185,6 +200,11 @@ class Recipe(models.Model):
         blank=True,
         verbose_name='Короткая ссылка'
     )
+    document_version = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Версия документа рецепта',
+    )
 
     class Meta:
         """Мета-класс для модели Recipe."""
@@ -192,6 +212,16 @@ class Recipe(models.Model):
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
         ordering = ('-pub_date',)
+        indexes = (
+            models.Index(
+                fields=('-pub_date',),
+                name='recipe_pub_date_idx'
+            ),
+            models.Index(
+                fields=('author', '-pub_date'),
+                name='recipe_author_pub_date_idx'
+            ),
+        )
 
     def save(self, *args, **kwargs):
         """Сохраняет рецепт, генерируя короткую ссылку при необходимости."""
@@ -204,6 +234,32 @@ class Recipe(models.Model):
         return self.name[:STRING_STR]
 
 
+class RecipeDocument(models.Model):
+    """Готовый JSON рецепта без полей, зависящих от пользователя."""
+
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='document',
+        verbose_name='Рецепт'
+    )
+    version = models.PositiveIntegerField(
+        verbose_name='Версия рецепта'
+    )
+    content = models.TextField(verbose_name='Документ')
+
+    class Meta:
+        """Мета-класс для модели RecipeDocument."""
+
+        verbose_name = 'Документ рецепта'
+        verbose_name_plural = 'Документы рецептов'
+
+    def __str__(self):
+        """Возвращает строковое представление документа рецепта."""
+        return f'{self.recipe_id} v{self.version}'
+
+
 class RecipeIngredient(models.Model):
     """Модель для связи рецептов и ингредиентов с указанием количества."""
 
@@ -236,12 +292,107 @@ class RecipeIngredient(models.Model):
                 name='unique_recipe_ingredient'
             ),
         )
+        indexes = (
+            models.Index(
+                fields=('recipe', 'ingredient', 'amount'),
+                name='recipeingredient_read_idx'
+            ),
+        )
 
     def __str__(self):
         """Возвращает строковое представление связи рецепта и ингредиента."""
         return f'{self.recipe}: {self.ingredient} - {self.amount}'
 
 
+class RecipeChange(models.Model):
+    """Запись журнала изменений рецептов, избранного, корзины и подписок.
+
+    id записи служит курсором синхронизации. Для изменений самого
+    рецепта user_id пуст, для избранного, корзины и подписок - id
+    владельца. object_id - id рецепта, а для подписок - id автора.
+    Объект и пользователь хранятся числами, а не ссылками: запись
+    удаления должна пережить удаление рецепта.
+    """
+
+    RECIPE = 'recipe'
+    FAVORITE = 'favorite'
+    SHOPPING_CART = 'shopping_cart'
+    SUBSCRIPTION = 'subscription'
+    KINDS = (
+        (RECIPE, 'Рецепт'),
+        (FAVORITE, 'Избранное'),
+        (SHOPPING_CART, 'Корзина покупок'),
+        (SUBSCRIPTION, 'Подписка'),
+    )
+
+    kind = models.CharField(
+        max_length=CHANGE_KIND,
+        choices=KINDS,
+        verbose_name='Что изменилось'
+    )
+    object_id = models.PositiveBigIntegerField(
+        verbose_name='Рецепт или автор'
+    )
+    user_id = models.PositiveBigIntegerField(
+        null=True,
+        blank=True,
+        verbose_name='Пользователь'
+    )
+    deleted = models.BooleanField(default=False, verbose_name='Удаление')
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        db_index=True,
+        verbose_name='Время изменения'
+    )
+
+    class Meta:
+        """Мета-класс для модели RecipeChange."""
+
+        verbose_name = 'Изменение рецептов'
+        verbose_name_plural = 'Журнал изменений рецептов'
+        ordering = ('id',)
+        indexes = (
+            models.Index(
+                fields=('user_id', 'id'),
+                name='recipechange_user_idx'
+            ),
+        )
+
+    def __str__(self):
+        """Возвращает строковое представление изменения."""
+        action = 'удален' if self.deleted else 'изменен'
+        return f'#{self.pk}: {self.kind} {self.object_id} {action}'
+
+
+class RecipeChangePrune(models.Model):
+    """Очистка журнала изменений.
+
+    last_id - id последней удаленной записи: клиент с курсором меньше
+    него пропустил удаленные изменения и должен загрузить список
+    заново, даже если журнал после очистки пуст.
+    """
+
+    last_id = models.PositiveBigIntegerField(
+        verbose_name='Удалено до записи'
+    )
+    deleted = models.PositiveIntegerField(verbose_name='Удалено записей')
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Время очистки'
+    )
+
+    class Meta:
+        """Мета-класс для модели RecipeChangePrune."""
+
+        verbose_name = 'Очистка журнала изменений'
+        verbose_name_plural = 'Очистки журнала изменений'
+        ordering = ('-last_id',)
+
+    def __str__(self):
+        """Возвращает строковое представление очистки."""
+        return f'до #{self.last_id} ({self.deleted})'
+
+
 class BaseUserRecipeRelation(models.Model):
     """Абстрактная модель для связи пользователя и рецепта."""
 
@@ -321,6 +472,12 @@ class Subscription(models.Model):
                 name='unique_subscription'
             ),
         )
+        indexes = (
+            models.Index(
+                fields=('author', 'user'),
+                name='subscription_author_user_idx'
+            ),
+        )
 
     def clean(self):
         """Метод с валидацией подписки."""
@@ -358,3 +515,49 @@ class LinkMapped(models.Model):
     def __str__(self):
         """Возвращает строковое представление сокращенной ссылки."""
         return f'{self.url_hash} -> {self.original_url}'
+
+
+class CatalogImport(models.Model):
+    """Контрольная точка загрузки каталога рецептов из файла NDJSON.
+
+    Смещение сохраняется в одной транзакции с пакетом рецептов, поэтому
+    прерванная загрузка продолжается с первого незагруженного рецепта.
+    """
+
+    source = models.CharField(
+        max_length=CATALOG_SOURCE,
+        unique=True,
+        verbose_name='Файл'
+    )
+    size = models.PositiveBigIntegerField(verbose_name='Размер файла')
+    offset = models.PositiveBigIntegerField(
+        default=0,
+        verbose_name='Загружено байт'
+    )
+    line = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Прочитано строк'
+    )
+    imported = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Загружено рецептов'
+    )
+    skipped = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Пропущено рецептов'
+    )
+    finished = models.BooleanField(default=False, verbose_name='Завершена')
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Обновлена'
+    )
+
+    class Meta:
+        """Мета-класс для модели CatalogImport."""
+
+        verbose_name = 'Загрузка каталога'
+        verbose_name_plural = 'Загрузки каталога'
+
+    def __str__(self):
+        """Возвращает строковое представление загрузки."""
+        return f'{self.source}: {self.offset}/{self.size}'
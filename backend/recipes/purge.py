@@ -0,0 +1,138 @@
+"""Быстрое удаление пользователей и рецептов.
+
+Model.delete() загружает в память все каскадно удаляемые объекты. Здесь
+данные удаляются снизу вверх пакетами: каждый пакет - несколько
+DELETE ... WHERE id IN (...) в отдельной короткой транзакции. У
+зависимых моделей нет своих каскадов и сигналов, и Django удаляет их
+одним запросом, не загружая строки. Удаление автора с тысячами
+рецептов не держит долгих блокировок, а прерванное удаление можно
+безопасно запустить повторно.
+"""
+
+from collections import Counter
+
+from django.db import transaction
+from rest_framework.authtoken.models import Token
+
+from api.constants import PURGE_BATCH_SIZE
+from monitoring.models import ProfileReport
+from .changes import record_recipe_changes, record_relation_changes
+from .models import (
+    Favorite,
+    LinkMapped,
+    Recipe,
+    RecipeDocument,
+    RecipeIngredient,
+    ShoppingCart,
+    Subscription,
+)
+from .shopping_list import bump_cart_version_for_recipes
+from .tasks import delete_orphaned_media, purge_user_task
+
+
+def delete_in_batches(queryset, batch_size=PURGE_BATCH_SIZE):
+    """Удаляет строки queryset пакетами; возвращает их количество."""
+    model = queryset.model
+    total = 0
+    while True:
+        with transaction.atomic():
+            ids = list(queryset.values_list('pk', flat=True)[:batch_size])
+            if not ids:
+                return total
+            total += model.objects.filter(pk__in=ids).delete()[0]
+
+
+def delete_subscribers_in_batches(author, batch_size=PURGE_BATCH_SIZE):
+    """Удаляет подписки на автора пакетами; возвращает их количество."""
+    total = 0
+    while True:
+        with transaction.atomic():
+            rows = list(Subscription.objects.filter(
+                author=author).values_list('pk', 'user_id')[:batch_size])
+            if not rows:
+                return total
+            total += Subscription.objects.filter(
+                pk__in=[pk for pk, _ in rows]).delete()[0]
+            record_relation_changes(
+                Subscription,
+                [(user_id, author.pk) for _, user_id in rows],
+                deleted=True)
+
+
+def purge_recipe_batch(ids):
+    """Удаляет пакет рецептов со всеми связанными строками."""
+    counts = Counter()
+    with transaction.atomic():
+        rows = list(Recipe.objects.filter(pk__in=ids).values_list(
+            'pk', 'image', 'short_link'))
+        ids = [pk for pk, _, _ in rows]
+        if not ids:
+            return counts
+        bump_cart_version_for_recipes(ids)
+        for model in (Favorite, ShoppingCart):
+            lists = model.objects.filter(recipe_id__in=ids)
+            removed = list(lists.values_list('user_id', 'recipe_id'))
+            counts.update(lists.delete()[1])
+            record_relation_changes(model, removed, deleted=True)
+        for model in (RecipeIngredient, Recipe.tags.through,
+                      RecipeDocument):
+            counts.update(model.objects.filter(
+                recipe_id__in=ids).delete()[1])
+        counts.update(LinkMapped.objects.filter(
+            url_hash__in=[link for _, _, link in rows if link]
+        ).delete()[1])
+        counts.update(Recipe.objects.filter(pk__in=ids).delete()[1])
+        record_recipe_changes(ids, deleted=True)
+        images = [image for _, image, _ in rows if image]
+        if images:
+            delete_orphaned_media.delay(names=images)
+    return counts
+
+
+def purge_recipes(queryset, batch_size=PURGE_BATCH_SIZE):
+    """Удаляет рецепты из queryset пакетами; возвращает счетчики."""
+    counts = Counter()
+    while True:
+        ids = list(queryset.values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            return counts
+        counts += purge_recipe_batch(ids)
+
+
+def purge_user(user, batch_size=PURGE_BATCH_SIZE):
+    """Удаляет пользователя, его рецепты, подписки и списки.
+
+    Сначала пользователь деактивируется и теряет токен, чтобы не мог
+    ничего изменить во время удаления.
+    """
+    type(user).objects.filter(pk=user.pk).update(is_active=False)
+    Token.objects.filter(user=user).delete()
+
+    counts = purge_recipes(user.recipes.all(), batch_size)
+    for queryset in (
+        Favorite.objects.filter(user=user),
+        ShoppingCart.objects.filter(user=user),
+        Subscription.objects.filter(user=user),
+    ):
+        counts[queryset.model._meta.label] += delete_in_batches(
+            queryset, batch_size)
+    # Подписчики удаляемого автора узнают об отписке из журнала.
+    counts[Subscription._meta.label] += delete_subscribers_in_batches(
+        user, batch_size)
+    ProfileReport.objects.filter(user=user).update(user=None)
+
+    with transaction.atomic():
+        avatar = type(user).objects.filter(pk=user.pk).values_list(
+            'avatar', flat=True).first()
+        counts.update(type(user).objects.filter(pk=user.pk).delete()[1])
+        if avatar:
+            delete_orphaned_media.delay(names=[avatar])
+    return counts
+
+
+def purge_user_later(user):
+    """Деактивирует пользователя и ставит его удаление в очередь."""
+    with transaction.atomic():
+        type(user).objects.filter(pk=user.pk).update(is_active=False)
+        Token.objects.filter(user=user).delete()
+        purge_user_task.delay(user_id=user.pk)
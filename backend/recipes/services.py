@@ -1,5 +1,6 @@
-"""Генератор случайной строки для коротких ссылок."""
+"""Вспомогательные функции приложения recipes."""
 
+import hashlib
 import string
 from random import choice, randint
 
@@ -9,3 +10,15 @@ def generate_hash() -> str:
     return ''.join(
         choice(string.ascii_letters + string.digits)
         for _ in range(randint(15, 32)))
+
+
+def file_hash(file, chunk_size=64 * 1024) -> str:
+    """Возвращает sha256 содержимого файла, не сдвигая позицию чтения."""
+    digest = hashlib.sha256()
+    position = file.tell() if hasattr(file, 'tell') else None
+    file.seek(0)
+    for chunk in iter(lambda: file.read(chunk_size), b''):
+        digest.update(chunk)
+    if position is not None:
+        file.seek(position)
+    return digest.hexdigest()
@@ -0,0 +1,76 @@
+"""Список покупок: сборка, кеширование и версия корзины.
+
+Готовый файл кешируется по ключу (пользователь, версия корзины,
+формат). Версия хранится в User.shopping_cart_version и увеличивается
+при любом изменении корзины и при изменении ингредиентов рецептов,
+лежащих в корзине, поэтому устаревшая запись в кеше просто перестает
+запрашиваться.
+"""
+
+from dataclasses import dataclass
+from typing import Callable
+
+from django.core.cache import cache
+from django.db.models import F, Sum
+
+from .models import RecipeIngredient, User
+
+CACHE_TIMEOUT = 24 * 60 * 60
+
+
+@dataclass(frozen=True)
+class ShoppingListFormat:
+    """Формат файла списка покупок."""
+
+    content_type: str
+    filename: str
+    render: Callable
+
+
+def render_text(ingredients):
+    """Список покупок в виде текста: строка на ингредиент."""
+    return '\n'.join(
+        f'{item["ingredient__name"]} '
+        f'({item["ingredient__measurement_unit"]}) - '
+        f'{item["total_amount"]}'
+        for item in ingredients
+    ).encode()
+
+
+FORMATS = {
+    'txt': ShoppingListFormat(
+        'text/plain', 'shopping_list.txt', render_text),
+}
+
+
+def bump_cart_version(user_ids):
+    """Увеличивает версию корзины пользователей."""
+    User.objects.filter(pk__in=user_ids).update(
+        shopping_cart_version=F('shopping_cart_version') + 1)
+
+
+def bump_cart_version_for_recipes(recipe_ids):
+    """Увеличивает версию корзин, в которых лежат рецепты."""
+    bump_cart_version(User.objects.filter(
+        shoppingcart__recipe__in=recipe_ids).values('pk'))
+
+
+def get_etag(user, format_name):
+    """ETag списка покупок для текущей версии корзины."""
+    return f'"{user.pk}-{user.shopping_cart_version}-{format_name}"'
+
+
+def get_shopping_list(user, format_name):
+    """Возвращает файл списка покупок, по возможности из кеша."""
+    key = f'shopping_list:{user.pk}:{user.shopping_cart_version}:{format_name}'
+    content = cache.get(key)
+    if content is None:
+        ingredients = RecipeIngredient.objects.filter(
+            recipe__shoppingcart__user=user
+        ).values(
+            'ingredient__name',
+            'ingredient__measurement_unit'
+        ).annotate(total_amount=Sum('amount')).order_by('ingredient__name')
+        content = FORMATS[format_name].render(ingredients)
+        cache.set(key, content, CACHE_TIMEOUT)
+    return content
@@ -0,0 +1,39 @@
+"""Хранилище медиафайлов с именами по содержимому."""
+
+import os
+import posixpath
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+
+from .services import file_hash
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """Файловое хранилище, называющее файлы по sha256 содержимого.
+
+    Файл сохраняется как <каталог upload_to>/<2 символа хеша>/<хеш>.<ext>.
+    Одинаковые загрузки указывают на один файл, а новое содержимое
+    всегда получает новый URL, поэтому медиа можно кешировать навсегда.
+    При повторной загрузке у файла обновляется время изменения, чтобы
+    сборщик мусора (collect_media_garbage) не удалил его до сохранения
+    ссылки в базе.
+    """
+
+    def save(self, name, content, max_length=None):
+        """Сохраняет файл под именем по хешу, если такого еще нет."""
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        directory, basename = posixpath.split(name.replace('\\', '/'))
+        extension = posixpath.splitext(basename)[1].lower()
+        digest = file_hash(content)
+        name = posixpath.join(directory, digest[:2], f'{digest}{extension}')
+        if self.exists(name):
+            try:
+                os.utime(self.path(name))
+            except OSError:
+                pass
+            return name
+        return super().save(name, content, max_length=max_length)
@@ -0,0 +1,23 @@
+"""Фоновые задачи приложения recipes."""
+
+from django.conf import settings
+
+from jobs.queue import task
+from .media import delete_orphaned
+from .models import User
+
+
+@task()
+def delete_orphaned_media(names):
+    """Удаляет замененные изображения, если на них больше нет ссылок."""
+    delete_orphaned(names, settings.MEDIA_CLEANUP_DELAY)
+
+
+@task()
+def purge_user_task(user_id):
+    """Удаляет пользователя со всеми данными пакетами."""
+    from .purge import purge_user
+
+    user = User.objects.filter(pk=user_id).first()
+    if user is not None:
+        purge_user(user)
@@ -0,0 +1,13 @@
+"""Шаги прогрева приложения recipes (см. foodgram.warmup)."""
+
+from .models import Ingredient, Tag
+
+
+def load_reference_data():
+    """Читает теги и каталог ингредиентов целиком.
+
+    Справочники читаются при каждом фильтре и автодополнении; чтение
+    заранее поднимает их в кеш базы и заполняет кеши метаданных ORM.
+    """
+    list(Tag.objects.values_list('pk', 'name', 'slug'))
+    list(Ingredient.objects.values_list('pk', 'name', 'measurement_unit'))
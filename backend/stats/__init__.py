@@ -0,0 +1 @@
+"""Пакет stats содержит сводную статистику для администраторов."""
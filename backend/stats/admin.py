@@ -0,0 +1,59 @@
+"""Административная панель со сводной статистикой."""
+
+from django.contrib import admin
+from django.template.response import TemplateResponse
+
+from api.constants import STATS_DAYS, STATS_TOP
+from .models import (
+    AuthorFollowers,
+    CartDay,
+    IngredientUsage,
+    RecipeFavorites,
+    TagUsage,
+    Watermark,
+)
+
+
+@admin.register(Watermark)
+class StatsDashboardAdmin(admin.ModelAdmin):
+    """Страница статистики вместо списка отметок сводок.
+
+    Страница читает только сводные таблицы: первые строки по индексам
+    счетчиков и названия объектов по первичным ключам. Сводки
+    обновляет команда refresh_stats.
+    """
+
+    def has_add_permission(self, request):
+        """Отметки создаются только командой refresh_stats."""
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        """Отметки нельзя редактировать."""
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        """Отметки нельзя удалять."""
+        return False
+
+    def changelist_view(self, request, extra_context=None):
+        """Показывает сводки и время их обновления."""
+        if not self.has_view_permission(request):
+            return super().changelist_view(request, extra_context)
+        context = {
+            **self.admin_site.each_context(request),
+            'title': 'Статистика',
+            'opts': self.model._meta,
+            'watermarks': Watermark.objects.all(),
+            'ingredients': IngredientUsage.objects.select_related(
+                'ingredient').order_by('-recipes')[:STATS_TOP],
+            'tags': TagUsage.objects.select_related(
+                'tag').order_by('-recipes')[:STATS_TOP],
+            'recipes': RecipeFavorites.objects.select_related(
+                'recipe').order_by('-favorites')[:STATS_TOP],
+            'authors': AuthorFollowers.objects.select_related(
+                'author').order_by('-followers')[:STATS_TOP],
+            'cart_days': CartDay.objects.all()[:STATS_DAYS],
+            **(extra_context or {}),
+        }
+        return TemplateResponse(
+            request, 'admin/stats/dashboard.html', context)
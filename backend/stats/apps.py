@@ -0,0 +1,10 @@
+"""Конфигурация приложения stats."""
+
+from django.apps import AppConfig
+
+
+class StatsConfig(AppConfig):
+    """Конфигурация приложения stats."""
+
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'stats'
@@ -0,0 +1 @@
+"""Пакет с командами приложения stats."""
@@ -0,0 +1,48 @@
+"""Модуль для обновления сводной статистики."""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.constants import STATS_BATCH_SIZE
+from stats.summaries import SUMMARIES, refresh
+
+
+class Command(BaseCommand):
+    """Команда для инкрементального обновления сводных таблиц.
+
+    Запускается по расписанию чаще, чем prune_recipe_changes чистит
+    журнал изменений, иначе сводки придется пересчитывать целиком.
+    """
+
+    help = 'Refresh admin statistics summaries from the recipe change log'
+
+    def add_arguments(self, parser):
+        """Добавляет параметры команды."""
+        parser.add_argument(
+            'summaries',
+            nargs='*',
+            help=f'Сводки для обновления: {", ".join(SUMMARIES)} '
+                 '(по умолчанию все)',
+        )
+        parser.add_argument(
+            '--rebuild',
+            action='store_true',
+            help='Пересчитать сводки целиком по исходным таблицам',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=STATS_BATCH_SIZE,
+            help='Записей журнала в одной транзакции',
+        )
+
+    def handle(self, *args, **options):
+        """Обновляет сводки и выводит, сколько записей обработано."""
+        unknown = set(options['summaries']) - set(SUMMARIES)
+        if unknown:
+            raise CommandError(f'Неизвестные сводки: {", ".join(unknown)}')
+        for name in options['summaries'] or SUMMARIES:
+            rebuilt, processed = refresh(
+                SUMMARIES[name], options['batch_size'], options['rebuild'])
+            self.stdout.write(self.style.SUCCESS(
+                f'{name}: пересчитана целиком' if rebuilt
+                else f'{name}: обработано записей журнала: {processed}'))
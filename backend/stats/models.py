@@ -0,0 +1,186 @@
+"""Модели приложения stats.
+
+Сводные таблицы хранят готовые счетчики, а Watermark - место журнала
+изменений, до которого каждая сводка уже обработана.
+"""
+
+from django.conf import settings
+from django.db import models
+
+from api.constants import STATS_NAME
+from recipes.models import Ingredient, Recipe, Tag
+
+
+class Watermark(models.Model):
+    """Отметка обработки журнала изменений для одной сводки."""
+
+    name = models.CharField(
+        max_length=STATS_NAME,
+        primary_key=True,
+        verbose_name='Сводка'
+    )
+    position = models.PositiveBigIntegerField(
+        default=0,
+        verbose_name='Обработано до записи журнала'
+    )
+    rebuilt_at = models.DateTimeField(
+        null=True,
+        verbose_name='Пересчитана целиком'
+    )
+    refreshed_at = models.DateTimeField(
+        null=True,
+        verbose_name='Обновлена'
+    )
+
+    class Meta:
+        """Мета-класс для модели Watermark."""
+
+        verbose_name = 'Статистика'
+        verbose_name_plural = 'Статистика'
+        ordering = ('name',)
+
+    def __str__(self):
+        """Возвращает строковое представление отметки."""
+        return f'{self.name}: {self.position}'
+
+
+class RecipeComposition(models.Model):
+    """Учтенный в сводках состав рецепта.
+
+    По разнице с текущим составом сводки ингредиентов и тегов получают
+    изменения счетчиков. recipe_id - число, а не ссылка: состав нужен и
+    после удаления рецепта. null - рецепт еще не учтен в сводке.
+    """
+
+    recipe_id = models.PositiveBigIntegerField(
+        primary_key=True,
+        verbose_name='Рецепт'
+    )
+    ingredients = models.JSONField(
+        null=True,
+        verbose_name='Ингредиенты'
+    )
+    tags = models.JSONField(
+        null=True,
+        verbose_name='Теги'
+    )
+
+    class Meta:
+        """Мета-класс для модели RecipeComposition."""
+
+        verbose_name = 'Состав рецепта в статистике'
+        verbose_name_plural = 'Составы рецептов в статистике'
+
+
+class IngredientUsage(models.Model):
+    """Число рецептов с ингредиентом."""
+
+    ingredient = models.OneToOneField(
+        Ingredient,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='usage',
+        verbose_name='Ингредиент'
+    )
+    recipes = models.PositiveIntegerField(
+        db_index=True,
+        verbose_name='Рецептов'
+    )
+
+    class Meta:
+        """Мета-класс для модели IngredientUsage."""
+
+        verbose_name = 'Использование ингредиента'
+        verbose_name_plural = 'Использование ингредиентов'
+
+
+class TagUsage(models.Model):
+    """Число рецептов с тегом."""
+
+    tag = models.OneToOneField(
+        Tag,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='usage',
+        verbose_name='Тег'
+    )
+    recipes = models.PositiveIntegerField(
+        db_index=True,
+        verbose_name='Рецептов'
+    )
+
+    class Meta:
+        """Мета-класс для модели TagUsage."""
+
+        verbose_name = 'Популярность тега'
+        verbose_name_plural = 'Популярность тегов'
+
+
+class RecipeFavorites(models.Model):
+    """Число пользователей, добавивших рецепт в избранное."""
+
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='favorites_summary',
+        verbose_name='Рецепт'
+    )
+    favorites = models.PositiveIntegerField(
+        db_index=True,
+        verbose_name='В избранном'
+    )
+
+    class Meta:
+        """Мета-класс для модели RecipeFavorites."""
+
+        verbose_name = 'Популярность рецепта'
+        verbose_name_plural = 'Популярность рецептов'
+
+
+class AuthorFollowers(models.Model):
+    """Число подписчиков автора."""
+
+    author = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='followers_summary',
+        verbose_name='Автор'
+    )
+    followers = models.PositiveIntegerField(
+        db_index=True,
+        verbose_name='Подписчиков'
+    )
+
+    class Meta:
+        """Мета-класс для модели AuthorFollowers."""
+
+        verbose_name = 'Подписчики автора'
+        verbose_name_plural = 'Подписчики авторов'
+
+
+class CartDay(models.Model):
+    """Добавления в корзину за день.
+
+    Считается по журналу изменений, поэтому дни старше его хранения
+    больше не пересчитываются и остаются в сводке как есть.
+    """
+
+    day = models.DateField(
+        primary_key=True,
+        verbose_name='День'
+    )
+    additions = models.PositiveIntegerField(
+        verbose_name='Добавлений'
+    )
+    users = models.PositiveIntegerField(
+        verbose_name='Пользователей'
+    )
+
+    class Meta:
+        """Мета-класс для модели CartDay."""
+
+        verbose_name = 'Корзины за день'
+        verbose_name_plural = 'Корзины по дням'
+        ordering = ('-day',)
@@ -0,0 +1,360 @@
+"""Инкрементальное обновление сводных таблиц статистики.
+
+Источник изменений - журнал RecipeChange (recipes.changes): сводка
+хранит в Watermark id последней обработанной записи и при обновлении
+читает только записи своих видов после него. Целиком по исходным
+таблицам сводка пересчитывается один раз - при первом запуске, по
+--rebuild или если нужные записи уже удалены prune_recipe_changes,
+поэтому обновлять статистику нужно чаще, чем чистится журнал.
+
+Повторная обработка записи ничего не портит: счетчики избранного и
+подписок пересчитываются для затронутых рецептов и авторов по индексу,
+счетчики ингредиентов и тегов меняются на разницу между учтенным
+составом рецепта (RecipeComposition) и текущим, а дни корзин
+пересчитываются по журналу. Поэтому полный пересчет не пропускает
+изменений, сделанных во время него, а отметка сдвигается с запасом.
+"""
+
+from collections import Counter
+from datetime import datetime
+
+from django.db import transaction
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from api.constants import STATS_BATCH_SIZE
+from recipes.changes import (
+    CHANGE_OBJECT_FIELDS,
+    latest_cursor,
+    pruned_through,
+)
+from recipes.models import (
+    Favorite,
+    Recipe,
+    RecipeChange,
+    RecipeIngredient,
+    Subscription,
+)
+from .models import (
+    AuthorFollowers,
+    CartDay,
+    IngredientUsage,
+    RecipeComposition,
+    RecipeFavorites,
+    TagUsage,
+    Watermark,
+)
+
+
+def save_counts(model, key, column, counts, batch_size=STATS_BATCH_SIZE):
+    """Записывает счетчики {id: значение}; нулевые строки удаляются."""
+    model.objects.filter(**{
+        f'{key}__in': [pk for pk, value in counts.items() if value <= 0]
+    }).delete()
+    model.objects.bulk_create(
+        [
+            model(**{f'{key}_id': pk, column: value})
+            for pk, value in counts.items() if value > 0
+        ],
+        batch_size=batch_size,
+        update_conflicts=True,
+        unique_fields=(key,),
+        update_fields=(column,),
+    )
+
+
+class Summary:
+    """Сводка, обновляемая по журналу изменений.
+
+    kinds - виды записей журнала, которые меняют сводку.
+    """
+
+    name = None
+    kinds = ()
+
+    def rebuild(self, batch_size):
+        """Пересчитывает сводку целиком по исходным таблицам."""
+        raise NotImplementedError
+
+    def apply(self, rows):
+        """Учитывает записи журнала (id, object_id, deleted, created_at)."""
+        raise NotImplementedError
+
+
+class CompositionSummary(Summary):
+    """Число рецептов по ингредиентам или тегам.
+
+    field - поле RecipeComposition с учтенным составом, through -
+    таблица связи рецепта с объектами, key - ее поле объекта.
+    """
+
+    kinds = (RecipeChange.RECIPE,)
+    field = None
+    through = None
+    key = None
+    model = None
+
+    def current(self, recipe_ids):
+        """Текущий состав рецептов {id рецепта: [id объектов]}."""
+        composition = {}
+        for recipe_id, pk in self.through.objects.filter(
+            recipe_id__in=recipe_ids
+        ).order_by(f'{self.key}_id').values_list(
+            'recipe_id', f'{self.key}_id'
+        ):
+            composition.setdefault(recipe_id, []).append(pk)
+        return composition
+
+    def save_compositions(self, compositions, batch_size=STATS_BATCH_SIZE):
+        """Запоминает учтенный состав рецептов {id: [id] или None}."""
+        RecipeComposition.objects.bulk_create(
+            [
+                RecipeComposition(recipe_id=pk, **{self.field: items})
+                for pk, items in compositions.items()
+            ],
+            batch_size=batch_size,
+            update_conflicts=True,
+            unique_fields=('recipe_id',),
+            update_fields=(self.field,),
+        )
+        RecipeComposition.objects.filter(
+            recipe_id__in=compositions,
+            ingredients__isnull=True,
+            tags__isnull=True,
+        ).delete()
+
+    def rebuild(self, batch_size):
+        """Пересчитывает счетчики и учтенные составы всех рецептов."""
+        self.model.objects.all().delete()
+        RecipeComposition.objects.update(**{self.field: None})
+        RecipeComposition.objects.filter(
+            ingredients__isnull=True, tags__isnull=True).delete()
+        counts = Counter()
+        last_id = 0
+        while True:
+            recipe_ids = list(Recipe.objects.filter(pk__gt=last_id).order_by(
+                'pk').values_list('pk', flat=True)[:batch_size])
+            if not recipe_ids:
+                break
+            current = self.current(recipe_ids)
+            for items in current.values():
+                counts.update(items)
+            self.save_compositions(
+                {pk: current.get(pk, []) for pk in recipe_ids}, batch_size)
+            last_id = recipe_ids[-1]
+        save_counts(self.model, self.key, 'recipes', counts, batch_size)
+
+    def apply(self, rows):
+        """Меняет счетчики на разницу учтенного и текущего составов."""
+        recipe_ids = {object_id for _, object_id, _, _ in rows}
+        known = dict(RecipeComposition.objects.filter(
+            recipe_id__in=recipe_ids).values_list('recipe_id', self.field))
+        existing = set(Recipe.objects.filter(
+            pk__in=recipe_ids).values_list('pk', flat=True))
+        current = self.current(existing)
+        compositions = {}
+        delta = Counter()
+        for pk in recipe_ids:
+            items = current.get(pk, []) if pk in existing else None
+            delta.subtract(known.get(pk) or [])
+            delta.update(items or [])
+            compositions[pk] = items
+        self.save_compositions(compositions)
+        delta = {pk: value for pk, value in delta.items() if value}
+        counts = dict(self.model.objects.filter(**{
+            f'{self.key}__in': delta
+        }).values_list(f'{self.key}_id', 'recipes'))
+        save_counts(self.model, self.key, 'recipes', {
+            pk: counts.get(pk, 0) + value for pk, value in delta.items()
+        })
+
+
+class IngredientSummary(CompositionSummary):
+    """Самые используемые ингредиенты."""
+
+    name = 'ingredients'
+    field = 'ingredients'
+    through = RecipeIngredient
+    key = 'ingredient'
+    model = IngredientUsage
+
+
+class TagSummary(CompositionSummary):
+    """Популярность тегов."""
+
+    name = 'tags'
+    field = 'tags'
+    through = Recipe.tags.through
+    key = 'tag'
+    model = TagUsage
+
+
+class RelationSummary(Summary):
+    """Число строк source на рецепт или автора.
+
+    Для затронутых объектов счетчик пересчитывается по индексу
+    внешнего ключа source, поэтому записи можно обрабатывать повторно.
+    """
+
+    source = None
+    model = None
+    column = None
+
+    @property
+    def key(self):
+        """Поле source и сводки с id рецепта или автора."""
+        return CHANGE_OBJECT_FIELDS[self.source]
+
+    def count(self, queryset):
+        """Счетчики {id объекта: строк source} по queryset."""
+        return queryset.order_by().values(f'{self.key}_id').annotate(
+            total=Count('pk')).values_list(f'{self.key}_id', 'total')
+
+    def rebuild(self, batch_size):
+        """Пересчитывает счетчики всех объектов одним запросом."""
+        self.model.objects.all().delete()
+        save_counts(
+            self.model, self.key, self.column,
+            dict(self.count(self.source.objects.all())), batch_size)
+
+    def apply(self, rows):
+        """Пересчитывает счетчики объектов из записей журнала."""
+        object_ids = {object_id for _, object_id, _, _ in rows}
+        counts = dict.fromkeys(object_ids, 0)
+        counts.update(self.count(self.source.objects.filter(**{
+            f'{self.key}_id__in': object_ids
+        })))
+        save_counts(self.model, self.key, self.column, counts)
+
+
+class FavoriteSummary(RelationSummary):
+    """Самые популярные в избранном рецепты."""
+
+    name = 'favorites'
+    kinds = (RecipeChange.FAVORITE,)
+    source = Favorite
+    model = RecipeFavorites
+    column = 'favorites'
+
+
+class FollowerSummary(RelationSummary):
+    """Авторы с наибольшим числом подписчиков."""
+
+    name = 'followers'
+    kinds = (RecipeChange.SUBSCRIPTION,)
+    source = Subscription
+    model = AuthorFollowers
+    column = 'followers'
+
+
+class CartDaySummary(Summary):
+    """Добавления в корзину и число пользователей по дням.
+
+    Считается по журналу: в корзине нет времени добавления, а удаления
+    из нее не отменяют того, что пользователь собирал корзину в тот день.
+    """
+
+    name = 'carts'
+    kinds = (RecipeChange.SHOPPING_CART,)
+
+    def recount(self, days=None):
+        """Пересчитывает дни days (все дни в журнале, если None)."""
+        changes = RecipeChange.objects.filter(
+            kind=RecipeChange.SHOPPING_CART, deleted=False)
+        if days is not None:
+            changes = changes.filter(created_at__date__in=days)
+        CartDay.objects.bulk_create(
+            [
+                CartDay(**row)
+                for row in changes.order_by().annotate(
+                    day=TruncDate('created_at')
+                ).values('day').annotate(
+                    additions=Count('pk'),
+                    users=Count('user_id', distinct=True),
+                )
+            ],
+            update_conflicts=True,
+            unique_fields=('day',),
+            update_fields=('additions', 'users'),
+        )
+
+    def rebuild(self, batch_size):
+        """Пересчитывает все дни, которые еще есть в журнале."""
+        self.recount()
+
+    def apply(self, rows):
+        """Пересчитывает дни, в которые были добавления."""
+        days = {
+            local_date(created_at)
+            for _, _, deleted, created_at in rows if not deleted
+        }
+        if days:
+            self.recount(days)
+
+
+def local_date(value):
+    """Дата момента value в текущем часовом поясе."""
+    if timezone.is_aware(value):
+        return timezone.localdate(value)
+    return value.date() if isinstance(value, datetime) else value
+
+
+SUMMARIES = {
+    summary.name: summary
+    for summary in (
+        IngredientSummary(),
+        TagSummary(),
+        FavoriteSummary(),
+        FollowerSummary(),
+        CartDaySummary(),
+    )
+}
+
+
+def needs_rebuild(mark):
+    """Нужен ли полный пересчет: сводку не строили или журнал обрезан."""
+    if mark.rebuilt_at is None:
+        return True
+    return mark.position < pruned_through()
+
+
+def refresh(summary, batch_size=STATS_BATCH_SIZE, rebuild=False):
+    """Обновляет сводку; возвращает (пересчитана ли целиком, записей).
+
+    Обрабатываются только записи старше CHANGES_SETTLE_SECONDS, как и
+    при синхронизации клиентов. Каждая пачка записей обрабатывается в
+    своей транзакции вместе со сдвигом отметки; блокировка отметки не
+    дает двум запускам обновлять одну сводку одновременно.
+    """
+    limit = latest_cursor()
+    with transaction.atomic():
+        mark, _ = Watermark.objects.select_for_update().get_or_create(
+            name=summary.name)
+        if rebuild or needs_rebuild(mark):
+            summary.rebuild(batch_size)
+            mark.position = limit
+            mark.rebuilt_at = mark.refreshed_at = timezone.now()
+            mark.save()
+            return True, 0
+
+    processed = 0
+    while True:
+        with transaction.atomic():
+            mark = Watermark.objects.select_for_update().get(
+                name=summary.name)
+            rows = list(RecipeChange.objects.filter(
+                pk__gt=mark.position, pk__lte=limit, kind__in=summary.kinds
+            ).order_by('pk').values_list(
+                'pk', 'object_id', 'deleted', 'created_at')[:batch_size])
+            if rows:
+                summary.apply(rows)
+            if len(rows) < batch_size:
+                mark.position = max(mark.position, limit)
+            else:
+                mark.position = rows[-1][0]
+            mark.refreshed_at = timezone.now()
+            mark.save()
+        processed += len(rows)
+        if len(rows) < batch_size:
+            return False, processed